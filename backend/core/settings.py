@@ -156,6 +156,126 @@ CORS_ALLOWED_ORIGINS = [
     "https://frontend-dot-suite-op-459500.ue.r.appspot.com/"
 ]   
 
+# Page size of the keyset-paginated /api/workflow-logs/ list (clients may ask for up
+# to 500 with ?page_size=). The rule/trigger/action lists stay unpaginated.
+WORKFLOW_LOG_PAGE_SIZE = 50
+
+# `since` delta mode of /api/workflow-logs/ only returns rows whose updated_at is at
+# least this many seconds old, so rows of transactions still in flight are not skipped.
+WORKFLOW_LOG_SINCE_LAG_SECONDS = float(os.getenv("WORKFLOW_LOG_SINCE_LAG_SECONDS", 5))
+
+# Maximum number of events accepted by one POST /api/events/ batch.
+EVENT_INGEST_MAX_BATCH = 5000
+
+# Default cache. It holds the table version counters (workflow/versioning.py) that tell
+# every process's routing table and catalog snapshot to rebuild, so point CACHE_REDIS_URL
+# at a shared Redis whenever more than one process serves requests or runs commands.
+# Without it each process has its own counters and only sees other processes' rule
+# changes after the max ages below.
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+if CACHE_REDIS_URL:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": CACHE_REDIS_URL}}
+else:
+    CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+# Upper bound (seconds) on how stale the in-process trigger -> rules routing table
+# may get when rule changes happen in another process and the cache is not shared.
+ROUTING_TABLE_MAX_AGE = 30
+# How often (seconds) the routing table re-reads the shared version counters. Lookups
+# in between trust the table, so other processes' rule changes show up this much later.
+ROUTING_VERSION_CHECK_INTERVAL = float(os.getenv("ROUTING_VERSION_CHECK_INTERVAL", 0.5))
+
+# Trigger/Action catalog (workflow/catalog.py): upper bound (seconds) on how stale the
+# process-local snapshot may get when the version counters are not shared, and the
+# max-age clients may cache /api/triggers/ and /api/actions/ for. 0 sends no-cache:
+# clients revalidate every time, which costs a 304 from memory.
+CATALOG_CACHE_MAX_AGE = 60
+CATALOG_HTTP_MAX_AGE = int(os.getenv("CATALOG_HTTP_MAX_AGE", 0))
+
+# Cache for generate-from-ai responses, keyed by normalized prompt (see workflow/ai_cache.py).
+AI_PROMPT_CACHE = {
+    "BACKEND": os.getenv("AI_PROMPT_CACHE_BACKEND", "locmem"),  # "locmem", "file" or "django"
+    "TTL": int(os.getenv("AI_PROMPT_CACHE_TTL", 60 * 60 * 24)),
+    "MAX_ENTRIES": 1000,
+    "LOCATION": os.getenv("AI_PROMPT_CACHE_DIR", str(BASE_DIR / ".ai_prompt_cache")),  # file backend
+    "CACHE_ALIAS": "default",  # django backend
+}
+
+# generate-from-ai answers prompts offline (workflow/local_suggest.py) when the local
+# engine's confidence is at least this, and only calls Gemini below it.
+AI_LOCAL_SUGGESTION_THRESHOLD = float(os.getenv("AI_LOCAL_SUGGESTION_THRESHOLD", 0.8))
+
+# Minimum similarity (0-1) for an AI-suggested trigger/action name to be mapped to
+# the closest catalog entry (workflow/catalog_match.py); exact names score 1.
+AI_NAME_MATCH_MIN_SCORE = 0.55
+
+# Scheduler worker pool (workflow/workers.py): threads executing actions, and how
+# many jobs of each action type may run at once ("default" covers unlisted types).
+SCHEDULER_MAX_WORKERS = int(os.getenv("SCHEDULER_MAX_WORKERS", 16))
+SCHEDULER_ACTION_CONCURRENCY = {
+    "default": 8,
+    "Send Slack Notification": 4,
+    "Turn Device On/Off": 4,
+}
+
+# Failed scheduled jobs (workflow/jobs.py) are retried with exponential backoff and
+# jitter, up to MAX_ATTEMPTS runs in total; after that the log is DEAD_LETTERED
+# (see the requeue_dead_letters and purge_dead_letters commands).
+SCHEDULER_RETRY = {
+    "MAX_ATTEMPTS": int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 5)),
+    "BASE_DELAY_SECONDS": 30,
+    "MAX_DELAY_SECONDS": 60 * 60,
+}
+
+# Action executors (workflow/executors.py). TRANSPORT "fake" records sends in memory
+# (local runs and tests); "live" calls the providers over pooled HTTP/SMTP connections
+# (email uses Django's EMAIL_* settings). BATCH_SIZE caps jobs combined into one send.
+ACTION_EXECUTORS = {
+    "TRANSPORT": os.getenv("ACTION_TRANSPORT", "fake"),
+    "HTTP_TIMEOUT": 10,
+    "HTTP_MAX_CONNECTIONS": 20,
+    "SMTP_MAX_CONNECTIONS": 4,
+    "BATCH_SIZE": 50,
+    "EMAIL_FROM": os.getenv("WORKFLOW_EMAIL_FROM"),
+    "EMAIL_RECIPIENTS": [r for r in os.getenv("WORKFLOW_EMAIL_RECIPIENTS", "").split(",") if r],
+    "SLACK_WEBHOOK_URL": os.getenv("SLACK_WEBHOOK_URL"),
+    "PUSH_URL": os.getenv("PUSH_NOTIFICATION_URL"),
+    "TASKS_URL": os.getenv("TASKS_API_URL"),
+    "DEVICE_GATEWAY_URL": os.getenv("DEVICE_GATEWAY_URL"),
+}
+
+# Token-bucket rate limits per action type and destination (workflow/throttle.py): RATE
+# sends per second with bursts of up to BURST; "default" covers unlisted types.
+ACTION_RATE_LIMITS = {
+    "default": {"RATE": 20, "BURST": 40},
+    "Send Slack Notification": {"RATE": 1, "BURST": 10},
+    "Send Native Notification": {"RATE": 10, "BURST": 50},
+}
+
+# Seconds during which repeated executions of the same rule are merged into one send
+# with a count (workflow/workers.py); 0 sends every execution on its own. Keep these
+# well below the scheduler's lease time.
+ACTION_COALESCE_WINDOWS = {
+    "default": 0,
+    "Send Email": 30,
+    "Send Slack Notification": 10,
+    "Send Native Notification": 10,
+    "Create Task": 10,
+}
+
+# Retention (archive_execution_logs command): finished logs older than this many days
+# leave the hot table, into ArchivedExecutionLog or gzipped JSONL/Parquet files in
+# WORKFLOW_LOG_ARCHIVE_DIR.
+WORKFLOW_LOG_RETENTION_DAYS = int(os.getenv("WORKFLOW_LOG_RETENTION_DAYS", 90))
+WORKFLOW_LOG_ARCHIVE_DIR = os.getenv("WORKFLOW_LOG_ARCHIVE_DIR", str(BASE_DIR / "log_archive"))
+
+# POST /api/rules/generate-from-ai-batch/: maximum prompts per request, how many
+# uncached prompts are sent to Gemini at the same time, and the deadline (seconds)
+# for the whole batch; prompts still unanswered then are reported as timeouts.
+AI_BATCH_MAX_PROMPTS = 200
+AI_BATCH_MAX_CONCURRENCY = int(os.getenv("AI_BATCH_MAX_CONCURRENCY", 8))
+AI_BATCH_TIMEOUT_SECONDS = float(os.getenv("AI_BATCH_TIMEOUT_SECONDS", 60))
+
 
 LOGGING = {
     "version": 1,
@@ -169,4 +289,8 @@ LOGGING = {
         "handlers": ["console"],
         "level": "INFO",
     },
+    "loggers": {
+        # httpx logs every request at INFO; action executors make thousands.
+        "httpx": {"level": "WARNING"},
+    },
 }
\ No newline at end of file
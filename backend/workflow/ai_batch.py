@@ -0,0 +1,150 @@
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+from rest_framework import status
+
+from .ai_cache import get_prompt_cache
+from .gemini import AIUpstreamTimeout, get_ai_suggestions_for_prompt_async
+from .local_suggest import confident_local_suggestion, local_fallback
+from .suggestions import build_suggestions_payload
+
+
+async def _timed_generate(prompt_text, limit):
+    """Returns (ai_response_json_str, timed_out, seconds) for one prompt."""
+    async with limit:
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            ai_response_json_str = await get_ai_suggestions_for_prompt_async(prompt_text)
+        except AIUpstreamTimeout:
+            ai_response_json_str, timed_out = None, True
+        except Exception as e:
+            print(f"Error generating AI suggestions in batch: {str(e)}")
+            ai_response_json_str = None
+        return ai_response_json_str, timed_out, time.perf_counter() - started
+
+
+def _answer_without_gemini(prompts, groups, prompt_cache):
+    """
+    Splits the prompt groups into those answered locally or from the cache
+    (returned as outcomes) and those that need a Gemini call.
+    """
+    outcomes = {}
+    to_generate = {}
+    cache_hits = 0
+    for key, indexes in groups.items():
+        local_started = time.perf_counter()
+        local = confident_local_suggestion(prompts[indexes[0]])
+        if local is not None:
+            outcomes[key] = (local, 'local', None, time.perf_counter() - local_started, False)
+            continue
+        cached = prompt_cache.get(prompts[indexes[0]])
+        if cached is not None:
+            outcomes[key] = (cached, 'gemini', 'HIT', 0.0, False)
+            cache_hits += 1
+        else:
+            to_generate[key] = prompts[indexes[0]]
+    return outcomes, to_generate, cache_hits
+
+
+def _build_results(prompts, groups, outcomes, timeout_seconds):
+    results = [None] * len(prompts)
+    failed = 0
+    for key, indexes in groups.items():
+        ai_response_json_str, source, cache_status, elapsed, timed_out = outcomes[key]
+        map_started = time.perf_counter()
+        if timed_out and ai_response_json_str is None:
+            payload = {"error": f"AI service did not respond within {timeout_seconds:g} seconds."}
+            http_status = status.HTTP_504_GATEWAY_TIMEOUT
+        else:
+            payload, http_status = build_suggestions_payload(ai_response_json_str)
+        map_elapsed = time.perf_counter() - map_started
+        if http_status >= 400:
+            failed += len(indexes)
+
+        first = indexes[0]
+        for index in indexes:
+            results[index] = {
+                "index": index,
+                "prompt": prompts[index],
+                "status": http_status,
+                "source": source,
+                "cache": cache_status if index == first else "DUPLICATE",
+                "duplicate_of": None if index == first else first,
+                "generation_ms": round(elapsed * 1000, 1) if index == first else 0.0,
+                "mapping_ms": round(map_elapsed * 1000, 1),
+                **payload,
+            }
+    return results, failed
+
+
+async def generate_suggestions_batch(prompts, max_concurrency, timeout_seconds):
+    """
+    Runs generate-from-ai for every prompt in `prompts` and returns
+    (results, summary), with results in input order.
+
+    Prompts are deduplicated by their prompt-cache key, so trivially different
+    spellings of the same request cost one Gemini call; prompts the local
+    engine is confident about and cached prompts are answered without one.
+    The rest are awaited on the event loop, at most `max_concurrency` at a
+    time and within the Gemini semaphore and deadline. Prompts still
+    unanswered after `timeout_seconds` are cancelled and reported as
+    timeouts (or answered by the local fallback), so the batch never runs
+    longer than that.
+    """
+    started = time.perf_counter()
+    prompt_cache = get_prompt_cache()
+
+    # cache key -> indexes of the prompts that share it, in first-seen order
+    groups = {}
+    for index, prompt_text in enumerate(prompts):
+        groups.setdefault(prompt_cache.make_key(prompt_text), []).append(index)
+
+    # cache key -> (ai_response_json_str, source, cache status, generation seconds, timed out)
+    outcomes, to_generate, cache_hits = await sync_to_async(_answer_without_gemini)(prompts, groups, prompt_cache)
+
+    if to_generate:
+        limit = asyncio.Semaphore(max_concurrency)
+        tasks = {
+            key: asyncio.ensure_future(_timed_generate(prompt_text, limit))
+            for key, prompt_text in to_generate.items()
+        }
+        _, pending = await asyncio.wait(tasks.values(), timeout=timeout_seconds)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        generated = {}
+        for key, task in tasks.items():
+            if task in pending:
+                generated[key] = (None, True, timeout_seconds)
+            else:
+                generated[key] = task.result()
+
+        def store_and_fall_back():
+            for key, (ai_response_json_str, timed_out, elapsed) in generated.items():
+                # PromptCache.set() skips failures: None and non-JSON output.
+                prompt_cache.set(to_generate[key], ai_response_json_str)
+                source = 'gemini'
+                if ai_response_json_str is None:
+                    ai_response_json_str = local_fallback(to_generate[key])
+                    if ai_response_json_str is not None:
+                        source = 'local-fallback'
+                outcomes[key] = (ai_response_json_str, source, 'MISS', elapsed, timed_out)
+
+        await sync_to_async(store_and_fall_back)()
+
+    # Mapping looks up Triggers/Actions, so it runs in one sync call.
+    results, failed = await sync_to_async(_build_results)(prompts, groups, outcomes, timeout_seconds)
+
+    summary = {
+        "prompts": len(prompts),
+        "unique_prompts": len(groups),
+        "answered_locally": len(groups) - cache_hits - len(to_generate),
+        "cache_hits": cache_hits,
+        "generated": len(to_generate),
+        "failed": failed,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 1),
+    }
+    return results, summary
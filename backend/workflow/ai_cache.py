@@ -0,0 +1,265 @@
+"""
+Response cache for AI workflow suggestions.
+
+Identical or trivially different prompts ("When guest checks in, send email."
+vs "when guest checks in send email") map to the same entry, so repeats are
+answered without a Gemini round-trip. Keys also include the model name and a
+fingerprint of the few-shot template, so changing either starts a fresh cache.
+
+Configured by the AI_PROMPT_CACHE setting:
+    BACKEND      "locmem" (default), "file" or "django"
+    TTL          seconds an entry stays valid (default one day)
+    MAX_ENTRIES  LRU size limit for the locmem and file backends
+    LOCATION     directory for the file backend
+    CACHE_ALIAS  Django cache alias for the django backend
+"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+DEFAULT_TTL = 60 * 60 * 24
+DEFAULT_MAX_ENTRIES = 1000
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def is_cacheable_response(value):
+    """Only Gemini responses that parse as a JSON object are worth caching."""
+    if not isinstance(value, str):
+        return False
+    try:
+        return isinstance(json.loads(value), dict)
+    except ValueError:
+        return False
+
+
+def normalize_prompt(prompt_text):
+    """Folds case, punctuation and whitespace so trivially different prompts compare equal."""
+    folded = _PUNCTUATION_RE.sub(" ", prompt_text.casefold())
+    return _WHITESPACE_RE.sub(" ", folded).strip()
+
+
+class LocMemPromptCacheBackend:
+    """Process-local LRU dictionary with per-entry expiry."""
+
+    def __init__(self, ttl, max_entries, **kwargs):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.time() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FilePromptCacheBackend:
+    """
+    One JSON file per entry, shared by every process on the host and kept
+    across restarts. File mtimes track recency for LRU pruning.
+    """
+
+    def __init__(self, ttl, max_entries, location=None, **kwargs):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.location = str(location or os.path.join(tempfile.gettempdir(), 'workflow_ai_prompt_cache'))
+        os.makedirs(self.location, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.location, f"{key}.json")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as handle:
+                entry = json.load(handle)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) < time.time():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        self._touch(path) # mark as recently used
+        return entry.get('value')
+
+    @staticmethod
+    def _touch(path):
+        # Explicit nanosecond timestamps: kernel-set mtimes can be too coarse to order entries.
+        now_ns = time.time_ns()
+        try:
+            os.utime(path, ns=(now_ns, now_ns))
+        except OSError:
+            pass
+
+    def set(self, key, value):
+        path = self._path(key)
+        # Write to a temp file and rename so readers never see a partial entry.
+        fd, tmp_path = tempfile.mkstemp(dir=self.location, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as handle:
+                json.dump({'expires_at': time.time() + self.ttl, 'value': value}, handle)
+            os.replace(tmp_path, path)
+            self._touch(path)
+        except OSError:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return
+        self._prune()
+
+    def _prune(self):
+        try:
+            entries = [entry for entry in os.scandir(self.location) if entry.name.endswith('.json')]
+        except OSError:
+            return
+        overflow = len(entries) - self.max_entries
+        if overflow <= 0:
+            return
+        entries.sort(key=lambda entry: entry.stat().st_mtime_ns)
+        for entry in entries[:overflow]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def clear(self):
+        for entry in os.scandir(self.location):
+            if entry.name.endswith('.json'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+class DjangoPromptCacheBackend:
+    """Delegates to a configured Django cache; size limits are the cache's own (e.g. OPTIONS MAX_ENTRIES)."""
+    key_prefix = 'workflow:ai-prompt:'
+
+    def __init__(self, ttl, cache_alias='default', **kwargs):
+        self.ttl = ttl
+        self.cache = caches[cache_alias]
+
+    def get(self, key):
+        return self.cache.get(f"{self.key_prefix}{key}")
+
+    def set(self, key, value):
+        self.cache.set(f"{self.key_prefix}{key}", value, timeout=self.ttl)
+
+    def clear(self):
+        # Entries expire on their own; a shared cache is not flushed wholesale.
+        pass
+
+
+BACKENDS = {
+    'locmem': LocMemPromptCacheBackend,
+    'file': FilePromptCacheBackend,
+    'django': DjangoPromptCacheBackend,
+}
+
+
+class PromptCache:
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self.hits = 0
+        self.misses = 0
+        self._counter_lock = threading.Lock()
+
+    def make_key(self, prompt_text):
+        raw = f"{self.namespace}|{normalize_prompt(prompt_text)}"
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, prompt_text):
+        value = self.backend.get(self.make_key(prompt_text))
+        with self._counter_lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, prompt_text, value):
+        """Stores `value` unless it is a failure: None, or text that is not a JSON object."""
+        if is_cacheable_response(value):
+            self.backend.set(self.make_key(prompt_text), value)
+
+    def get_or_generate(self, prompt_text, generate):
+        """
+        Returns (value, hit). On a miss `generate(prompt_text)` is called and its
+        result is stored if it is a JSON object; failures (None, or malformed
+        output that would fail every later request too) are never cached.
+        """
+        value = self.get(prompt_text)
+        if value is not None:
+            return value, True
+        value = generate(prompt_text)
+        self.set(prompt_text, value)
+        return value, False
+
+    def stats(self):
+        with self._counter_lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'backend': type(self.backend).__name__,
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': round(hits / total, 4) if total else None,
+        }
+
+
+_prompt_cache = None
+_prompt_cache_lock = threading.Lock()
+
+
+def get_prompt_cache():
+    """The process-wide PromptCache, built from settings.AI_PROMPT_CACHE on first use."""
+    global _prompt_cache
+    if _prompt_cache is None:
+        with _prompt_cache_lock:
+            if _prompt_cache is None:
+                from .gemini import model_name, template_fingerprint
+
+                config = getattr(settings, 'AI_PROMPT_CACHE', {})
+                backend_name = config.get('BACKEND', 'locmem')
+                if backend_name not in BACKENDS:
+                    raise ValueError(f"Unknown AI_PROMPT_CACHE BACKEND '{backend_name}'; expected one of {sorted(BACKENDS)}.")
+                backend = BACKENDS[backend_name](
+                    ttl=config.get('TTL', DEFAULT_TTL),
+                    max_entries=config.get('MAX_ENTRIES', DEFAULT_MAX_ENTRIES),
+                    location=config.get('LOCATION'),
+                    cache_alias=config.get('CACHE_ALIAS', 'default'),
+                )
+                _prompt_cache = PromptCache(backend, namespace=f"{model_name}|{template_fingerprint}")
+    return _prompt_cache
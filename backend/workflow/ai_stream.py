@@ -0,0 +1,85 @@
+"""
+Incremental parsing of Gemini's streamed JSON response.
+
+The model streams one JSON object, {"suggested_workflows": [{...}, {...}], ...},
+in arbitrary text chunks. SuggestedWorkflowsStreamParser scans the chunks as
+they arrive and hands back each array item as soon as its closing brace has
+been seen, so callers can map and forward the first suggestion long before
+the model has finished generating the rest.
+"""
+import json
+import re
+
+_ARRAY_START_RE = re.compile(r'"suggested_workflows"\s*:\s*\[')
+
+
+class SuggestedWorkflowsStreamParser:
+    def __init__(self):
+        self.buffer = ""
+        self._pos = 0              # next unscanned index in buffer
+        self._in_array = False
+        self._array_done = False
+        self._object_start = None  # index of the '{' of the item being scanned
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Adds a chunk of response text; returns the list of items completed by it."""
+        self.buffer += text
+        completed = []
+
+        if not self._in_array and not self._array_done:
+            match = _ARRAY_START_RE.search(self.buffer, self._pos)
+            if match is None:
+                # Keep scanning from near the end next time; the key may be split across chunks.
+                self._pos = max(self._pos, len(self.buffer) - len('"suggested_workflows" : ['))
+                return completed
+            self._in_array = True
+            self._pos = match.end()
+
+        if not self._in_array:
+            return completed
+
+        buffer = self.buffer
+        index = self._pos
+        while index < len(buffer):
+            char = buffer[index]
+            if self._object_start is None:
+                if char == '{':
+                    self._object_start = index
+                    self._depth = 1
+                elif char == ']':
+                    self._in_array = False
+                    self._array_done = True
+                    index += 1
+                    break
+                # whitespace and commas between items are skipped
+            elif self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == '\\':
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char == '{':
+                self._depth += 1
+            elif char == '}':
+                self._depth -= 1
+                if self._depth == 0:
+                    item_text = buffer[self._object_start:index + 1]
+                    self._object_start = None
+                    try:
+                        item = json.loads(item_text)
+                    except ValueError:
+                        item = None
+                    if isinstance(item, dict):
+                        completed.append(item)
+            index += 1
+        self._pos = index
+        return completed
+
+    def full_text(self):
+        return self.buffer.strip()
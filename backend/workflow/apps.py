@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class WorkflowConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "workflow"
+
+    def ready(self):
+        # Register the cache-invalidation signal receivers
+        from . import signals  # noqa: F401
@@ -0,0 +1,96 @@
+"""
+Process-local cache of the Trigger/Action catalog.
+
+Both tables are tiny and change almost never, but every create/edit page
+fetches them and every rule write validates against them. Each CatalogCache
+keeps a snapshot of its table: the model instances by id (for serializer
+validation), plus the list and detail responses already rendered to JSON and
+gzip-compressed, with a content-derived ETag. The snapshot is rebuilt (one
+query) when the table version moves -- a save/delete in this process via
+workflow.signals, or in any process with a shared cache backend -- or after
+CATALOG_CACHE_MAX_AGE seconds, which bounds staleness otherwise.
+"""
+import gzip
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .models import Action, Trigger
+from .versioning import get_table_version
+
+DEFAULT_MAX_AGE = 60
+
+
+class RenderedJSON:
+    """A response body rendered once: raw bytes, gzip bytes and a strong ETag."""
+    __slots__ = ('body', 'gzipped', 'etag')
+
+    def __init__(self, data):
+        self.body = JSONRenderer().render(data)
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.etag = f'"{hashlib.sha1(self.body).hexdigest()}"'
+
+
+class CatalogSnapshot:
+    def __init__(self, version, instances, list_response, detail_responses):
+        self.version = version
+        self.instances = instances
+        self.list_response = list_response
+        self.detail_responses = detail_responses
+
+
+class CatalogCache:
+    def __init__(self, model, serializer_class=None, ordering=('name',)):
+        self.model = model
+        self.serializer_class = serializer_class
+        self.ordering = ordering
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0.0
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _get_serializer_class(self):
+        if self.serializer_class is None:
+            # Imported lazily: serializers import this module for validation.
+            from . import serializers
+            self.serializer_class = getattr(serializers, f"{self.model.__name__}Serializer")
+        return self.serializer_class
+
+    def snapshot(self):
+        version = get_table_version(self.model)
+        max_age = getattr(settings, 'CATALOG_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+        current = self._snapshot
+        if current is not None and current.version == version and time.monotonic() - self._built_at < max_age:
+            return current
+        with self._lock:
+            current = self._snapshot
+            if current is not None and current.version == version and time.monotonic() - self._built_at < max_age:
+                return current
+            current = self._build(version)
+            self._snapshot = current
+            self._built_at = time.monotonic()
+            return current
+
+    def _build(self, version):
+        instances = list(self.model.objects.order_by(*self.ordering))
+        serialized = self._get_serializer_class()(instances, many=True).data
+        return CatalogSnapshot(
+            version=version,
+            instances={instance.pk: instance for instance in instances},
+            list_response=RenderedJSON(serialized),
+            detail_responses={instance.pk: RenderedJSON(item) for instance, item in zip(instances, serialized)},
+        )
+
+    def get(self, pk):
+        """The cached instance with this primary key, or None. Treat it as read-only."""
+        return self.snapshot().instances.get(pk)
+
+
+trigger_catalog = CatalogCache(Trigger)
+action_catalog = CatalogCache(Action)
+CATALOG_CACHES = {Trigger: trigger_catalog, Action: action_catalog}
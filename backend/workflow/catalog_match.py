@@ -0,0 +1,132 @@
+"""
+In-memory fuzzy matching of AI-suggested trigger/action names against the
+catalog.
+
+Each catalog name is turned into a TF-IDF weighted vector of character
+trigrams (L2-normalised) and stored in an inverted index, gram -> [(row,
+weight)]. Scoring a batch of names is then one pass over the grams of each
+distinct name, accumulating cosine similarities for every catalog row at once,
+with no database query. Near misses ("Guest check-in", "Slack message")
+resolve to the closest catalog entry along with their similarity score.
+
+The index is rebuilt (one query) when the model's table version moves, i.e.
+after a save/delete (see workflow.signals), or after ROUTING_TABLE_MAX_AGE.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from django.conf import settings
+
+from .models import Action, Trigger
+from .versioning import get_table_version
+
+# The best catalog entry for a name: `score` is 1.0 for a case-insensitive exact match.
+CatalogMatch = namedtuple('CatalogMatch', ['id', 'name', 'score'])
+
+DEFAULT_MIN_SCORE = 0.55
+NGRAM_SIZE = 3
+
+
+def normalize_name(name):
+    return re.sub(r"[^a-z0-9]+", ' ', name.lower()).strip()
+
+
+def ngrams(normalized):
+    padded = f" {normalized} "
+    return Counter(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+
+
+class CatalogMatcher:
+    def __init__(self, model):
+        self.model = model
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self._rows = ()
+        self._exact = {}
+        self._index = {}
+        self._idf = {}
+
+    def invalidate(self):
+        self._version = None
+
+    def _ensure_fresh(self):
+        version = get_table_version(self.model)
+        max_age = getattr(settings, 'ROUTING_TABLE_MAX_AGE', 30)
+        if version == self._version and time.monotonic() - self._built_at < max_age:
+            return
+        with self._lock:
+            if version == self._version and time.monotonic() - self._built_at < max_age:
+                return
+            self._rebuild(version)
+
+    def _rebuild(self, version):
+        rows = tuple(self.model.objects.order_by('id').values_list('id', 'name'))
+        grams_per_row = [ngrams(normalize_name(name)) for _, name in rows]
+
+        document_frequency = Counter()
+        for grams in grams_per_row:
+            document_frequency.update(grams.keys())
+        idf = {gram: math.log((1 + len(rows)) / (1 + df)) + 1.0 for gram, df in document_frequency.items()}
+
+        index = {}
+        for row, grams in enumerate(grams_per_row):
+            weights = {gram: count * idf[gram] for gram, count in grams.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weights.values())) or 1.0
+            for gram, weight in weights.items():
+                index.setdefault(gram, []).append((row, weight / norm))
+
+        # Swap in complete structures so readers never see a half-built index.
+        self._rows = rows
+        self._exact = {}
+        for row, (_, name) in enumerate(rows):
+            self._exact.setdefault(name.strip().lower(), row)
+        self._index = index
+        self._idf = idf
+        self._built_at = time.monotonic()
+        self._version = version
+
+    def _best(self, name, rows, exact, index, idf):
+        row = exact.get(name.strip().lower())
+        if row is not None:
+            return CatalogMatch(rows[row][0], rows[row][1], 1.0)
+
+        grams = ngrams(normalize_name(name))
+        # Grams the catalog has never seen still count towards the query's norm.
+        weights = {gram: count * idf.get(gram, 1.0) for gram, count in grams.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weights.values()))
+        if not norm:
+            return None
+        scores = [0.0] * len(rows)
+        for gram, weight in weights.items():
+            for row, row_weight in index.get(gram, ()):
+                scores[row] += weight * row_weight
+        best_row = max(range(len(rows)), key=scores.__getitem__, default=None)
+        if best_row is None or not scores[best_row]:
+            return None
+        return CatalogMatch(rows[best_row][0], rows[best_row][1], round(scores[best_row] / norm, 4))
+
+    def match_many(self, names):
+        """
+        Returns {name: CatalogMatch or None} for every distinct non-empty name,
+        None when no catalog entry scores at least AI_NAME_MATCH_MIN_SCORE.
+        """
+        self._ensure_fresh()
+        # One consistent snapshot for the whole batch.
+        rows, exact, index, idf = self._rows, self._exact, self._index, self._idf
+        min_score = getattr(settings, 'AI_NAME_MATCH_MIN_SCORE', DEFAULT_MIN_SCORE)
+        results = {}
+        for name in names:
+            if not isinstance(name, str) or not name.strip() or name in results:
+                continue
+            match = self._best(name, rows, exact, index, idf)
+            results[name] = match if match is not None and match.score >= min_score else None
+        return results
+
+
+trigger_matcher = CatalogMatcher(Trigger)
+action_matcher = CatalogMatcher(Action)
+CATALOG_MATCHERS = {Trigger: trigger_matcher, Action: action_matcher}
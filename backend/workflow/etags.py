@@ -0,0 +1,134 @@
+import hashlib
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def etag_matches(if_none_match, etag):
+    """True if an If-None-Match header value matches `etag` (weak comparison, as RFC 9110 requires for GET)."""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    bare = etag[2:] if etag.startswith('W/') else etag
+    return any((tag[2:] if tag.startswith('W/') else tag) == bare for tag in candidates)
+
+
+def accepts_encoding(accept_encoding, coding):
+    """
+    True if an Accept-Encoding header value allows `coding`: listed (or covered
+    by `*`) with a q-value above zero, so "gzip;q=0" refuses gzip.
+    """
+    explicit = wildcard = None
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name == coding:
+            explicit = quality
+        elif name == '*':
+            wildcard = quality
+    quality = explicit if explicit is not None else wildcard
+    return quality is not None and quality > 0
+
+
+class ConditionalETagMixin:
+    """
+    Adds a strong ETag to list/retrieve responses and answers a matching
+    If-None-Match with 304 Not Modified before any serialization happens.
+
+    Subclasses implement `get_etag_components()`, returning a small tuple that
+    changes whenever the response could change -- typically table version
+    counters plus a cheap aggregate such as Max('updated_at') and Count('id').
+    """
+
+    def get_etag_components(self):
+        raise NotImplementedError('ConditionalETagMixin subclasses must implement get_etag_components()')
+
+    def get_etag(self):
+        components = (self.request.path, self.request.GET.urlencode(), *self.get_etag_components())
+        digest = hashlib.sha1(repr(components).encode('utf-8')).hexdigest()
+        return f'"{digest}"'
+
+    def _conditional_response(self, handler, request, *args, **kwargs):
+        etag = self.get_etag()
+        # no-cache: clients may store the response but must revalidate it on every use.
+        headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            for header, value in headers.items():
+                response[header] = value
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self._conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._conditional_response(super().retrieve, request, *args, **kwargs)
+
+
+class CatalogResponseMixin:
+    """
+    Serves list/retrieve of a ReadOnlyModelViewSet straight from a
+    workflow.catalog.CatalogCache: the pre-rendered JSON (gzip-compressed when
+    the client accepts it) and a content ETag, so a request touches neither the
+    database nor the serializer. Clients revalidate with If-None-Match on every
+    use (or after CATALOG_HTTP_MAX_AGE seconds when set) and get a 304 until the
+    catalog changes, so an edited trigger or action shows up at once. Other
+    renderers (e.g. the browsable API) fall through to the normal view.
+    """
+    catalog = None
+
+    def _catalog_response(self, request, rendered):
+        use_gzip = accepts_encoding(request.headers.get('Accept-Encoding'), 'gzip')
+        # Each encoding is a different representation, so it gets its own strong ETag.
+        etag = f'{rendered.etag[:-1]}-gzip"' if use_gzip else rendered.etag
+        max_age = getattr(settings, 'CATALOG_HTTP_MAX_AGE', 0)
+        headers = {
+            'ETag': etag,
+            'Cache-Control': f'public, max-age={max_age}' if max_age else 'no-cache',
+            'Vary': 'Accept, Accept-Encoding',
+        }
+        if etag_matches(request.headers.get('If-None-Match'), etag):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = HttpResponse(rendered.gzipped if use_gzip else rendered.body, content_type='application/json')
+            if use_gzip:
+                response['Content-Encoding'] = 'gzip'
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    def _serves_json(self, request):
+        return getattr(request, 'accepted_renderer', None) is not None and request.accepted_renderer.format == 'json'
+
+    def list(self, request, *args, **kwargs):
+        if not self._serves_json(request):
+            return super().list(request, *args, **kwargs)
+        return self._catalog_response(request, self.catalog.snapshot().list_response)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._serves_json(request):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except (KeyError, TypeError, ValueError):
+            raise Http404
+        rendered = self.catalog.snapshot().detail_responses.get(pk)
+        if rendered is None:
+            raise Http404
+        return self._catalog_response(request, rendered)
@@ -0,0 +1,442 @@
+"""
+Executors that carry out workflow actions, one per Action (keyed by name).
+
+Each executor sends through a long-lived transport shared by every worker
+thread in the process: an HTTP client with a keep-alive connection pool (Slack,
+push notifications, task and device APIs) or a small pool of open SMTP
+connections. Connections are reused from job to job, so throughput grows with
+reuse rather than with the number of connections opened.
+
+Executors also take a batch of jobs of their action type. Where the channel
+allows it, the batch goes out in fewer requests: several Slack messages to the
+same webhook become one post, push notifications and tasks go as one array,
+emails share one SMTP session (a batch that breaks part-way fails only the
+messages not yet delivered). The worker pool hands an executor up to
+`max_batch_size` messages' worth of jobs that are already waiting, so
+batching adds no delay. When coalescing is on for the action, jobs of the same
+rule in a batch become a single message with a count. Every request is rate
+limited per destination (see workflow.throttle).
+
+Configured by the ACTION_EXECUTORS setting:
+    TRANSPORT             "fake" (default) records sends in memory; "live" calls the providers
+    HTTP_TIMEOUT          seconds per HTTP request
+    HTTP_MAX_CONNECTIONS  size of the HTTP keep-alive pool
+    SMTP_MAX_CONNECTIONS  open SMTP connections kept for reuse (uses the EMAIL_* settings)
+    BATCH_SIZE            most jobs sent in one batch
+    EMAIL_FROM, EMAIL_RECIPIENTS, SLACK_WEBHOOK_URL, PUSH_URL, TASKS_URL, DEVICE_GATEWAY_URL
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+
+import httpx
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from .throttle import coalesce_window_for, rate_limiter
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HTTP_TIMEOUT = 10
+DEFAULT_HTTP_MAX_CONNECTIONS = 20
+DEFAULT_SMTP_MAX_CONNECTIONS = 4
+DEFAULT_BATCH_SIZE = 50
+
+
+class PermanentActionError(Exception):
+    """Raised by an action that cannot succeed on retry (e.g. a malformed recipient); the job fails at once."""
+
+
+class PartialSendError(Exception):
+    """
+    A batch failed part-way: its first `sent` messages were delivered and the
+    rest failed with `error`. Only the undelivered ones are retried, so nobody
+    gets a message twice.
+    """
+
+    def __init__(self, sent, error):
+        super().__init__(str(error))
+        self.sent = sent
+        self.error = error
+
+
+# --- Transports ---
+
+class HTTPTransport:
+    """JSON POSTs over one thread-safe httpx client with a keep-alive connection pool."""
+
+    def __init__(self, timeout=DEFAULT_HTTP_TIMEOUT, max_connections=DEFAULT_HTTP_MAX_CONNECTIONS):
+        self.client = httpx.Client(
+            timeout=timeout,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def post_json(self, url, payload):
+        try:
+            response = self.client.post(url, json=payload)
+            response.raise_for_status()
+        except httpx.HTTPStatusError as e:
+            code = e.response.status_code
+            # Other 4xx responses mean the request itself is wrong; sending it again will not help.
+            if 400 <= code < 500 and code not in (408, 429):
+                raise PermanentActionError(f"{url} rejected the request with HTTP {code}: {e.response.text[:200]}") from e
+            raise
+        return response
+
+    def close(self):
+        self.client.close()
+
+
+class SMTPTransport:
+    """
+    Sends email over up to `max_connections` SMTP connections that stay open
+    between jobs. A connection that fails is closed and replaced on next use.
+    """
+
+    def __init__(self, max_connections=DEFAULT_SMTP_MAX_CONNECTIONS):
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def send_messages(self, messages):
+        with self._slots:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                connection = get_connection(fail_silently=False)
+                connection.open()
+            sent = 0
+            try:
+                # One message per call so a failure tells which ones went out. The
+                # connection is already open, so send_messages leaves it open.
+                for message in messages:
+                    connection.send_messages([message])
+                    sent += 1
+            except Exception as e:
+                connection.close()
+                if sent:
+                    raise PartialSendError(sent, e) from e
+                raise
+            self._idle.put(connection)
+            return sent
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class FakeTransport:
+    """
+    In-memory stand-in for the HTTP and SMTP transports, for local runs and
+    tests: records what would have been sent (the most recent `max_records`).
+    Set `error` to make every send raise it, and `latency` to simulate I/O time.
+    """
+
+    def __init__(self, latency=0.0, max_records=1000):
+        self.latency = latency
+        self.error = None
+        self.sent = deque(maxlen=max_records)
+        self.send_count = 0
+        self._lock = threading.Lock()
+
+    def _record(self, destination, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        if self.error is not None:
+            raise self.error
+        with self._lock:
+            self.sent.append((destination, payload))
+            self.send_count += 1
+
+    def post_json(self, url, payload):
+        self._record(url, payload)
+
+    def send_messages(self, messages):
+        for sent, message in enumerate(messages):
+            try:
+                self._record('smtp', (message.subject, message.to))
+            except Exception as e:
+                if sent:
+                    raise PartialSendError(sent, e) from e
+                raise
+        return len(messages)
+
+    def close(self):
+        pass
+
+
+# --- Executors ---
+
+# One outgoing message: `log` stands for `count` executions of the same rule
+# merged by coalescing (count is 1 when nothing was merged).
+Send = namedtuple('Send', ['log', 'count'])
+
+
+def describe(send):
+    """One-line human-readable description of what fired, used in every channel."""
+    log = send.log
+    text = f"{log.trigger_name_snapshot}: workflow rule '{log.workflow_rule.name}' ran '{log.action_name_snapshot}'."
+    if send.count > 1:
+        text += f" (x{send.count})"
+    return text
+
+
+class ActionExecutor:
+    """
+    Base executor. Subclasses implement send_batch(sends) and set
+    `max_batch_size` above 1 when the channel can take several messages at
+    once. `destination_key` names the ACTION_EXECUTORS entry the executor
+    sends to; each destination has its own rate limit.
+    """
+    action_name = None
+    max_batch_size = 1
+    # Which shared transport the executor sends through: 'http' or 'email'.
+    transport_kind = 'http'
+    destination_key = None
+
+    def __init__(self, transport, config, coalesce=False):
+        self.transport = transport
+        self.config = config
+        # Merge executions of the same rule within a batch into one message.
+        self.coalesce = coalesce
+
+    def setting(self, key):
+        value = self.config.get(key)
+        if not value:
+            raise PermanentActionError(f"ACTION_EXECUTORS['{key}'] is not configured; '{self.action_name}' cannot be sent.")
+        return value
+
+    def destination(self):
+        value = self.config.get(self.destination_key)
+        return tuple(value) if isinstance(value, list) else value
+
+    def coalesce_key(self, log):
+        """Logs with the same key are sent as one message."""
+        return log.workflow_rule_id if self.coalesce else ('log', log.id)
+
+    def execute(self, job):
+        """Runs one job; raises on failure."""
+        error = self.execute_batch([job])[0]
+        if error is not None:
+            raise error
+
+    def execute_batch(self, jobs):
+        """
+        Runs a batch of jobs of this action type and returns one entry per job,
+        in order: None on success, or the exception the job failed with.
+        Every request to the provider first takes a token from the rate limit.
+        When send_batch raises PartialSendError, the jobs whose messages were
+        delivered succeed and only the rest fail.
+        """
+        groups = {}
+        for index, job in enumerate(jobs):
+            groups.setdefault(self.coalesce_key(job.execution_log), []).append(index)
+        groups = list(groups.values())
+
+        errors = [None] * len(jobs)
+        for start in range(0, len(groups), self.max_batch_size):
+            chunk = groups[start:start + self.max_batch_size]
+            try:
+                rate_limiter.acquire(self.action_name, self.destination())
+                self.send_batch([Send(jobs[indexes[0]].execution_log, len(indexes)) for indexes in chunk])
+            except PartialSendError as e:
+                for indexes in chunk[e.sent:]:
+                    for index in indexes:
+                        errors[index] = e.error
+            except Exception as e:
+                for indexes in chunk:
+                    for index in indexes:
+                        errors[index] = e
+        return errors
+
+    def send_batch(self, sends):
+        """
+        Sends the batch. Raises PartialSendError when some of its messages were
+        delivered before the failure; any other exception fails the whole batch.
+        """
+        raise NotImplementedError
+
+
+class EmailExecutor(ActionExecutor):
+    action_name = 'Send Email'
+    max_batch_size = DEFAULT_BATCH_SIZE
+    transport_kind = 'email'
+    destination_key = 'EMAIL_RECIPIENTS'
+
+    def send_batch(self, sends):
+        recipients = self.setting('EMAIL_RECIPIENTS')
+        messages = [
+            EmailMessage(
+                subject=f"[Workflow] {send.log.workflow_rule.name}",
+                body=describe(send),
+                from_email=self.config.get('EMAIL_FROM') or None,
+                to=recipients,
+            )
+            for send in sends
+        ]
+        # One SMTP session for the whole batch; raises PartialSendError if it breaks mid-way.
+        self.transport.send_messages(messages)
+
+
+class SlackExecutor(ActionExecutor):
+    action_name = 'Send Slack Notification'
+    max_batch_size = 20
+    destination_key = 'SLACK_WEBHOOK_URL'
+
+    def send_batch(self, sends):
+        # Every message goes to the same webhook (channel), so the batch is one post.
+        self.transport.post_json(self.setting('SLACK_WEBHOOK_URL'), {
+            'text': "\n".join(describe(send) for send in sends),
+        })
+
+
+class NativeNotificationExecutor(ActionExecutor):
+    action_name = 'Send Native Notification'
+    # Push APIs such as Expo accept up to 100 messages per request.
+    max_batch_size = 100
+    destination_key = 'PUSH_URL'
+
+    def send_batch(self, sends):
+        self.transport.post_json(self.setting('PUSH_URL'), [
+            {
+                'title': send.log.workflow_rule.name,
+                'body': describe(send),
+                'data': {'execution_log_id': send.log.id, 'count': send.count},
+            }
+            for send in sends
+        ])
+
+
+class CreateTaskExecutor(ActionExecutor):
+    action_name = 'Create Task'
+    max_batch_size = DEFAULT_BATCH_SIZE
+    destination_key = 'TASKS_URL'
+
+    def send_batch(self, sends):
+        self.transport.post_json(self.setting('TASKS_URL'), {'tasks': [
+            {
+                'title': send.log.workflow_rule.name,
+                'description': describe(send),
+                'external_id': f"workflow-log-{send.log.id}",  # lets the task API drop duplicates on retry
+            }
+            for send in sends
+        ]})
+
+
+class DeviceExecutor(ActionExecutor):
+    action_name = 'Turn Device On/Off'
+    # Device commands are not batched: each one must succeed or fail on its own.
+    max_batch_size = 1
+    destination_key = 'DEVICE_GATEWAY_URL'
+
+    def send_batch(self, sends):
+        log = sends[0].log
+        # The gateway maps the rule to its device and target state.
+        self.transport.post_json(self.setting('DEVICE_GATEWAY_URL'), {
+            'rule_id': log.workflow_rule_id,
+            'rule': log.workflow_rule.name,
+            'trigger': log.trigger_name_snapshot,
+            'execution_log_id': log.id,
+        })
+
+
+# --- Registry ---
+
+# Destinations the fake transport uses for anything left unconfigured.
+FAKE_DESTINATIONS = {
+    'EMAIL_RECIPIENTS': ['workflows@example.com'],
+    'SLACK_WEBHOOK_URL': 'fake://slack',
+    'PUSH_URL': 'fake://push',
+    'TASKS_URL': 'fake://tasks',
+    'DEVICE_GATEWAY_URL': 'fake://devices',
+}
+
+EXECUTOR_CLASSES = {}
+
+
+def register_executor(executor_class):
+    """Registers an ActionExecutor subclass for its action_name (usable as a class decorator)."""
+    EXECUTOR_CLASSES[executor_class.action_name] = executor_class
+    return executor_class
+
+
+for _executor_class in (EmailExecutor, SlackExecutor, NativeNotificationExecutor, CreateTaskExecutor, DeviceExecutor):
+    register_executor(_executor_class)
+
+
+class ExecutorRegistry:
+    """The process-wide executors and the transports they share."""
+
+    def __init__(self, config):
+        batch_size = config.get('BATCH_SIZE', DEFAULT_BATCH_SIZE)
+        transport = config.get('TRANSPORT', 'fake')
+        if transport == 'fake':
+            config = {**config, **{key: value for key, value in FAKE_DESTINATIONS.items() if not config.get(key)}}
+            self.http = FakeTransport(latency=config.get('FAKE_LATENCY_SECONDS', 0.0))
+            self.email = FakeTransport(latency=config.get('FAKE_LATENCY_SECONDS', 0.0))
+        elif transport == 'live':
+            self.http = HTTPTransport(
+                timeout=config.get('HTTP_TIMEOUT', DEFAULT_HTTP_TIMEOUT),
+                max_connections=config.get('HTTP_MAX_CONNECTIONS', DEFAULT_HTTP_MAX_CONNECTIONS),
+            )
+            self.email = SMTPTransport(max_connections=config.get('SMTP_MAX_CONNECTIONS', DEFAULT_SMTP_MAX_CONNECTIONS))
+        else:
+            raise ValueError(f"Unknown ACTION_EXECUTORS TRANSPORT '{transport}'; expected 'fake' or 'live'.")
+        self.config = config
+
+        transports = {'http': self.http, 'email': self.email}
+        self.executors = {}
+        for action_name, executor_class in EXECUTOR_CLASSES.items():
+            executor = executor_class(
+                transports[executor_class.transport_kind], config,
+                coalesce=coalesce_window_for(action_name) > 0,
+            )
+            executor.max_batch_size = max(min(executor.max_batch_size, batch_size), 1)
+            self.executors[action_name] = executor
+
+    def get(self, action_name):
+        executor = self.executors.get(action_name)
+        if executor is None:
+            raise PermanentActionError(f"No executor is registered for action '{action_name}'.")
+        return executor
+
+    def close(self):
+        self.http.close()
+        self.email.close()
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry():
+    """The process-wide ExecutorRegistry, built from settings.ACTION_EXECUTORS on first use."""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ExecutorRegistry(getattr(settings, 'ACTION_EXECUTORS', {}))
+    return _registry
+
+
+def get_executor(action_name):
+    return get_registry().get(action_name)
+
+
+def batch_size_for(action_name):
+    """How many jobs of this action type the worker pool may hand an executor at once."""
+    executor = get_registry().executors.get(action_name)
+    return executor.max_batch_size if executor is not None else 1
+
+
+def close_executors():
+    """Closes the pooled connections; the next job builds a fresh registry."""
+    global _registry
+    with _registry_lock:
+        if _registry is not None:
+            _registry.close()
+            _registry = None
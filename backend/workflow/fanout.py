@@ -0,0 +1,126 @@
+from django.db import IntegrityError, connection, transaction
+from django.utils import timezone
+
+from .jobs import enqueue_immediate_logs, enqueue_scheduled_logs
+from .models import WorkflowExecutionLog, WorkflowRule
+from .routing import routing_table
+from .stats import record_execution_events, stat_key
+from .versioning import bump_table_version
+
+
+def build_execution_logs(trigger_name, rules, now=None):
+    """
+    Builds (unsaved) execution logs for a trigger firing against `rules`, a
+    sequence of routing.RoutedRule, so no query is issued here.
+
+    Returns (logs, simulation_errors); a rule that cannot be scheduled
+    produces an error entry instead of a log, in the same shape
+    simulate_trigger has always reported.
+    """
+    now = now or timezone.now()
+    logs = []
+    simulation_errors = []
+
+    for rule in rules:
+        log = WorkflowExecutionLog(
+            # Only id and name are needed to save and serialize the log.
+            workflow_rule=WorkflowRule(id=rule.id, name=rule.name),
+            trigger_name_snapshot=trigger_name,
+            action_name_snapshot=rule.action_name,
+        )
+        if rule.rule_type == 'immediate':
+            log.status = 'SIMULATED_IMMEDIATE'
+            log.actual_execution_time = now
+        elif rule.rule_type == 'scheduled':
+            if rule.delay is None:
+                simulation_errors.append(_error_entry(
+                    rule, trigger_name,
+                    f"Rule '{rule.name}' is scheduled but has invalid delay parameters."
+                ))
+                continue
+            log.status = 'SIMULATED_SCHEDULED'
+            log.scheduled_execution_time = now + rule.delay
+        else:
+            simulation_errors.append(_error_entry(
+                rule, trigger_name,
+                f"Rule '{rule.name}' has an unknown rule_type: {rule.rule_type}."
+            ))
+            continue
+        logs.append(log)
+
+    return logs, simulation_errors
+
+
+def _error_entry(rule, trigger_name, details):
+    return {
+        'workflow_rule_id': rule.id,
+        'trigger_name_snapshot': trigger_name,
+        'action_name_snapshot': rule.action_name,
+        'status': 'SIMULATION_ERROR',
+        'details': details,
+    }
+
+
+def stale_rule_error(log):
+    """The error entry for a log skipped because its rule was deactivated or deleted meanwhile."""
+    return {
+        'workflow_rule_id': log.workflow_rule_id,
+        'trigger_name_snapshot': log.trigger_name_snapshot,
+        'action_name_snapshot': log.action_name_snapshot,
+        'status': 'SIMULATION_ERROR',
+        'details': f"Rule '{log.workflow_rule.name}' was deactivated or deleted; no log was saved.",
+    }
+
+
+def create_execution_logs(logs, batch_size=None):
+    """
+    Inserts `logs` in one transaction with a single bulk INSERT (split into
+    statements of `batch_size` rows if given), queues a ScheduledJob for each
+    scheduled log and an OutboxMessage for each immediate one, and updates the
+    stats rollup.
+
+    The logs were built from a routing table that may be stale when another
+    process changed the rules, so logs of rules that are no longer active are
+    skipped rather than failing the whole INSERT.
+    Returns (created, skipped): the saved logs with primary keys set, and the
+    skipped ones.
+    """
+    if not logs:
+        return [], []
+    try:
+        created, skipped = _insert_execution_logs(logs, batch_size)
+    except IntegrityError:
+        # A rule was deleted between the check and the INSERT; the retry's check sees it.
+        for log in logs:
+            log.pk = None
+            log._state.adding = True
+        created, skipped = _insert_execution_logs(logs, batch_size)
+    # bulk_create does not send post_save.
+    bump_table_version(WorkflowExecutionLog)
+    if skipped:
+        routing_table.invalidate()
+    return created, skipped
+
+
+def _insert_execution_logs(logs, batch_size):
+    with transaction.atomic():
+        active_rule_ids = set(
+            WorkflowRule.objects
+            .filter(id__in={log.workflow_rule_id for log in logs}, is_active=True)
+            .values_list('id', flat=True)
+        )
+        skipped = [log for log in logs if log.workflow_rule_id not in active_rule_ids]
+        logs = [log for log in logs if log.workflow_rule_id in active_rule_ids]
+        if connection.features.can_return_rows_from_bulk_insert:
+            created = WorkflowExecutionLog.objects.bulk_create(logs, batch_size=batch_size)
+        else:
+            # Callers need the ids back; backends that cannot return them from a
+            # bulk INSERT fall back to one INSERT per row.
+            for log in logs:
+                log.save()
+            created = logs
+        # Work is queued atomically with the log rows: a crash can lose neither.
+        enqueue_scheduled_logs(created)
+        enqueue_immediate_logs(created)
+        record_execution_events(stat_key(log) for log in created)
+    return created, skipped
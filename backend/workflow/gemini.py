@@ -8,7 +8,12 @@ import os
 from google import genai
 from google.genai import types
 import json # For parsing
-from copy import deepcopy # For safely modifying contents list
+import asyncio
+import hashlib
+import threading
+import time
+import weakref
+import httpx
 from dotenv import load_dotenv # Import load_dotenv
 
 # Load environment variables from .env file
@@ -606,6 +611,78 @@ When the user gives a natural-language description of a desired automation, prod
 # --- End of User's existing model, contents, and config ---
 
 
+def _compute_template_fingerprint() -> str:
+    """Short hash of the few-shot examples and system instruction; part of the prompt-cache key."""
+    digest = hashlib.sha256()
+    for content in original_contents_template:
+        digest.update(content.role.encode("utf-8"))
+        for part in content.parts:
+            digest.update((part.text or "").encode("utf-8"))
+    for part in generation_config_from_user_file.system_instruction:
+        digest.update((part.text or "").encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+template_fingerprint = _compute_template_fingerprint()
+
+
+PROMPT_PLACEHOLDER = "INSERT_INPUT_HERE"
+
+
+def _build_fewshot_prefix():
+    """
+    The few-shot examples without the trailing placeholder turn, built once at
+    import. The Content objects are never mutated, so every request shares them
+    and only allocates its own final user turn.
+    """
+    if original_contents_template and \
+       original_contents_template[-1].role == "user" and \
+       len(original_contents_template[-1].parts) > 0 and \
+       original_contents_template[-1].parts[0].text == PROMPT_PLACEHOLDER:
+        return tuple(original_contents_template[:-1])
+    return None
+
+
+_fewshot_prefix = _build_fewshot_prefix()
+
+
+def build_contents(user_prompt_text: str) -> list | None:
+    """The request contents: the shared few-shot prefix plus the user's prompt as the last turn."""
+    if _fewshot_prefix is None:
+        return None
+    return [
+        *_fewshot_prefix,
+        types.Content(role="user", parts=[types.Part.from_text(text=user_prompt_text)]),
+    ]
+
+
+_client = None
+_client_api_key = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> genai.Client | None:
+    """
+    Returns the process-wide Gemini client, creating it on first use.
+
+    The client owns an httpx connection pool, so reusing it keeps HTTP
+    keep-alive connections (and their TLS sessions) open across requests
+    instead of paying a new handshake per prompt. It is rebuilt only if
+    GEMINI_API_KEY changes.
+    """
+    global _client, _client_api_key
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        print("Error: GEMINI_API_KEY environment variable not set in gemini.py.")
+        return None
+    if _client is None or _client_api_key != api_key:
+        with _client_lock:
+            if _client is None or _client_api_key != api_key:
+                _client = genai.Client(api_key=api_key)
+                _client_api_key = api_key
+    return _client
+
+
 def get_ai_suggestions_for_prompt(user_prompt_text: str) -> str | None:
     """
     Sends the user prompt to the Gemini model using the pre-defined fine-tuning
@@ -616,46 +693,41 @@ def get_ai_suggestions_for_prompt(user_prompt_text: str) -> str | None:
 
     Returns:
         A JSON string from the AI if successful, otherwise None.
+    Raises:
+        AIUpstreamTimeout: if the call did not finish within GEMINI_TIMEOUT_SECONDS.
     """
-    api_key = os.environ.get("GEMINI_API_KEY")
-    if not api_key:
-        print("Error: GEMINI_API_KEY environment variable not set in gemini.py.")
+    client = get_client()
+    if client is None:
         return None
+    deadline = time.monotonic() + GEMINI_TIMEOUT_SECONDS
+    # HttpOptions.timeout (milliseconds) bounds each connect/read, so a stalled
+    # stream cannot hold the thread; the deadline check bounds a slow one.
+    config = generation_config_from_user_file.model_copy(update={
+        'http_options': types.HttpOptions(timeout=int(GEMINI_TIMEOUT_SECONDS * 1000)),
+    })
 
     try:
-        client = genai.Client(api_key=api_key) # As per user's original code
-
-        # Deep copy the module-level contents template to safely insert the user prompt
-        final_contents = deepcopy(original_contents_template)
-        
-        # The last Content object in the template is the placeholder
-        if final_contents and \
-           len(final_contents) > 0 and \
-           final_contents[-1].role == "user" and \
-           len(final_contents[-1].parts) > 0 and \
-           final_contents[-1].parts[0].text == "INSERT_INPUT_HERE":
-            
-            final_contents[-1].parts[0] = types.Part.from_text(text=user_prompt_text)
-        else:
+        final_contents = build_contents(user_prompt_text)
+        if final_contents is None:
             # This case should ideally not be reached if the template is structured as expected.
             print("Error: Could not find or replace the 'INSERT_INPUT_HERE' placeholder in gemini.py contents template.")
-            # Fallback: append as a new user message if placeholder logic failed,
-            # though this deviates from strict replacement of the placeholder.
-            # For safety, returning None is better if the template isn't right.
             return None
 
         # Accumulate streamed response text
         # Using client.models.generate_content_stream as in user's original code
-        full_response_text = ""
+        response_chunks = []
         # The model name and config are taken from the module-level variables defined above,
         # which mirror the user's original `gemini.py` structure.
         for chunk in client.models.generate_content_stream( # client.models.generate_content_stream is from user's code
             model=model_name, 
             contents=final_contents,
-            config=generation_config_from_user_file, 
+            config=config,
         ):
             if hasattr(chunk, 'text') and chunk.text: # Ensure chunk.text exists
-                full_response_text += chunk.text
+                response_chunks.append(chunk.text)
+            if time.monotonic() > deadline:
+                raise AIUpstreamTimeout(f"AI service did not respond within {GEMINI_TIMEOUT_SECONDS:g} seconds.")
+        full_response_text = "".join(response_chunks)
         
         if not full_response_text.strip():
             print("Error: AI response was empty or contained no text.")
@@ -663,6 +735,12 @@ def get_ai_suggestions_for_prompt(user_prompt_text: str) -> str | None:
             
         return full_response_text.strip()
 
+    except AIUpstreamTimeout as e:
+        print(f"Error: {e}")
+        raise
+    except httpx.TimeoutException:
+        print(f"Error: AI service did not respond within {GEMINI_TIMEOUT_SECONDS:g} seconds.")
+        raise AIUpstreamTimeout(f"AI service did not respond within {GEMINI_TIMEOUT_SECONDS:g} seconds.")
     except Exception as e:
         # It's good practice to log the actual exception
         import traceback
@@ -670,6 +748,117 @@ def get_ai_suggestions_for_prompt(user_prompt_text: str) -> str | None:
         print(f"Traceback: {traceback.format_exc()}")
         return None
 
+class AIUpstreamTimeout(Exception):
+    """The Gemini call did not finish within GEMINI_TIMEOUT_SECONDS."""
+
+
+# Env-configurable so ops can tune them per deployment without a code change.
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", "16"))
+GEMINI_TIMEOUT_SECONDS = float(os.environ.get("GEMINI_TIMEOUT_SECONDS", "30"))
+
+# One semaphore per event loop (asyncio primitives must not be shared across loops).
+_semaphores = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+class AIServiceUnavailable(Exception):
+    """The Gemini call could not be made (missing API key or broken template)."""
+
+
+async def aiter_ai_response_chunks(user_prompt_text: str):
+    """
+    Async generator over the text chunks of Gemini's streamed response, as they
+    arrive. Holds one of the GEMINI_MAX_CONCURRENCY slots of the current event
+    loop while streaming; the whole call (queueing included) must finish within
+    GEMINI_TIMEOUT_SECONDS.
+
+    Raises:
+        AIServiceUnavailable: if the client or the contents template is unusable.
+        AIUpstreamTimeout: if the deadline passes before the stream ends.
+        Any error raised by the SDK is propagated.
+    """
+    client = get_client()
+    if client is None:
+        raise AIServiceUnavailable("GEMINI_API_KEY environment variable not set.")
+    final_contents = build_contents(user_prompt_text)
+    if final_contents is None:
+        raise AIServiceUnavailable("Could not find or replace the 'INSERT_INPUT_HERE' placeholder in gemini.py contents template.")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + GEMINI_TIMEOUT_SECONDS
+
+    async def before_deadline(awaitable):
+        # A per-step deadline rather than one timeout around the generator, so
+        # cancellation never fires inside the consumer's code between yields.
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise AIUpstreamTimeout(f"AI service did not respond within {GEMINI_TIMEOUT_SECONDS:g} seconds.")
+        try:
+            return await asyncio.wait_for(awaitable, timeout=remaining)
+        except asyncio.TimeoutError:
+            raise AIUpstreamTimeout(f"AI service did not respond within {GEMINI_TIMEOUT_SECONDS:g} seconds.")
+
+    semaphore = _get_semaphore()
+    await before_deadline(semaphore.acquire())
+    try:
+        stream = await before_deadline(client.aio.models.generate_content_stream(
+            model=model_name,
+            contents=final_contents,
+            config=generation_config_from_user_file,
+        ))
+        iterator = stream.__aiter__()
+        while True:
+            try:
+                chunk = await before_deadline(iterator.__anext__())
+            except StopAsyncIteration:
+                break
+            if hasattr(chunk, 'text') and chunk.text:
+                yield chunk.text
+    finally:
+        semaphore.release()
+
+
+async def get_ai_suggestions_for_prompt_async(user_prompt_text: str) -> str | None:
+    """
+    Async counterpart of get_ai_suggestions_for_prompt() for ASGI views.
+
+    Uses the shared client's async transport, so waiting on Gemini does not hold
+    a worker thread. Concurrency and timeout limits are those of
+    aiter_ai_response_chunks().
+
+    Raises:
+        AIUpstreamTimeout: if the call timed out.
+    Returns:
+        A JSON string from the AI if successful, otherwise None.
+    """
+    try:
+        full_response_text = "".join([chunk async for chunk in aiter_ai_response_chunks(user_prompt_text)])
+    except AIUpstreamTimeout as e:
+        print(f"Error: {e}")
+        raise
+    except AIServiceUnavailable as e:
+        print(f"Error: {e}")
+        return None
+    except Exception as e:
+        import traceback
+        print(f"Error during async Gemini API call in gemini.py: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return None
+
+    if not full_response_text.strip():
+        print("Error: AI response was empty or contained no text.")
+        return None
+    return full_response_text.strip()
+
+
 # Commenting out the original generate function and if __name__ == "__main__": block
 # def generate():
 #     client = genai.Client(
@@ -0,0 +1,334 @@
+"""
+The scheduler's job queue (ScheduledJob), the immediate-rule outbox
+(OutboxMessage) and the writer that reports job outcomes back to the audit log.
+
+Scheduled logs get a ScheduledJob row, and immediate logs an OutboxMessage
+row, in the same transaction that creates them (see workflow.fanout). Both
+tables are worked the same way, with `queue_model` selecting the table. Workers claim due jobs with leases, run them,
+and hand each outcome to a LogStatusWriter. A failed job is released with a
+later due_at (exponential backoff with jitter) until it runs out of attempts,
+when its log is dead-lettered. The writer runs on a background
+thread and applies outcomes in batches. Each batch is one transaction that
+updates the log rows, deletes the finished jobs and updates the stats rollup,
+so the queue only ever holds unfinished work.
+"""
+import logging
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import Counter, namedtuple
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .executors import PermanentActionError, get_executor
+from .models import OutboxMessage, ScheduledJob, WorkflowExecutionLog
+from .stats import record_execution_events, stat_key
+from .versioning import bump_table_version
+
+logger = logging.getLogger(__name__)
+
+# The result of running one claimed job. `log` is the job's WorkflowExecutionLog;
+# `retry_at` is set when a failed job is to run again instead of finishing.
+JobOutcome = namedtuple(
+    'JobOutcome', ['job_id', 'lease_token', 'log', 'status', 'finished_at', 'details', 'retry_at'],
+    defaults=(None,),
+)
+
+# Outcome statuses that count as a failed job (a retried attempt also counts).
+FAILED_STATUSES = ('EXECUTION_ERROR', 'DEAD_LETTERED')
+
+DEFAULT_RETRY_POLICY = {
+    'MAX_ATTEMPTS': 5,
+    'BASE_DELAY_SECONDS': 30,
+    'MAX_DELAY_SECONDS': 60 * 60,
+}
+
+
+def retry_policy():
+    return {**DEFAULT_RETRY_POLICY, **getattr(settings, 'SCHEDULER_RETRY', {})}
+
+
+def retry_delay(attempt, policy=None):
+    """
+    Seconds to wait before running a job again after its `attempt`-th failure:
+    exponential backoff capped at MAX_DELAY_SECONDS, with "equal jitter" (half
+    fixed, half random) so jobs that failed together do not retry together.
+    """
+    policy = policy or retry_policy()
+    ceiling = min(policy['MAX_DELAY_SECONDS'], policy['BASE_DELAY_SECONDS'] * 2 ** max(attempt - 1, 0))
+    return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+
+def enqueue_scheduled_logs(logs):
+    """Creates the ScheduledJob of every saved SIMULATED_SCHEDULED log in `logs`."""
+    jobs = [
+        ScheduledJob(execution_log_id=log.id, due_at=log.scheduled_execution_time)
+        for log in logs if log.status == 'SIMULATED_SCHEDULED'
+    ]
+    return ScheduledJob.objects.bulk_create(jobs)
+
+
+def enqueue_immediate_logs(logs):
+    """Creates the OutboxMessage of every saved SIMULATED_IMMEDIATE log in `logs`."""
+    messages = [
+        OutboxMessage(execution_log_id=log.id, due_at=log.actual_execution_time or log.logged_at or timezone.now())
+        for log in logs if log.status == 'SIMULATED_IMMEDIATE'
+    ]
+    return OutboxMessage.objects.bulk_create(messages)
+
+
+def is_failure(outcome):
+    """True for a job that failed, including an attempt that will be retried."""
+    return outcome.status in FAILED_STATUSES or outcome.retry_at is not None
+
+
+def claimable_q(now):
+    """Jobs that are due and not held by a live lease."""
+    return Q(due_at__lte=now) & (Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now))
+
+
+def claim_jobs(batch_size, lease_seconds, ids=None, queue_model=ScheduledJob):
+    """
+    Claims up to `batch_size` due jobs with a single conditional UPDATE and
+    returns (lease_token, claimed_jobs). Each job has its log and rule loaded.
+    With `ids`, only those jobs are considered (those that are still claimable).
+    `queue_model` is ScheduledJob or OutboxMessage.
+
+    The claim condition is repeated on the UPDATE itself, so when two workers
+    race for the same jobs, each job goes to only one of them. The loser's
+    UPDATE no longer matches once the winner holds a live lease.
+    """
+    now = timezone.now()
+    lease_token = uuid.uuid4().hex
+    if ids is not None:
+        candidate_ids = list(ids)[:batch_size]
+    else:
+        candidate_ids = (
+            queue_model.objects
+            .filter(claimable_q(now))
+            .order_by('-priority', 'due_at', 'id')
+            .values('id')[:batch_size]
+        )
+    claimed_count = queue_model.objects.filter(claimable_q(now), id__in=candidate_ids).update(
+        lease_token=lease_token,
+        lease_expires_at=now + timedelta(seconds=lease_seconds),
+        attempts=F('attempts') + 1,
+        updated_at=now,
+    )
+    if not claimed_count:
+        return lease_token, []
+
+    claimed_jobs = list(
+        queue_model.objects
+        .filter(lease_token=lease_token)
+        .select_related('execution_log__workflow_rule')
+        .order_by('-priority', 'due_at', 'id')
+    )
+    return lease_token, claimed_jobs
+
+
+def run_jobs(items):
+    """
+    Executes claimed jobs of one action type, given as (job, lease_token)
+    pairs, as one executor batch and returns their JobOutcomes in order.
+    """
+    jobs = [job for job, lease_token in items]
+    coalesced = Counter()
+    try:
+        executor = get_executor(jobs[0].execution_log.action_name_snapshot)
+        keys = [executor.coalesce_key(job.execution_log) for job in jobs]
+        coalesced.update(keys)
+        errors = executor.execute_batch(jobs)
+    except Exception as e:
+        keys = [None] * len(jobs)
+        errors = [e] * len(jobs)
+    return [
+        job_outcome(job, lease_token, error, coalesced=coalesced[key] or 1)
+        for (job, lease_token), key, error in zip(items, keys, errors)
+    ]
+
+
+def job_outcome(job, lease_token, error=None, coalesced=1):
+    """
+    The JobOutcome of a run that raised `error` (None: it succeeded), sent as
+    one message together with `coalesced` - 1 duplicates of its rule. A failure
+    is retried with backoff until the job has been attempted MAX_ATTEMPTS
+    times; then the log is dead-lettered. PermanentActionError fails the job
+    immediately.
+    """
+    log = job.execution_log
+    if error is None:
+        finished_at = timezone.now()
+        details = f"Successfully processed by {job.processed_by} at {finished_at}."
+        if coalesced > 1:
+            details += f" Sent as one message for {coalesced} executions of this rule."
+        return JobOutcome(
+            job.id, lease_token, log, job.success_status or log.status, finished_at, details,
+        )
+    failed_at = timezone.now()
+    if isinstance(error, PermanentActionError):
+        logger.error(f"Permanent error processing WorkflowExecutionLog ID {log.id} for rule '{log.workflow_rule.name}': {str(error)}")
+        # actual_execution_time is set to now to indicate when the error occurred during processing attempt
+        return JobOutcome(
+            job.id, lease_token, log, 'EXECUTION_ERROR', failed_at,
+            f"Error during scheduled execution: {str(error)}",
+        )
+    policy = retry_policy()
+    if job.attempts < policy['MAX_ATTEMPTS']:
+        retry_at = failed_at + timedelta(seconds=retry_delay(job.attempts, policy))
+        logger.warning(f"Attempt {job.attempts} of WorkflowExecutionLog ID {log.id} failed, retrying at {retry_at}: {str(error)}")
+        return JobOutcome(
+            job.id, lease_token, log, log.status, failed_at,
+            f"Attempt {job.attempts} failed: {str(error)}. Retrying at {retry_at}.",
+            retry_at,
+        )
+    logger.error(
+        f"Error processing WorkflowExecutionLog ID {log.id} for rule '{log.workflow_rule.name}': {str(error)}",
+        exc_info=error,
+    )
+    return JobOutcome(
+        job.id, lease_token, log, 'DEAD_LETTERED', failed_at,
+        f"Failed after {job.attempts} attempt(s): {str(error)}",
+    )
+
+
+def write_outcomes(outcomes, queue_model=ScheduledJob):
+    """
+    Applies job outcomes in one transaction and returns how many were written.
+    The stats rollup records each finished job whose log changed status.
+
+    An outcome only counts if its job still carries the lease it was run under.
+    If the lease expired and another worker reclaimed the job, that worker
+    reports the outcome instead.
+    """
+    if not outcomes:
+        return 0
+    with transaction.atomic():
+        held = set(
+            queue_model.objects.select_for_update()
+            .filter(id__in=[outcome.job_id for outcome in outcomes])
+            .values_list('id', 'lease_token')
+        )
+        current = [outcome for outcome in outcomes if (outcome.job_id, outcome.lease_token) in held]
+        if len(current) < len(outcomes):
+            logger.warning(
+                f"{len(outcomes) - len(current)} job outcome(s) dropped: their lease expired "
+                f"and the jobs were reclaimed by another worker."
+            )
+        if not current:
+            return 0
+
+        finished = [outcome for outcome in current if outcome.retry_at is None]
+        retried = [outcome for outcome in current if outcome.retry_at is not None]
+
+        logs = []
+        status_changed = set()
+        for outcome in current:
+            log = outcome.log
+            if log.status != outcome.status:
+                status_changed.add(outcome.job_id)
+            log.status = outcome.status
+            log.details = outcome.details
+            log.updated_at = outcome.finished_at
+            if outcome.retry_at is None:
+                log.actual_execution_time = outcome.finished_at
+            elif log.status == 'SIMULATED_SCHEDULED':
+                # The log shows when the job will really run next.
+                log.scheduled_execution_time = outcome.retry_at
+            logs.append(log)
+        WorkflowExecutionLog.objects.bulk_update(
+            logs, ['status', 'actual_execution_time', 'scheduled_execution_time', 'details', 'updated_at']
+        )
+
+        if retried:
+            # Released with a later due_at: the normal due query picks them up again.
+            queue_model.objects.bulk_update(
+                [queue_model(id=outcome.job_id, due_at=outcome.retry_at, lease_token=None, lease_expires_at=None,
+                             updated_at=outcome.finished_at)
+                 for outcome in retried],
+                ['due_at', 'lease_token', 'lease_expires_at', 'updated_at'],
+            )
+        if finished:
+            queue_model.objects.filter(id__in=[outcome.job_id for outcome in finished]).delete()
+            record_execution_events(
+                stat_key(outcome.log, at=outcome.finished_at)
+                for outcome in finished if outcome.job_id in status_changed
+            )
+    # bulk_update does not send post_save.
+    bump_table_version(WorkflowExecutionLog)
+    return len(current)
+
+
+class LogStatusWriter:
+    """
+    Background writer for job outcomes. Workers call submit() and move on. A
+    single thread applies outcomes in batches of up to `flush_size`, or after
+    `flush_interval` seconds, whichever comes first. close() flushes what is
+    left and waits for the thread to finish.
+
+    An outcome that is lost, for example because the process dies before a
+    flush, leaves its job in the queue. The job's lease then expires and the
+    job runs again, so every job runs at least once.
+    """
+    _STOP = object()
+    write_attempts = 5
+
+    def __init__(self, flush_size=500, flush_interval=0.5, queue_model=ScheduledJob):
+        self.flush_size = flush_size
+        self.queue_model = queue_model
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.failed_batches = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='log-status-writer', daemon=True)
+        self._thread.start()
+
+    def submit(self, outcome):
+        self._queue.put(outcome)
+
+    def close(self):
+        self._queue.put(self._STOP)
+        self._thread.join()
+
+    def _run(self):
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                deadline = time.monotonic() + self.flush_interval
+                while len(batch) < self.flush_size:
+                    try:
+                        item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                    except queue.Empty:
+                        break
+                    if item is self._STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                if batch:
+                    self._flush(batch)
+        finally:
+            # This thread has its own database connection.
+            connection.close()
+
+    def _flush(self, batch):
+        close_old_connections()
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                self.written += write_outcomes(batch, self.queue_model)
+                return
+            except DatabaseError as e:
+                if attempt < self.write_attempts:
+                    # Usually a lock conflict with a concurrent claim; back off and retry.
+                    logger.warning(f"Writing {len(batch)} job outcome(s) failed (attempt {attempt}): {str(e)}")
+                    time.sleep(0.05 * 2 ** attempt)
+                    continue
+                # The jobs stay queued; their leases expire and they run again.
+                self.failed_batches += 1
+                logger.error(f"Failed to write {len(batch)} job outcome(s): {str(e)}", exc_info=True)
@@ -0,0 +1,291 @@
+"""
+Offline rule suggestions for simple prompts.
+
+The trigger and action vocabulary is small and fixed (see migration
+0002_seed_initial_data), and most prompts are of the form "when X, do Y
+(after N hours)". This module recognises that form with keyword/synonym
+patterns, fuzzy matching of the canonical names and delay-expression
+extraction, and produces JSON in the same shape as the Gemini response so it
+goes through the same mapping (workflow.suggestions).
+
+Every result carries a confidence in [0, 1]; generate-from-ai only calls
+Gemini when it is below settings.AI_LOCAL_SUGGESTION_THRESHOLD, and falls
+back to a partial local result when Gemini is unavailable.
+"""
+import difflib
+import json
+import re
+from collections import namedtuple
+
+from django.conf import settings
+
+LocalSuggestion = namedtuple('LocalSuggestion', ['response_json', 'confidence'])
+# A vocabulary hit: `score` is how sure the match is, `span` its position in the normalized prompt.
+Match = namedtuple('Match', ['name', 'score', 'span'])
+
+DEFAULT_THRESHOLD = 0.8
+
+STRONG = 1.0
+WEAK = 0.75
+
+# canonical name -> [(regex, score)]; canonical names must match the seeded rows.
+TRIGGER_PATTERNS = {
+    'Guest checks in': [
+        (r"\bguests? (?:checks?|checked|checking) ?in\b", STRONG),
+        (r"\bcheck[- ]?ins?\b|\bchecks in\b|\bchecked in\b", STRONG),
+        (r"\b(?:guests? )?arriv(?:es|al|ing)\b", WEAK),
+    ],
+    'Guest checks out': [
+        (r"\bguests? (?:checks?|checked|checking) ?out\b", STRONG),
+        (r"\bcheck[- ]?outs?\b|\bchecks out\b|\bchecked out\b", STRONG),
+        (r"\b(?:guests? )?(?:departs?|departure|leaves)\b", WEAK),
+    ],
+    'Cleaning completed': [
+        (r"\bclean(?:ing)? (?:is |has been |gets )?(?:completed?|done|finished)\b", STRONG),
+        (r"\b(?:housekeeping|cleaners?) (?:is |are |has |have )?(?:completed?|done|finished)\b", STRONG),
+        (r"\b(?:unit|room|property) (?:is |has been )?cleaned\b", STRONG),
+        (r"\bafter (?:the )?cleaning\b", WEAK),
+    ],
+    'Maintenance issue reported': [
+        (r"\bmaintenance (?:issue|problem|request|ticket)s?\b", STRONG),
+        (r"\b(?:issue|problem)s? (?:is |are )?reported\b", WEAK),
+        (r"\b(?:something|anything) (?:breaks|is broken)\b|\brepairs? (?:is |are )?needed\b", WEAK),
+    ],
+    'Booking canceled': [
+        (r"\b(?:booking|reservation)s? (?:is |are |gets |get )?cancell?ed\b", STRONG),
+        (r"\bcancell?ations?\b|\bcancels?\b|\bcancell?ed\b", WEAK),
+    ],
+    'Inventory running low': [
+        (r"\binventory (?:is |gets )?(?:running |runs |getting )?low\b", STRONG),
+        (r"\b(?:stock|supplies|supply|inventory) (?:is |are |gets |get )?(?:running |runs |getting )?low\b", STRONG),
+        (r"\blow (?:on )?(?:inventory|stock|supplies)\b|\bout of stock\b", STRONG),
+        (r"\brunning low\b|\bruns low\b", WEAK),
+    ],
+    'Guest Sends Message': [
+        (r"\bguests? (?:sends?|sent|writes?|texts?|messages?) (?:us |a |an |in )?(?:new )?(?:message|text|inquiry|question)?\b", STRONG),
+        (r"\b(?:new |incoming )?messages? (?:from|by) (?:a |the )?guests?\b", STRONG),
+        (r"\b(?:receive|get) (?:a |an )?(?:new )?message\b", WEAK),
+    ],
+    'New Booking Confirmed': [
+        (r"\bnew (?:booking|reservation)s?\b", STRONG),
+        (r"\b(?:booking|reservation)s? (?:is |are |gets |get )?confirmed\b", STRONG),
+        (r"\b(?:someone|guest) books\b|\bbooking comes in\b", WEAK),
+    ],
+    'Smart Device Alert': [
+        (r"\bsmart (?:device|lock|thermostat|sensor)s? (?:alert|alarm|goes off|triggers?|detects?)", STRONG),
+        (r"\bdevice alerts?\b|\bsmart device\b", STRONG),
+        (r"\b(?:smoke|noise|leak|motion) (?:alert|alarm|is detected|detected|sensor)s?\b", STRONG),
+        (r"\b(?:alarm|sensor) (?:goes off|triggers?)\b", WEAK),
+    ],
+}
+
+ACTION_PATTERNS = {
+    'Send Email': [
+        (r"\b(?:send|email|e-mail|mail)s? (?:an? |the |them |him |her )?(?:\w+ )?e-?mails?\b", STRONG),
+        (r"\be-?mails?\b", STRONG),
+    ],
+    'Send Slack Notification': [
+        (r"\bslack(?: (?:notifications?|messages?|alerts?|channel))?\b", STRONG),
+        (r"\b(?:notification|message|alert)s? (?:on|in|via|to) (?:the )?slack\b", STRONG),
+    ],
+    'Send Native Notification': [
+        (r"\b(?:push|native|mobile|app|in-app) (?:notifications?|alerts?|messages?)\b", STRONG),
+        (r"\bnotifications?\b|\bnotify\b|\bpush\b", WEAK),
+    ],
+    'Create Task': [
+        (r"\b(?:create|add|open|make|assign|log) (?:a |an |the )?(?:\w+ ){0,2}(?:tasks?|to-?dos?|tickets?|work orders?)\b", STRONG),
+        (r"\btasks?\b|\bto-?dos?\b", WEAK),
+    ],
+    'Turn Device On/Off': [
+        (r"\b(?:turn|switch|power) (?:on|off)\b|\b(?:turn|switch|power) (?:the |all )?(?:\w+ ){0,2}(?:on|off)\b", STRONG),
+        (r"\b(?:thermostat|lights?|heating|air ?conditioning|a/?c|hvac)\b", WEAK),
+    ],
+}
+
+# A weak match for the key is dropped when the value was also matched ("notify the team on Slack").
+SUBSUMED_ACTIONS = {'Send Native Notification': 'Send Slack Notification'}
+
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5, 'six': 6,
+    'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11, 'twelve': 12,
+    'fifteen': 15, 'twenty': 20, 'thirty': 30, 'forty-five': 45, 'fourty-five': 45,
+}
+UNIT_WORDS = {
+    'minute': 'minutes', 'min': 'minutes', 'hour': 'hours', 'hr': 'hours', 'h': 'hours',
+    'day': 'days', 'week': 'days',
+}
+# Used to express fractional delays ("1.5 hours") in a smaller whole unit.
+UNIT_IN_MINUTES = {'minutes': 1, 'hours': 60, 'days': 60 * 24}
+
+DELAY_RE = re.compile(
+    r"\b(?P<number>\d+(?:\.\d+)?|" + "|".join(sorted(NUMBER_WORDS, key=len, reverse=True)) + r")"
+    r"[ -]?(?P<unit>minute|min|hour|hr|h|day|week)s?\b"
+    r"(?P<direction> (?:before|prior))?"
+)
+HALF_HOUR_RE = re.compile(r"\bhalf an? hour\b")
+NEXT_DAY_RE = re.compile(r"\b(?:the )?(?:next|following) day\b|\bday after\b|\btomorrow\b")
+IMMEDIATE_RE = re.compile(r"\b(?:immediately|right away|instantly|straight away|as soon as)\b")
+# Conditions and exceptions that a single trigger -> action rule cannot express.
+UNSUPPORTED_RE = re.compile(r"\b(?:unless|except|only if|only when|but not|do not|don't|never|if not|every|each (?:day|week|morning|night))\b")
+
+
+def normalize(prompt_text):
+    text = prompt_text.lower().replace('’', "'")
+    text = re.sub(r"[^a-z0-9/'.\- ]+", ' ', text)
+    text = re.sub(r"(?<!\d)\.|\.(?!\d)", ' ', text)
+    return re.sub(r"\s+", ' ', text).strip()
+
+
+def _pattern_matches(text, patterns):
+    matches = []
+    for name, name_patterns in patterns.items():
+        for pattern, score in name_patterns:
+            for found in re.finditer(pattern, text):
+                matches.append(Match(name, score, found.span()))
+    return matches
+
+
+def _fuzzy_matches(text, names, cutoff=0.85):
+    """Canonical names written with typos ("guest chekcs in"), scored by similarity."""
+    words = text.split(' ')
+    matches = []
+    for name in names:
+        target = name.lower()
+        size = len(target.split(' '))
+        for start in range(0, max(len(words) - size + 1, 0)):
+            window = ' '.join(words[start:start + size])
+            ratio = difflib.SequenceMatcher(None, window, target).ratio()
+            if ratio >= cutoff:
+                offset = len(' '.join(words[:start])) + (1 if start else 0)
+                matches.append(Match(name, STRONG * ratio, (offset, offset + len(window))))
+    return matches
+
+
+def _overlaps(a, b):
+    return a[0] < b[1] and b[0] < a[1]
+
+
+def _resolve(matches):
+    """
+    Keeps the strongest match per name and drops matches whose span is covered
+    by a stronger (or longer) match of another name, e.g. "notification" inside
+    "slack notification".
+    """
+    ranked = sorted(matches, key=lambda m: (-m.score, -(m.span[1] - m.span[0]), m.span[0]))
+    kept = []
+    for match in ranked:
+        if any(_overlaps(match.span, other.span) for other in kept):
+            continue
+        if any(other.name == match.name for other in kept):
+            continue
+        kept.append(match)
+    return sorted(kept, key=lambda m: m.span[0])
+
+
+def extract_delay(text):
+    """
+    Returns (delays, before): the distinct (delay_time, delay_unit) pairs found,
+    and whether any of them is relative to *before* the event.
+    """
+    delays = []
+    before = False
+    if HALF_HOUR_RE.search(text):
+        delays.append((30, 'minutes'))
+    for found in DELAY_RE.finditer(text):
+        raw_number = found.group('number')
+        if raw_number in NUMBER_WORDS:
+            number = NUMBER_WORDS[raw_number]
+        else:
+            number = float(raw_number)
+        unit_word = found.group('unit')
+        unit = UNIT_WORDS[unit_word]
+        if unit_word == 'week':
+            number *= 7
+        if number != int(number):
+            # "1.5 hours" -> 90 minutes; the model stores whole numbers.
+            number = number * UNIT_IN_MINUTES[unit]
+            unit = 'minutes'
+        if raw_number in ('a', 'an') and HALF_HOUR_RE.search(text) and unit == 'hours':
+            continue
+        if found.group('direction'):
+            before = True
+        delays.append((int(number), unit))
+    if not delays and NEXT_DAY_RE.search(text):
+        delays.append((1, 'days'))
+    return list(dict.fromkeys(delays)), before
+
+
+def suggest_locally(prompt_text):
+    """
+    Returns a LocalSuggestion for `prompt_text`: the response JSON (same shape
+    as the Gemini response) and a confidence in [0, 1]. The JSON is None when
+    no trigger or no action could be recognised.
+    """
+    text = normalize(prompt_text or '')
+    if not text:
+        return LocalSuggestion(None, 0.0)
+
+    triggers = _resolve(_pattern_matches(text, TRIGGER_PATTERNS) + _fuzzy_matches(text, TRIGGER_PATTERNS))
+    trigger_spans = [match.span for match in triggers]
+    actions = _resolve([
+        match for match in _pattern_matches(text, ACTION_PATTERNS) + _fuzzy_matches(text, ACTION_PATTERNS)
+        # A phrase that named the trigger does not also name an action.
+        if not any(_overlaps(match.span, span) for span in trigger_spans)
+    ])
+    action_names = {match.name for match in actions}
+    actions = [
+        match for match in actions
+        if not (match.score < STRONG and SUBSUMED_ACTIONS.get(match.name) in action_names)
+    ]
+    if not triggers or not actions:
+        return LocalSuggestion(None, 0.0)
+
+    trigger = max(triggers, key=lambda m: m.score)
+    confidence = min([trigger.score] + [match.score for match in actions])
+    if len(triggers) > 1:
+        # "when a guest checks in or a booking is confirmed" needs more than one rule per action.
+        confidence *= 0.4
+
+    delays, before = extract_delay(text)
+    if len(delays) > 1:
+        confidence *= 0.5
+    if before:
+        # Rules can only run after their trigger.
+        confidence *= 0.3
+    if delays and IMMEDIATE_RE.search(text):
+        confidence *= 0.6
+    if UNSUPPORTED_RE.search(text):
+        confidence *= 0.6
+    if len(text.split(' ')) > 40:
+        confidence *= 0.7
+
+    delay_time, delay_unit = delays[0] if delays else (0, 'minutes')
+    rule_type = 'scheduled' if delays and delay_time > 0 else 'immediate'
+    description = prompt_text.strip()
+    suggestions = [
+        {
+            "workflow_name": f"{action.name} on {trigger.name}",
+            "workflow_description": description,
+            "trigger_name": trigger.name,
+            "action_name": action.name,
+            "rule_type": rule_type,
+            "delay_time": delay_time if rule_type == 'scheduled' else 0,
+            "delay_unit": delay_unit,
+        }
+        for action in actions
+    ]
+    return LocalSuggestion(json.dumps({"suggested_workflows": suggestions}), round(confidence, 3))
+
+
+def confident_local_suggestion(prompt_text):
+    """The local response JSON if it clears AI_LOCAL_SUGGESTION_THRESHOLD, else None."""
+    threshold = getattr(settings, 'AI_LOCAL_SUGGESTION_THRESHOLD', DEFAULT_THRESHOLD)
+    local = suggest_locally(prompt_text)
+    if local.response_json is not None and local.confidence >= threshold:
+        return local.response_json
+    return None
+
+
+def local_fallback(prompt_text):
+    """The local response JSON at any confidence, for when Gemini is unavailable; None if nothing matched."""
+    return suggest_locally(prompt_text).response_json
@@ -0,0 +1,196 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+from workflow.models import (
+    ArchivedExecutionLog, OutboxMessage, ScheduledJob, WorkflowExecutionLog, WorkflowRule,
+)
+from workflow.partitions import extend_monthly_partitions
+from workflow.versioning import bump_table_version
+from collections import Counter
+from datetime import timedelta
+from pathlib import Path
+import gzip
+import json
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 1000
+ARCHIVE_FIELDS = [
+    'id', 'workflow_rule_id', 'workflow_rule__name', 'status', 'trigger_name_snapshot', 'action_name_snapshot',
+    'logged_at', 'scheduled_execution_time', 'actual_execution_time', 'details',
+]
+
+
+def archivable_logs(cutoff):
+    """Finished logs older than `cutoff` that no queue refers to any more, oldest first."""
+    return (
+        WorkflowExecutionLog.objects
+        .filter(logged_at__lt=cutoff, status__in=WorkflowExecutionLog.FINISHED_STATUSES)
+        .filter(~Exists(ScheduledJob.objects.filter(execution_log_id=OuterRef('pk'))))
+        .filter(~Exists(OutboxMessage.objects.filter(execution_log_id=OuterRef('pk'))))
+        .order_by('logged_at', 'id')
+    )
+
+
+def archive_record(row, archived_at):
+    return {
+        'id': row['id'],
+        'rule_id': row['workflow_rule_id'],
+        'rule_name': row['workflow_rule__name'],
+        'status': row['status'],
+        'trigger_name_snapshot': row['trigger_name_snapshot'],
+        'action_name_snapshot': row['action_name_snapshot'],
+        'logged_at': row['logged_at'],
+        'scheduled_execution_time': row['scheduled_execution_time'],
+        'actual_execution_time': row['actual_execution_time'],
+        'details': row['details'],
+        'archived_at': archived_at,
+    }
+
+
+def write_jsonl(path, records):
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for record in records:
+            f.write(json.dumps(record, cls=DjangoJSONEncoder))
+            f.write('\n')
+
+
+def write_parquet(path, records):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise CommandError("--to parquet needs the pyarrow package (pip install pyarrow).")
+    pq.write_table(pa.Table.from_pylist(records), path, compression='zstd')
+
+
+FILE_WRITERS = {
+    'jsonl': ('.jsonl.gz', write_jsonl),
+    'parquet': ('.parquet', write_parquet),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Retention policy for execution logs: moves finished logs older than N days out of the '
+        'hot table, into the ArchivedExecutionLog table (served by /api/workflow-logs-archive/) '
+        'or into compressed JSONL/Parquet files, one bounded chunk per transaction.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than-days', type=float, default=None,
+            help='Archive logs logged more than this many days ago (default: settings.WORKFLOW_LOG_RETENTION_DAYS).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Logs archived per transaction (default {DEFAULT_CHUNK_SIZE}).'
+        )
+        parser.add_argument('--max-chunks', type=int, default=None, help='Stop after this many chunks (default: until done).')
+        parser.add_argument(
+            '--to', choices=['table', *FILE_WRITERS], default='table',
+            help='Where archived logs go: the archive table (default), or one compressed file per chunk.'
+        )
+        parser.add_argument(
+            '--output-dir', default=None,
+            help='Directory for --to jsonl/parquet files (default: settings.WORKFLOW_LOG_ARCHIVE_DIR).'
+        )
+        parser.add_argument(
+            '--pause', type=float, default=0,
+            help='Seconds to sleep between chunks, to leave the database room for live traffic (default 0).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many logs would be archived.')
+
+    def handle(self, *args, **options):
+        days = options['older_than_days']
+        if days is None:
+            days = settings.WORKFLOW_LOG_RETENTION_DAYS
+        chunk_size = options['chunk_size']
+        max_chunks = options['max_chunks']
+        if days < 0:
+            raise CommandError("--older-than-days must not be negative.")
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive.")
+        if max_chunks is not None and max_chunks <= 0:
+            raise CommandError("--max-chunks must be positive.")
+
+        cutoff = timezone.now() - timedelta(days=days)
+        logs = archivable_logs(cutoff)
+        if options['dry_run']:
+            self.stdout.write(f"{logs.count()} log(s) logged before {cutoff} would be archived.")
+            return
+
+        added = extend_monthly_partitions()
+        if added:
+            self.stdout.write(f"Added log partitions for {', '.join(str(month) for month in added)}.")
+
+        destination = options['to']
+        output_dir = None
+        if destination != 'table':
+            output_dir = Path(options['output_dir'] or settings.WORKFLOW_LOG_ARCHIVE_DIR)
+            output_dir.mkdir(parents=True, exist_ok=True)
+
+        archived = chunks = 0
+        while max_chunks is None or chunks < max_chunks:
+            with transaction.atomic():
+                rows = list(logs.select_for_update().values(*ARCHIVE_FIELDS)[:chunk_size])
+                if not rows:
+                    break
+                now = timezone.now()
+                records = [archive_record(row, now) for row in rows]
+                if output_dir is None:
+                    # ignore_conflicts: a chunk copied by a run that died before its delete committed.
+                    ArchivedExecutionLog.objects.bulk_create(
+                        [ArchivedExecutionLog(**record) for record in records], ignore_conflicts=True
+                    )
+                else:
+                    self.write_file(output_dir, destination, records)
+
+                # Keep execution_count unchanged once the executions leave the hot table.
+                executions = Counter(
+                    row['workflow_rule_id'] for row in rows
+                    if row['status'] in WorkflowExecutionLog.EXECUTED_STATUSES
+                )
+                for rule_id, count in executions.items():
+                    WorkflowRule.objects.filter(id=rule_id).update(
+                        archived_execution_count=F('archived_execution_count') + count, updated_at=now
+                    )
+                # _raw_delete issues a single DELETE ... WHERE id IN (...). Queryset.delete()
+                # would collect the rows again to send post_delete, one signal per log.
+                # Nothing cascades: the selection excludes logs with a job or outbox row.
+                WorkflowExecutionLog.objects.filter(id__in=[row['id'] for row in rows])._raw_delete(
+                    WorkflowExecutionLog.objects.db
+                )
+            # Bulk delete and update() send no signals.
+            bump_table_version(WorkflowExecutionLog)
+            if executions:
+                bump_table_version(WorkflowRule)
+            archived += len(rows)
+            chunks += 1
+            self.stdout.write(f"Archived {archived} log(s)...")
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        where = 'the archive table' if output_dir is None else str(output_dir)
+        logger.info(f"Archived {archived} workflow execution log(s) older than {cutoff} to {where}.")
+        self.stdout.write(self.style.SUCCESS(f"Archived {archived} log(s) to {where}."))
+
+    def write_file(self, output_dir, destination, records):
+        """Writes one chunk to its own file; the rename makes a partial file impossible."""
+        suffix, writer = FILE_WRITERS[destination]
+        first, last = records[0], records[-1]
+        name = f"execution_logs_{first['logged_at']:%Y%m%dT%H%M%S}_{first['id']}-{last['id']}{suffix}"
+        path = output_dir / name
+        partial = output_dir / f".{name}.partial"
+        try:
+            writer(partial, records)
+            os.replace(partial, path)
+        finally:
+            if partial.exists():
+                partial.unlink()
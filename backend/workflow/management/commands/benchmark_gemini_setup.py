@@ -0,0 +1,79 @@
+from contextlib import contextmanager
+from copy import deepcopy
+from django.core.management.base import BaseCommand, CommandError
+from google import genai
+from google.genai import types
+from workflow import gemini
+import os
+import time
+import tracemalloc
+
+PLACEHOLDER_API_KEY = "benchmark-placeholder-key"
+
+
+def legacy_setup(api_key, prompt_text):
+    """What every request used to do: a fresh client and a deep copy of the whole template."""
+    client = genai.Client(api_key=api_key)
+    contents = deepcopy(gemini.original_contents_template)
+    contents[-1].parts[0] = types.Part.from_text(text=prompt_text)
+    return client, contents
+
+
+def current_setup(api_key, prompt_text):
+    """The shared client plus the shared few-shot prefix and one new user turn."""
+    return gemini.get_client(), gemini.build_contents(prompt_text)
+
+
+@contextmanager
+def benchmark_api_key():
+    """
+    Yields the key to build clients with. Building a client does not contact
+    the API, so without GEMINI_API_KEY a placeholder is set for the duration of
+    the run; afterwards the environment and gemini's shared client are restored.
+    """
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if api_key:
+        yield api_key
+        return
+    os.environ["GEMINI_API_KEY"] = PLACEHOLDER_API_KEY
+    try:
+        yield PLACEHOLDER_API_KEY
+    finally:
+        del os.environ["GEMINI_API_KEY"]
+        with gemini._client_lock:
+            if gemini._client_api_key == PLACEHOLDER_API_KEY:
+                gemini._client = gemini._client_api_key = None
+
+
+class Command(BaseCommand):
+    help = 'Micro-benchmarks the per-call setup of a Gemini request (client + contents); makes no network calls.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200, help='Calls per variant (default 200).')
+        parser.add_argument('--prompt', default='When a guest checks in, send them a welcome email.')
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        if iterations <= 0:
+            raise CommandError("--iterations must be a positive integer.")
+        with benchmark_api_key() as api_key:
+            self.run_benchmarks(api_key, options['prompt'], iterations)
+
+    def run_benchmarks(self, api_key, prompt_text, iterations):
+        for label, setup in (('legacy (new client + deepcopy)', legacy_setup),
+                             ('current (shared client + prefix)', current_setup)):
+            setup(api_key, prompt_text) # warm-up
+
+            started = time.perf_counter()
+            for _ in range(iterations):
+                setup(api_key, prompt_text)
+            per_call_us = (time.perf_counter() - started) / iterations * 1e6
+
+            tracemalloc.start()
+            setup(api_key, prompt_text)
+            _, peak_bytes = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{label}: {per_call_us:,.1f} us/call, peak {peak_bytes / 1024:,.1f} KiB allocated per call"
+            ))
@@ -0,0 +1,126 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+from django.utils import timezone
+from workflow.executors import close_executors
+from workflow.jobs import LogStatusWriter, claim_jobs
+from workflow.models import OutboxMessage
+from workflow.workers import ActionWorkerPool, format_pool_stats
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_POLL_INTERVAL = 0.2
+DEFAULT_REPORT_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Dispatches the actions of immediate rules: drains the OutboxMessage table in '
+        'batches on the scheduler worker pool, polling for new messages.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Maximum number of messages claimed at once (default {DEFAULT_BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+            help=f'How long a claimed message stays reserved for this dispatcher (default {DEFAULT_LEASE_SECONDS}).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+            help=f'Seconds to wait before polling again when the outbox is empty (default {DEFAULT_POLL_INTERVAL}).'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker threads executing actions (default: settings.SCHEDULER_MAX_WORKERS).'
+        )
+        parser.add_argument(
+            '--report-interval', type=float, default=DEFAULT_REPORT_INTERVAL,
+            help=f'Seconds between throughput reports (default {DEFAULT_REPORT_INTERVAL}).'
+        )
+        parser.add_argument(
+            '--drain', action='store_true',
+            help='Exit once no message is ready instead of polling (for cron or one-off runs).'
+        )
+        parser.add_argument(
+            '--run-for', type=float, default=None,
+            help='Exit after this many seconds (default: run until SIGTERM/SIGINT).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        lease_seconds = options['lease_seconds']
+        poll_interval = options['poll_interval']
+        report_interval = options['report_interval']
+        workers = options['workers']
+        run_for = options['run_for']
+        for name in ('batch_size', 'lease_seconds', 'poll_interval'):
+            if options[name] <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if workers is not None and workers <= 0:
+            raise CommandError("--workers must be positive.")
+
+        self.stop_event = threading.Event()
+        self._install_signal_handlers()
+
+        writer = LogStatusWriter(flush_size=batch_size, queue_model=OutboxMessage)
+        pool = ActionWorkerPool(writer, max_workers=workers)
+        dispatched = 0
+        started = time.monotonic()
+        next_report = started + report_interval
+        self.stdout.write(self.style.SUCCESS(f"[{timezone.now()}] Outbox dispatcher started."))
+
+        try:
+            while not self.stop_event.is_set():
+                if run_for is not None and time.monotonic() - started >= run_for:
+                    break
+                if time.monotonic() >= next_report:
+                    self.stdout.write(f"[{timezone.now()}] dispatched {dispatched}, written back {writer.written}")
+                    self.stdout.write(f"  {format_pool_stats(pool.stats(reset=True))}")
+                    next_report = time.monotonic() + report_interval
+
+                # Claim only when the pool has room, so leases are not spent waiting in memory.
+                if not pool.wait_until_below(pool.max_workers, timeout=poll_interval):
+                    continue
+                close_old_connections()
+                try:
+                    lease_token, claimed = claim_jobs(batch_size, lease_seconds, queue_model=OutboxMessage)
+                except DatabaseError as e:
+                    # Usually a lock conflict or a dropped connection; nothing was claimed.
+                    logger.warning(f"Claiming outbox messages failed, retrying in {poll_interval:g}s: {str(e)}")
+                    self.stop_event.wait(poll_interval)
+                    continue
+                for message in claimed:
+                    pool.submit(message, lease_token)
+                dispatched += len(claimed)
+
+                if len(claimed) < batch_size:
+                    if options['drain'] and not claimed:
+                        break
+                    # Caught up: wait for new messages (or messages whose retry is due).
+                    self.stop_event.wait(poll_interval)
+        finally:
+            # Graceful: claimed messages finish and their outcomes are written.
+            pool.shutdown()
+            writer.close()
+            close_executors()
+
+        if writer.failed_batches:
+            logger.error(f"{writer.failed_batches} outcome batch(es) could not be written; their messages will be dispatched again.")
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Outbox dispatcher stopped. Dispatched {dispatched}, written back {writer.written}."
+        ))
+        self.stdout.write(f"  {format_pool_stats(pool.stats())}")
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self.stop_event.set())
@@ -1,67 +1,93 @@
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
-from workflow.models import WorkflowExecutionLog
+from workflow.jobs import LogStatusWriter, claim_jobs
+from workflow.workers import ActionWorkerPool, format_pool_stats
 import logging
+import time
 
 # Get an instance of a logger
 logger = logging.getLogger(__name__)
 
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_LEASE_SECONDS = 300
+
+
 class Command(BaseCommand):
     help = 'Processes due scheduled workflow tasks'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Maximum number of due jobs claimed per batch (default {DEFAULT_BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+            help=f'How long a claimed batch stays reserved for this worker (default {DEFAULT_LEASE_SECONDS}).'
+        )
+        parser.add_argument(
+            '--max-batches', type=int, default=None,
+            help='Stop after this many batches even if more work is due (default: drain the backlog).'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker threads executing actions (default: settings.SCHEDULER_MAX_WORKERS).'
+        )
+
     def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        lease_seconds = options['lease_seconds']
+        max_batches = options['max_batches']
+        workers = options['workers']
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be a positive integer.")
+        if lease_seconds <= 0:
+            raise CommandError("--lease-seconds must be a positive integer.")
+        if workers is not None and workers <= 0:
+            raise CommandError("--workers must be a positive integer.")
+
         self.stdout.write(self.style.SUCCESS(f"[{timezone.now()}] Starting to process scheduled workflows..."))
-        
-        due_logs = WorkflowExecutionLog.objects.filter(
-            status='SIMULATED_SCHEDULED',
-            scheduled_execution_time__lte=timezone.now()
-        )
-        
-        processed_count = 0
-        error_count = 0
-        
-        if not due_logs.exists():
-            self.stdout.write(self.style.NOTICE("No due scheduled workflows to process at this time."))
-            return
 
-        for log in due_logs:
-            try:
-                log.status = 'PROCESSING'
-                log.save()
-                
-                # --- Placeholder for Actual Action Execution ---
-                # Here you would implement the logic to actually execute log.action_name_snapshot
-                # For example, if log.action_name_snapshot == "Create Task":
-                #   create_the_task(log.workflow_rule.action.details_or_config) 
-                # elif log.action_name_snapshot == "Send Email":
-                #   send_the_email(log.workflow_rule.action.details_or_config)
-                
-                self.stdout.write(self.style.SUCCESS(f"  Simulating execution of action: '{log.action_name_snapshot}' for workflow rule: '{log.workflow_rule.name}' (Log ID: {log.id})"))
-                # --- End Placeholder ---
+        claimed_count = 0
+        batch_number = 0
+        run_started = time.monotonic()
+        # Outcomes are written back to the logs in the background by a single
+        # batching writer while the pool keeps executing.
+        writer = LogStatusWriter(flush_size=batch_size)
+        pool = ActionWorkerPool(writer, max_workers=workers)
+        self.stdout.write(f"  Running actions on {pool.max_workers} worker thread(s).")
 
-                log.actual_execution_time = timezone.now()
-                log.status = 'EXECUTED'
-                log.details = f"Successfully processed by scheduler at {log.actual_execution_time}."
-                log.save()
-                processed_count += 1
-                self.stdout.write(self.style.SUCCESS(f"  Successfully processed Log ID: {log.id}"))
+        try:
+            while max_batches is None or batch_number < max_batches:
+                # Claim the next batch only once the pool is nearly out of work, so
+                # claimed jobs do not sit in memory eating into their lease.
+                pool.wait_until_below(pool.max_workers)
+                lease_token, claimed_jobs = claim_jobs(batch_size, lease_seconds)
+                if not claimed_jobs:
+                    break
+                batch_number += 1
+                claimed_count += len(claimed_jobs)
+                for job in claimed_jobs:
+                    pool.submit(job, lease_token)
+                self.stdout.write(f"  Batch {batch_number}: claimed {len(claimed_jobs)}")
 
-            except Exception as e:
-                logger.error(f"Error processing WorkflowExecutionLog ID {log.id} for rule '{log.workflow_rule.name}': {str(e)}", exc_info=True)
-                error_count += 1
-                try:
-                    log.status = 'EXECUTION_ERROR'
-                    log.details = f"Error during scheduled execution: {str(e)}"
-                    # actual_execution_time might still be set to now to indicate when the error occurred during processing attempt
-                    log.actual_execution_time = timezone.now() 
-                    log.save()
-                    self.stdout.write(self.style.ERROR(f"  Error processing Log ID: {log.id}. Marked as EXECUTION_ERROR."))
-                except Exception as e_save:
-                    # If saving the error state itself fails, log that too.
-                    logger.error(f"Critical: Failed to save EXECUTION_ERROR status for Log ID {log.id}: {str(e_save)}", exc_info=True)
+                if len(claimed_jobs) < batch_size:
+                    # The due set is drained (or another worker holds the rest).
+                    break
+        finally:
+            # Graceful: every claimed job finishes and its outcome is written.
+            pool.shutdown()
+            writer.close()
 
+        if batch_number == 0:
+            self.stdout.write(self.style.NOTICE("No due scheduled workflows to process at this time."))
+            return
 
-        summary_style = self.style.SUCCESS if error_count == 0 else self.style.WARNING
+        stats = pool.stats()
+        total_elapsed = time.monotonic() - run_started
+        error_count = stats['errors']
+        summary_style = self.style.SUCCESS if error_count == 0 and not writer.failed_batches else self.style.WARNING
         self.stdout.write(summary_style(
-            f"Finished processing. Processed: {processed_count}, Errors: {error_count}"
-        )) 
\ No newline at end of file
+            f"Finished processing. Processed: {stats['completed'] - error_count}, Errors: {error_count}, "
+            f"Written back: {writer.written}, Batches: {batch_number}, Elapsed: {total_elapsed:.3f}s"
+        ))
+        self.stdout.write(summary_style(f"  {format_pool_stats(stats)}"))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F, TextField, Value
+from django.db.models.functions import Coalesce, Concat
+from django.utils import timezone
+from workflow.management.commands.requeue_dead_letters import dead_letter_queryset
+from workflow.models import WorkflowExecutionLog
+from workflow.stats import record_execution_events, stat_key
+from workflow.versioning import bump_table_version
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = (
+        'Gives up on dead-lettered workflow executions for good: they become EXECUTION_ERROR '
+        'and can no longer be requeued. The log rows themselves are kept for the audit trail.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', type=int, default=None, help='Only purge logs of this workflow rule id.')
+        parser.add_argument('--action', default=None, help='Only purge logs of this action name (e.g. "Send Email").')
+        parser.add_argument(
+            '--older-than-days', type=float, default=None,
+            help='Only purge logs that were dead-lettered more than this many days ago.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Logs purged per transaction (default {DEFAULT_CHUNK_SIZE}).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many logs would be purged.')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive.")
+
+        logs = dead_letter_queryset(options)
+        if options['older_than_days'] is not None:
+            logs = logs.filter(updated_at__lt=timezone.now() - timedelta(days=options['older_than_days']))
+
+        if options['dry_run']:
+            self.stdout.write(f"{logs.count()} dead-lettered log(s) would be purged.")
+            return
+
+        purged = 0
+        while True:
+            with transaction.atomic():
+                # select_for_update keeps a concurrent requeue from taking the same rows.
+                chunk = list(logs.select_for_update()[:chunk_size])
+                if not chunk:
+                    break
+                now = timezone.now()
+                WorkflowExecutionLog.objects.filter(id__in=[log.id for log in chunk]).update(
+                    status='EXECUTION_ERROR',
+                    details=Concat(
+                        Value(f"Dead letter purged at {now}, not retried. "), Coalesce(F('details'), Value('')),
+                        output_field=TextField(),
+                    ),
+                    updated_at=now,
+                )
+                record_execution_events(stat_key(log, status='EXECUTION_ERROR', at=now) for log in chunk)
+            purged += len(chunk)
+        if purged:
+            # update() does not send post_save.
+            bump_table_version(WorkflowExecutionLog)
+
+        logger.info(f"Purged {purged} dead-lettered workflow execution(s).")
+        self.stdout.write(self.style.SUCCESS(f"Purged {purged} dead-lettered log(s)."))
@@ -0,0 +1,106 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from workflow.models import OutboxMessage, ScheduledJob, WorkflowExecutionLog
+from workflow.versioning import bump_table_version
+from datetime import timedelta
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SPREAD_SECONDS = 60
+DEFAULT_CHUNK_SIZE = 500
+
+
+def dead_letter_queryset(options):
+    """DEAD_LETTERED logs matching the --rule/--action filters, oldest first."""
+    logs = WorkflowExecutionLog.objects.filter(status='DEAD_LETTERED')
+    if options.get('rule') is not None:
+        logs = logs.filter(workflow_rule_id=options['rule'])
+    if options.get('action'):
+        logs = logs.filter(action_name_snapshot=options['action'])
+    return logs.order_by('id')
+
+
+class Command(BaseCommand):
+    help = (
+        'Puts dead-lettered workflow executions back on their queue (the scheduler for '
+        'scheduled rules, the outbox for immediate ones) with a fresh attempt counter, '
+        'e.g. after the failing provider has recovered.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rule', type=int, default=None, help='Only requeue logs of this workflow rule id.')
+        parser.add_argument('--action', default=None, help='Only requeue logs of this action name (e.g. "Send Email").')
+        parser.add_argument('--limit', type=int, default=None, help='Requeue at most this many logs.')
+        parser.add_argument(
+            '--spread-seconds', type=float, default=DEFAULT_SPREAD_SECONDS,
+            help=f'Spread the new due times evenly over this many seconds so the requeued jobs '
+                 f'do not all hit the provider at once (default {DEFAULT_SPREAD_SECONDS}).'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help=f'Logs requeued per transaction (default {DEFAULT_CHUNK_SIZE}).'
+        )
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many logs would be requeued.')
+
+    def handle(self, *args, **options):
+        limit = options['limit']
+        chunk_size = options['chunk_size']
+        spread_seconds = options['spread_seconds']
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size must be positive.")
+        if limit is not None and limit <= 0:
+            raise CommandError("--limit must be positive.")
+        if spread_seconds < 0:
+            raise CommandError("--spread-seconds must not be negative.")
+
+        logs = dead_letter_queryset(options)
+        total = logs.count() if limit is None else min(logs.count(), limit)
+        if options['dry_run']:
+            self.stdout.write(f"{total} dead-lettered log(s) would be requeued.")
+            return
+        if not total:
+            self.stdout.write(self.style.SUCCESS("No dead-lettered logs to requeue."))
+            return
+
+        start = timezone.now()
+        step = spread_seconds / total
+        requeued = 0
+        last_id = 0
+        while requeued < total:
+            with transaction.atomic():
+                # select_for_update keeps a concurrent requeue/purge from taking the same rows.
+                chunk = list(
+                    logs.select_for_update().filter(id__gt=last_id)[:min(chunk_size, total - requeued)]
+                )
+                if not chunk:
+                    break
+                last_id = chunk[-1].id
+                now = timezone.now()
+                jobs, messages = [], []
+                for log in chunk:
+                    due_at = start + timedelta(seconds=step * requeued)
+                    if log.scheduled_execution_time is None:
+                        # An immediate rule: it failed in the outbox.
+                        log.status = 'SIMULATED_IMMEDIATE'
+                        messages.append(OutboxMessage(execution_log_id=log.id, due_at=due_at))
+                    else:
+                        log.status = 'SIMULATED_SCHEDULED'
+                        log.scheduled_execution_time = due_at
+                        log.actual_execution_time = None
+                        jobs.append(ScheduledJob(execution_log_id=log.id, due_at=due_at))
+                    log.details = f"Requeued from dead letter at {now}. Previous outcome: {log.details}"
+                    log.updated_at = now
+                    requeued += 1
+                WorkflowExecutionLog.objects.bulk_update(
+                    chunk, ['status', 'scheduled_execution_time', 'actual_execution_time', 'details', 'updated_at']
+                )
+                ScheduledJob.objects.bulk_create(jobs)
+                OutboxMessage.objects.bulk_create(messages)
+            # bulk_update does not send post_save.
+            bump_table_version(WorkflowExecutionLog)
+            self.stdout.write(f"Requeued {requeued}/{total}...")
+
+        logger.info(f"Requeued {requeued} dead-lettered workflow execution(s).")
+        self.stdout.write(self.style.SUCCESS(f"Requeued {requeued} dead-lettered log(s)."))
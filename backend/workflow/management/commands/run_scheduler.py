@@ -0,0 +1,245 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from workflow.executors import close_executors
+from workflow.jobs import LogStatusWriter, claim_jobs
+from workflow.workers import ActionWorkerPool, format_pool_stats, percentile
+from workflow.models import ScheduledJob
+from datetime import timedelta
+import heapq
+import logging
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SECONDS = 60
+DEFAULT_POLL_INTERVAL = 1.0
+DEFAULT_MAX_PREFETCH = 5000
+DEFAULT_PREFETCH_OVERLAP = 5.0
+DEFAULT_BATCH_SIZE = 200
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_REPORT_INTERVAL = 60
+
+
+class Command(BaseCommand):
+    help = (
+        'Runs the scheduler as a long-lived daemon: upcoming jobs are prefetched into an '
+        'in-memory heap and fired at their due time, instead of waiting for the next '
+        'POST to tasks/process-scheduled/.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--window', type=float, default=DEFAULT_WINDOW_SECONDS,
+            help=f'Prefetch jobs due within this many seconds (default {DEFAULT_WINDOW_SECONDS}).'
+        )
+        parser.add_argument(
+            '--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+            help=f'Seconds between prefetch queries; bounds how late a job created inside the window can be picked up (default {DEFAULT_POLL_INTERVAL}).'
+        )
+        parser.add_argument(
+            '--max-prefetch', type=int, default=DEFAULT_MAX_PREFETCH,
+            help=f'Maximum number of jobs held in memory (default {DEFAULT_MAX_PREFETCH}).'
+        )
+        parser.add_argument(
+            '--prefetch-overlap', type=float, default=DEFAULT_PREFETCH_OVERLAP,
+            help=f'Seconds each prefetch reaches back before the previous one, to catch jobs written by transactions still open at the time (default {DEFAULT_PREFETCH_OVERLAP:g}).'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+            help=f'Maximum number of due jobs claimed at once (default {DEFAULT_BATCH_SIZE}).'
+        )
+        parser.add_argument(
+            '--lease-seconds', type=int, default=DEFAULT_LEASE_SECONDS,
+            help=f'How long a claimed job stays reserved for this worker (default {DEFAULT_LEASE_SECONDS}).'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=None,
+            help='Number of worker threads executing actions (default: settings.SCHEDULER_MAX_WORKERS).'
+        )
+        parser.add_argument(
+            '--report-interval', type=float, default=DEFAULT_REPORT_INTERVAL,
+            help=f'Seconds between throughput/lateness reports (default {DEFAULT_REPORT_INTERVAL}).'
+        )
+        parser.add_argument(
+            '--run-for', type=float, default=None,
+            help='Exit after this many seconds (default: run until SIGTERM/SIGINT).'
+        )
+
+    def handle(self, *args, **options):
+        self.window = options['window']
+        self.poll_interval = options['poll_interval']
+        self.max_prefetch = options['max_prefetch']
+        self.prefetch_overlap = options['prefetch_overlap']
+        self.batch_size = options['batch_size']
+        self.lease_seconds = options['lease_seconds']
+        report_interval = options['report_interval']
+        run_for = options['run_for']
+        for name in ('window', 'poll_interval', 'max_prefetch', 'batch_size', 'lease_seconds'):
+            if getattr(self, name) <= 0:
+                raise CommandError(f"--{name.replace('_', '-')} must be positive.")
+        if self.prefetch_overlap < 0:
+            raise CommandError("--prefetch-overlap must not be negative.")
+
+        self.stop_event = threading.Event()
+        self._install_signal_handlers()
+
+        workers = options['workers']
+        if workers is not None and workers <= 0:
+            raise CommandError("--workers must be positive.")
+
+        self.reset_prefetch()
+        self.fired = 0
+        self.lateness = []
+
+        writer = LogStatusWriter(flush_size=self.batch_size)
+        self.pool = ActionWorkerPool(writer, max_workers=workers)
+        started = time.monotonic()
+        next_prefetch = 0.0
+        next_report = started + report_interval
+        self.stdout.write(self.style.SUCCESS(
+            f"[{timezone.now()}] Scheduler started (window {self.window:g}s, poll every {self.poll_interval:g}s)."
+        ))
+
+        try:
+            while not self.stop_event.is_set():
+                now_monotonic = time.monotonic()
+                if run_for is not None and now_monotonic - started >= run_for:
+                    break
+                if now_monotonic >= next_report:
+                    self.report(writer)
+                    next_report = time.monotonic() + report_interval
+                try:
+                    if now_monotonic >= next_prefetch:
+                        self.prefetch()
+                        next_prefetch = time.monotonic() + self.poll_interval
+                    self.fire_due(writer)
+                except DatabaseError as e:
+                    # Usually a lock conflict or a dropped connection: the heap is
+                    # unchanged, so the next poll simply tries again.
+                    logger.warning(f"Scheduler poll failed, retrying in {self.poll_interval:g}s: {str(e)}")
+                    self.stop_event.wait(self.poll_interval)
+                    continue
+
+                # Sleep until the next job is due or the next prefetch, whichever is first.
+                wake_at = next_prefetch
+                if self.heap:
+                    wake_at = min(wake_at, time.monotonic() + max(self.heap[0][0] - time.time(), 0))
+                if run_for is not None:
+                    wake_at = min(wake_at, started + run_for)
+                self.stop_event.wait(max(wake_at - time.monotonic(), 0))
+        finally:
+            # Graceful: jobs already claimed finish and their outcomes are written.
+            self.pool.shutdown()
+            writer.close()
+            close_executors()
+            self.report(writer)
+            self.stdout.write(self.style.SUCCESS(f"[{timezone.now()}] Scheduler stopped."))
+
+    def _install_signal_handlers(self):
+        if threading.current_thread() is not threading.main_thread():
+            return
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            signal.signal(sig, lambda signum, frame: self.stop_event.set())
+
+    def reset_prefetch(self):
+        # (due_at timestamp, job id) min-heap of prefetched jobs. An entry whose
+        # timestamp no longer matches `queued` was superseded by a later read.
+        self.heap = []
+        # job id -> due_at timestamp of its live heap entry
+        self.queued = {}
+        # Every claimable job due before this has been read (None: nothing read yet).
+        self.prefetched_until = None
+        self.last_prefetch = None
+
+    def prefetch(self):
+        """
+        Merges the jobs that became relevant since the previous call into the
+        heap and returns how many were added or moved.
+
+        The first call reads every unleased job due within the window, which is
+        how a restarted daemon picks up where the previous one stopped. Later
+        calls only read jobs due between the previous horizon and the new one,
+        jobs inserted, claimed or rescheduled since the previous call
+        (updated_at), and jobs whose lease lapsed since then, so a poll costs
+        the rows that changed rather than the whole window.
+        """
+        close_old_connections()
+        now = timezone.now()
+        horizon = now + timedelta(seconds=self.window)
+        jobs = ScheduledJob.objects.filter(
+            Q(due_at__lte=horizon), Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+        )
+        if self.prefetched_until is not None:
+            since = self.last_prefetch - timedelta(seconds=self.prefetch_overlap)
+            jobs = jobs.filter(
+                Q(due_at__gte=self.prefetched_until) | Q(updated_at__gte=since) | Q(lease_expires_at__gte=since)
+            )
+        rows = list(jobs.order_by('due_at', 'id').values_list('due_at', 'id')[:self.max_prefetch])
+
+        merged = 0
+        prefetched_until = horizon
+        if len(rows) == self.max_prefetch:
+            prefetched_until = rows[-1][0]
+        for due_at, job_id in rows:
+            due_ts = due_at.timestamp()
+            if self.queued.get(job_id) == due_ts:
+                continue
+            if job_id not in self.queued and len(self.queued) >= self.max_prefetch:
+                # Full: this job and the ones due after it are read again next time.
+                prefetched_until = due_at
+                break
+            self.queued[job_id] = due_ts
+            heapq.heappush(self.heap, (due_ts, job_id))
+            merged += 1
+        self.prefetched_until = prefetched_until
+        self.last_prefetch = now
+        return merged
+
+    def fire_due(self, writer):
+        """Claims and runs every prefetched job whose due time has passed."""
+        while self.heap and self.heap[0][0] <= time.time() and not self.stop_event.is_set():
+            due = {}
+            while self.heap and self.heap[0][0] <= time.time() and len(due) < self.batch_size:
+                due_ts, job_id = heapq.heappop(self.heap)
+                if self.queued.get(job_id) != due_ts:
+                    continue
+                del self.queued[job_id]
+                due[job_id] = due_ts
+            if not due:
+                continue
+
+            # Another daemon may have claimed some of them already; only the rest come back.
+            try:
+                lease_token, claimed_jobs = claim_jobs(self.batch_size, self.lease_seconds, ids=due.keys())
+            except DatabaseError:
+                # Put them back, or nothing would read them again.
+                for job_id, due_ts in due.items():
+                    self.queued[job_id] = due_ts
+                    heapq.heappush(self.heap, (due_ts, job_id))
+                raise
+            fired_at = time.time()
+            for job in claimed_jobs:
+                # Lateness against the job's current due time (it may have moved since prefetch).
+                self.lateness.append(max(fired_at - job.due_at.timestamp(), 0.0))
+                self.pool.submit(job, lease_token)
+                self.fired += 1
+
+    def report(self, writer):
+        lateness = sorted(self.lateness)
+        if lateness:
+            lag = (
+                f"firing lateness p50 {percentile(lateness, 0.5) * 1000:.0f}ms, "
+                f"p99 {percentile(lateness, 0.99) * 1000:.0f}ms, max {lateness[-1] * 1000:.0f}ms"
+            )
+        else:
+            lag = "no jobs fired"
+        self.stdout.write(
+            f"[{timezone.now()}] fired {self.fired}, written back {writer.written}, "
+            f"prefetched {len(self.queued)}; {lag}"
+        )
+        self.stdout.write(f"  {format_pool_stats(self.pool.stats(reset=True))}")
+        self.lateness = []
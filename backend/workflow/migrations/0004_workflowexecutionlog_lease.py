@@ -0,0 +1,28 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0003_workflowexecutionlog'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowexecutionlog',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='workflowexecutionlog',
+            name='lease_token',
+            field=models.CharField(blank=True, max_length=32, null=True),
+        ),
+        migrations.AlterField(
+            model_name='workflowexecutionlog',
+            name='status',
+            field=models.CharField(choices=[('SIMULATED_IMMEDIATE', 'Simulated Immediate Execution'), ('SIMULATED_SCHEDULED', 'Simulated Scheduled for Later'), ('SIMULATION_ERROR', 'Error During Simulation'), ('PROCESSING', 'Processing by Scheduler'), ('EXECUTED', 'Executed by Scheduler'), ('EXECUTION_ERROR', 'Error During Execution by Scheduler')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0004_workflowexecutionlog_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='workflowexecutionlog',
+            index=models.Index(fields=['status', 'scheduled_execution_time'], name='wflog_status_sched_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowexecutionlog',
+            index=models.Index(fields=['workflow_rule', 'status'], name='wflog_rule_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowexecutionlog',
+            index=models.Index(fields=['logged_at'], name='wflog_logged_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workflowexecutionlog',
+            index=models.Index(condition=models.Q(('status', 'PROCESSING')), fields=['lease_expires_at'], name='wflog_lease_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0005_workflowexecutionlog_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowexecutionlog',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='workflowexecutionlog',
+            index=models.Index(fields=['updated_at', 'id'], name='wflog_updated_at_idx'),
+        ),
+    ]
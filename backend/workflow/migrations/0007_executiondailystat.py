@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:05
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_stats(apps, schema_editor):
+    """
+    Seeds the rollup from the existing logs, mirroring how it is maintained live:
+    every log counts once for how it was created (immediate or scheduled) on the
+    day it was logged, and scheduler outcomes count again on the day they ran.
+    """
+    WorkflowExecutionLog = apps.get_model('workflow', 'WorkflowExecutionLog')
+    ExecutionDailyStat = apps.get_model('workflow', 'ExecutionDailyStat')
+    db_alias = schema_editor.connection.alias
+    logs = WorkflowExecutionLog.objects.using(db_alias)
+    scheduler_statuses = ['PROCESSING', 'EXECUTED', 'EXECUTION_ERROR']
+
+    totals = {}
+
+    def add(rows, status=None):
+        for row in rows:
+            key = (row['day'], status or row['status'], row['trigger_name_snapshot'], row['action_name_snapshot'])
+            totals[key] = totals.get(key, 0) + row['count']
+
+    created = logs.annotate(day=TruncDate('logged_at')).values(
+        'day', 'status', 'trigger_name_snapshot', 'action_name_snapshot'
+    ).annotate(count=Count('id')).order_by()
+    add(row for row in created if row['status'] not in scheduler_statuses)
+    add((row for row in created if row['status'] in scheduler_statuses), status='SIMULATED_SCHEDULED')
+
+    finished = logs.filter(
+        status__in=['EXECUTED', 'EXECUTION_ERROR'], actual_execution_time__isnull=False
+    ).annotate(day=TruncDate('actual_execution_time')).values(
+        'day', 'status', 'trigger_name_snapshot', 'action_name_snapshot'
+    ).annotate(count=Count('id')).order_by()
+    add(finished)
+
+    ExecutionDailyStat.objects.using(db_alias).bulk_create([
+        ExecutionDailyStat(day=day, status=status, trigger_name=trigger_name, action_name=action_name, count=count)
+        for (day, status, trigger_name, action_name), count in totals.items()
+    ], batch_size=500)
+
+
+def clear_daily_stats(apps, schema_editor):
+    ExecutionDailyStat = apps.get_model('workflow', 'ExecutionDailyStat')
+    ExecutionDailyStat.objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0006_workflowexecutionlog_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExecutionDailyStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('status', models.CharField(choices=[('SIMULATED_IMMEDIATE', 'Simulated Immediate Execution'), ('SIMULATED_SCHEDULED', 'Simulated Scheduled for Later'), ('SIMULATION_ERROR', 'Error During Simulation'), ('PROCESSING', 'Processing by Scheduler'), ('EXECUTED', 'Executed by Scheduler'), ('EXECUTION_ERROR', 'Error During Execution by Scheduler')], max_length=30)),
+                ('trigger_name', models.CharField(max_length=100)),
+                ('action_name', models.CharField(max_length=100)),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-day'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='executiondailystat',
+            constraint=models.UniqueConstraint(fields=('day', 'status', 'trigger_name', 'action_name'), name='uniq_execution_daily_stat'),
+        ),
+        migrations.RunPython(backfill_daily_stats, clear_daily_stats),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:18
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def enqueue_pending_logs(apps, schema_editor):
+    """
+    Moves the pending work out of the log: every log still waiting for the
+    scheduler (including ones a worker had claimed) gets a ScheduledJob, and
+    claimed logs go back to SIMULATED_SCHEDULED now that leases live on jobs.
+    """
+    WorkflowExecutionLog = apps.get_model('workflow', 'WorkflowExecutionLog')
+    ScheduledJob = apps.get_model('workflow', 'ScheduledJob')
+    db_alias = schema_editor.connection.alias
+    pending = WorkflowExecutionLog.objects.using(db_alias).filter(
+        status__in=['SIMULATED_SCHEDULED', 'PROCESSING']
+    )
+    jobs = [
+        ScheduledJob(execution_log_id=log_id, due_at=scheduled_execution_time or logged_at)
+        for log_id, scheduled_execution_time, logged_at
+        in pending.values_list('id', 'scheduled_execution_time', 'logged_at').iterator()
+    ]
+    ScheduledJob.objects.using(db_alias).bulk_create(jobs, batch_size=1000)
+    pending.filter(status='PROCESSING').update(status='SIMULATED_SCHEDULED')
+
+
+def release_pending_jobs(apps, schema_editor):
+    # The log rows are still SIMULATED_SCHEDULED, which is all the old scheduler needs.
+    ScheduledJob = apps.get_model('workflow', 'ScheduledJob')
+    ScheduledJob.objects.using(schema_editor.connection.alias).all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0007_executiondailystat'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScheduledJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('execution_log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='scheduled_job', to='workflow.workflowexecutionlog')),
+                ('due_at', models.DateTimeField()),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('lease_token', models.CharField(blank=True, max_length=32, null=True)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['due_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='scheduledjob',
+            index=models.Index(fields=['due_at', 'priority'], name='job_due_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='scheduledjob',
+            index=models.Index(fields=['lease_expires_at'], name='job_lease_expiry_idx'),
+        ),
+        migrations.RunPython(enqueue_pending_logs, release_pending_jobs),
+        migrations.RemoveIndex(
+            model_name='workflowexecutionlog',
+            name='wflog_lease_expiry_idx',
+        ),
+        migrations.RemoveField(
+            model_name='workflowexecutionlog',
+            name='lease_expires_at',
+        ),
+        migrations.RemoveField(
+            model_name='workflowexecutionlog',
+            name='lease_token',
+        ),
+    ]
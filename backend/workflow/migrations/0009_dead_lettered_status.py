@@ -0,0 +1,23 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0008_scheduledjob'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='executiondailystat',
+            name='status',
+            field=models.CharField(choices=[('SIMULATED_IMMEDIATE', 'Simulated Immediate Execution'), ('SIMULATED_SCHEDULED', 'Simulated Scheduled for Later'), ('SIMULATION_ERROR', 'Error During Simulation'), ('PROCESSING', 'Processing by Scheduler'), ('EXECUTED', 'Executed by Scheduler'), ('EXECUTION_ERROR', 'Error During Execution by Scheduler'), ('DEAD_LETTERED', 'Failed After All Retries')], max_length=30),
+        ),
+        migrations.AlterField(
+            model_name='workflowexecutionlog',
+            name='status',
+            field=models.CharField(choices=[('SIMULATED_IMMEDIATE', 'Simulated Immediate Execution'), ('SIMULATED_SCHEDULED', 'Simulated Scheduled for Later'), ('SIMULATION_ERROR', 'Error During Simulation'), ('PROCESSING', 'Processing by Scheduler'), ('EXECUTED', 'Executed by Scheduler'), ('EXECUTION_ERROR', 'Error During Execution by Scheduler'), ('DEAD_LETTERED', 'Failed After All Retries')], max_length=30),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0009_dead_lettered_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OutboxMessage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('due_at', models.DateTimeField()),
+                ('priority', models.SmallIntegerField(default=0)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('lease_token', models.CharField(blank=True, max_length=32, null=True)),
+                ('lease_expires_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('execution_log', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='outbox_message', to='workflow.workflowexecutionlog')),
+            ],
+            options={
+                'ordering': ['due_at'],
+                'indexes': [models.Index(fields=['due_at', 'priority'], name='outbox_due_idx'), models.Index(fields=['lease_expires_at'], name='outbox_lease_expiry_idx')],
+            },
+        ),
+    ]
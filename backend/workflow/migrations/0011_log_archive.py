@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 01:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0010_outboxmessage'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workflowrule',
+            name='archived_execution_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.CreateModel(
+            name='ArchivedExecutionLog',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rule_id', models.BigIntegerField()),
+                ('rule_name', models.CharField(max_length=255)),
+                ('status', models.CharField(choices=[('SIMULATED_IMMEDIATE', 'Simulated Immediate Execution'), ('SIMULATED_SCHEDULED', 'Simulated Scheduled for Later'), ('SIMULATION_ERROR', 'Error During Simulation'), ('PROCESSING', 'Processing by Scheduler'), ('EXECUTED', 'Executed by Scheduler'), ('EXECUTION_ERROR', 'Error During Execution by Scheduler'), ('DEAD_LETTERED', 'Failed After All Retries')], max_length=30)),
+                ('trigger_name_snapshot', models.CharField(max_length=100)),
+                ('action_name_snapshot', models.CharField(max_length=100)),
+                ('logged_at', models.DateTimeField()),
+                ('scheduled_execution_time', models.DateTimeField(blank=True, null=True)),
+                ('actual_execution_time', models.DateTimeField(blank=True, null=True)),
+                ('details', models.TextField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField()),
+            ],
+            options={
+                'ordering': ['-logged_at'],
+                'indexes': [models.Index(fields=['logged_at', 'id'], name='archlog_logged_at_idx'), models.Index(fields=['rule_id', 'logged_at'], name='archlog_rule_idx')],
+            },
+        ),
+    ]
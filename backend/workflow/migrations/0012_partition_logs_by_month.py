@@ -0,0 +1,108 @@
+from datetime import date
+
+from django.db import migrations
+
+# Kept in step with workflow.partitions, which adds future boundaries.
+PARTITION_FUNCTION = 'wflog_month_pf'
+PARTITION_SCHEME = 'wflog_month_ps'
+CLUSTERED_INDEX = 'wflog_month_cidx'
+MONTHS_AHEAD = 3
+
+
+def _add_months(day, months):
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def _query(schema_editor, sql, params=None):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(sql, params or [])
+        return cursor.fetchall()
+
+
+def _foreign_keys_to(schema_editor, table):
+    """(name, table, column, referenced column) of the foreign keys pointing at `table`."""
+    return _query(schema_editor, """
+        SELECT fk.name, OBJECT_NAME(fk.parent_object_id),
+               COL_NAME(fkc.parent_object_id, fkc.parent_column_id),
+               COL_NAME(fkc.referenced_object_id, fkc.referenced_column_id)
+        FROM sys.foreign_keys fk
+        JOIN sys.foreign_key_columns fkc ON fkc.constraint_object_id = fk.object_id
+        WHERE fk.referenced_object_id = OBJECT_ID(%s)
+    """, [table])
+
+
+def _rebuild_primary_key(schema_editor, table, clustered):
+    """Recreates the primary key on id, dropping and restoring the foreign keys that need it."""
+    foreign_keys = _foreign_keys_to(schema_editor, table)
+    for name, parent, _, _ in foreign_keys:
+        schema_editor.execute(f"ALTER TABLE [{parent}] DROP CONSTRAINT [{name}]")
+    (pk_name,), = _query(
+        schema_editor,
+        "SELECT name FROM sys.key_constraints WHERE type = 'PK' AND parent_object_id = OBJECT_ID(%s)",
+        [table],
+    )
+    schema_editor.execute(f"ALTER TABLE [{table}] DROP CONSTRAINT [{pk_name}]")
+    kind = 'CLUSTERED' if clustered else 'NONCLUSTERED'
+    schema_editor.execute(f"ALTER TABLE [{table}] ADD CONSTRAINT [{pk_name}] PRIMARY KEY {kind} ([id]) ON [PRIMARY]")
+    for name, parent, column, referenced in foreign_keys:
+        schema_editor.execute(
+            f"ALTER TABLE [{parent}] ADD CONSTRAINT [{name}] FOREIGN KEY ([{column}]) REFERENCES [{table}] ([{referenced}])"
+        )
+
+
+def partition_logs_by_month(apps, schema_editor):
+    """
+    MSSQL only: clusters the execution log table on (logged_at, id) over one
+    partition per month, and page-compresses the archive table.
+
+    The primary key becomes a non-clustered, non-partitioned index so the
+    foreign keys from ScheduledJob and OutboxMessage keep working.
+    """
+    if schema_editor.connection.vendor != 'microsoft':
+        return
+    log_table = apps.get_model('workflow', 'WorkflowExecutionLog')._meta.db_table
+    archive_table = apps.get_model('workflow', 'ArchivedExecutionLog')._meta.db_table
+
+    (oldest,), = _query(schema_editor, f"SELECT CAST(MIN(logged_at) AS date) FROM [{log_table}]")
+    today = date.today()
+    boundary = date((oldest or today).year, (oldest or today).month, 1)
+    boundaries = []
+    while boundary <= _add_months(today, MONTHS_AHEAD):
+        boundaries.append(f"'{boundary.isoformat()}'")
+        boundary = _add_months(boundary, 1)
+
+    # RANGE RIGHT: each boundary is the first instant of its month's partition.
+    schema_editor.execute(
+        f"CREATE PARTITION FUNCTION {PARTITION_FUNCTION} (datetime2) AS RANGE RIGHT FOR VALUES ({', '.join(boundaries)})"
+    )
+    schema_editor.execute(f"CREATE PARTITION SCHEME {PARTITION_SCHEME} AS PARTITION {PARTITION_FUNCTION} ALL TO ([PRIMARY])")
+    _rebuild_primary_key(schema_editor, log_table, clustered=False)
+    schema_editor.execute(
+        f"CREATE CLUSTERED INDEX {CLUSTERED_INDEX} ON [{log_table}] ([logged_at], [id]) ON {PARTITION_SCHEME} ([logged_at])"
+    )
+    schema_editor.execute(f"ALTER TABLE [{archive_table}] REBUILD WITH (DATA_COMPRESSION = PAGE)")
+
+
+def unpartition_logs(apps, schema_editor):
+    if schema_editor.connection.vendor != 'microsoft':
+        return
+    log_table = apps.get_model('workflow', 'WorkflowExecutionLog')._meta.db_table
+    archive_table = apps.get_model('workflow', 'ArchivedExecutionLog')._meta.db_table
+
+    schema_editor.execute(f"ALTER TABLE [{archive_table}] REBUILD WITH (DATA_COMPRESSION = NONE)")
+    schema_editor.execute(f"DROP INDEX {CLUSTERED_INDEX} ON [{log_table}]")
+    _rebuild_primary_key(schema_editor, log_table, clustered=True)
+    schema_editor.execute(f"DROP PARTITION SCHEME {PARTITION_SCHEME}")
+    schema_editor.execute(f"DROP PARTITION FUNCTION {PARTITION_FUNCTION}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workflow', '0011_log_archive'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_logs_by_month, unpartition_logs),
+    ]
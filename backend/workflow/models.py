@@ -1,4 +1,5 @@
 from django.db import models
+from datetime import timedelta
 
 # Create your models here.
 
@@ -16,6 +17,19 @@ class Action(models.Model):
     def __str__(self):
         return self.name
 
+# timedelta() keyword for each WorkflowRule.delay_unit
+DELAY_UNIT_TIMEDELTA_KWARGS = {
+    'minutes': 'minutes',
+    'hours': 'hours',
+    'days': 'days',
+}
+
+def delay_timedelta(delay_time, delay_unit):
+    """A rule delay as a timedelta, or None if delay_time/delay_unit are not usable."""
+    if not delay_time or delay_unit not in DELAY_UNIT_TIMEDELTA_KWARGS:
+        return None
+    return timedelta(**{DELAY_UNIT_TIMEDELTA_KWARGS[delay_unit]: delay_time})
+
 class WorkflowRule(models.Model):
     RULE_TYPE_CHOICES = [
         ('immediate', 'Immediate'),
@@ -37,12 +51,18 @@ class WorkflowRule(models.Model):
     delay_unit = models.CharField(max_length=20, choices=DELAY_UNIT_CHOICES, blank=True, null=True)
     
     is_active = models.BooleanField(default=True)
+    # Executions whose logs were moved to ArchivedExecutionLog; added to execution_count.
+    archived_execution_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return self.name
 
+    def get_delay_timedelta(self):
+        """The scheduling delay as a timedelta, or None if delay_time/delay_unit are not usable."""
+        return delay_timedelta(self.delay_time, self.delay_unit)
+
     class Meta:
         ordering = ['-created_at']
 
@@ -54,7 +74,13 @@ class WorkflowExecutionLog(models.Model):
         ('PROCESSING', 'Processing by Scheduler'),
         ('EXECUTED', 'Executed by Scheduler'),
         ('EXECUTION_ERROR', 'Error During Execution by Scheduler'),
+        ('DEAD_LETTERED', 'Failed After All Retries'),
     ]
+    # Statuses that count as an execution of a rule (see WorkflowRule execution_count)
+    EXECUTED_STATUSES = ['EXECUTED', 'SIMULATED_IMMEDIATE']
+    # Statuses a log never leaves, so it may be archived (once no job or outbox row
+    # refers to it). DEAD_LETTERED logs stay until requeued or purged.
+    FINISHED_STATUSES = ['SIMULATED_IMMEDIATE', 'SIMULATION_ERROR', 'EXECUTED', 'EXECUTION_ERROR']
 
     workflow_rule = models.ForeignKey(WorkflowRule, on_delete=models.CASCADE, related_name='execution_logs')
     status = models.CharField(max_length=30, choices=STATUS_CHOICES)
@@ -69,9 +95,160 @@ class WorkflowExecutionLog(models.Model):
     actual_execution_time = models.DateTimeField(null=True, blank=True) 
     
     details = models.TextField(blank=True, null=True) # For error messages or other info
+    # Bumped on every change; bulk .update()/bulk_update() callers must set it explicitly.
+    # Drives the `since` delta mode of the log API.
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"Log for '{self.workflow_rule.name}': {self.status} at {self.logged_at.strftime('%Y-%m-%d %H:%M:%S')}"
 
     class Meta:
         ordering = ['-logged_at']
+        indexes = [
+            # Scheduler due query: status='SIMULATED_SCHEDULED' AND scheduled_execution_time <= now
+            models.Index(fields=['status', 'scheduled_execution_time'], name='wflog_status_sched_idx'),
+            # execution_count per rule: workflow_rule_id = X AND status IN (...)
+            models.Index(fields=['workflow_rule', 'status'], name='wflog_rule_status_idx'),
+            # Default -logged_at ordering of the log list
+            models.Index(fields=['logged_at'], name='wflog_logged_at_idx'),
+            # `since` delta polling: (updated_at, id) > cursor
+            models.Index(fields=['updated_at', 'id'], name='wflog_updated_at_idx'),
+        ]
+
+class ScheduledJob(models.Model):
+    """
+    The scheduler's work queue: one narrow row per SIMULATED_SCHEDULED log that
+    has not run yet.
+
+    Keeping pending work out of WorkflowExecutionLog means the scheduler scans a
+    table whose size is the backlog, not the history, and does not compete with
+    audit reads. A job is deleted once its outcome has been written back to the
+    log (see workflow.jobs).
+    """
+    # What a successful run does to the log (see workflow.jobs.run_jobs and job_outcome).
+    success_status = 'EXECUTED'
+    processed_by = 'scheduler'
+
+    execution_log = models.OneToOneField(WorkflowExecutionLog, on_delete=models.CASCADE, related_name='scheduled_job')
+    due_at = models.DateTimeField()
+    # Higher runs first among jobs that are due.
+    priority = models.SmallIntegerField(default=0)
+    # How many times a worker has claimed the job.
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    # Set by the worker that claimed the job; an expired lease can be reclaimed.
+    lease_token = models.CharField(max_length=32, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Set on insert and whenever the job is claimed or released with a new due_at;
+    # bulk updates set it explicitly. run_scheduler reads the changes since its last poll.
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Job for log {self.execution_log_id} due {self.due_at}"
+
+    class Meta:
+        ordering = ['due_at']
+        indexes = [
+            # Claim query: due_at <= now, ordered by priority then due time
+            models.Index(fields=['due_at', 'priority'], name='job_due_idx'),
+            # Reclaiming expired leases
+            models.Index(fields=['lease_expires_at'], name='job_lease_expiry_idx'),
+            # run_scheduler's incremental prefetch
+            models.Index(fields=['updated_at'], name='job_updated_at_idx'),
+        ]
+
+class OutboxMessage(models.Model):
+    """
+    Transactional outbox for immediate rules: one row per SIMULATED_IMMEDIATE
+    log whose action has not been dispatched yet.
+
+    The row is inserted in the same transaction as its log, so the trigger
+    request never waits on downstream calls and a crash cannot lose the work.
+    The dispatch_outbox command claims rows with leases, exactly like
+    ScheduledJob, runs them on the scheduler's worker pool and deletes each row
+    once its outcome is written back.
+    """
+    # A dispatched log keeps its SIMULATED_IMMEDIATE status; only details and
+    # actual_execution_time record the dispatch.
+    success_status = None
+    processed_by = 'outbox dispatcher'
+
+    execution_log = models.OneToOneField(WorkflowExecutionLog, on_delete=models.CASCADE, related_name='outbox_message')
+    # When the message may be dispatched: its creation time, or a retry time after a failure.
+    due_at = models.DateTimeField()
+    priority = models.SmallIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    lease_token = models.CharField(max_length=32, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Outbox message for log {self.execution_log_id} due {self.due_at}"
+
+    class Meta:
+        ordering = ['due_at']
+        indexes = [
+            models.Index(fields=['due_at', 'priority'], name='outbox_due_idx'),
+            models.Index(fields=['lease_expires_at'], name='outbox_lease_expiry_idx'),
+        ]
+
+class ArchivedExecutionLog(models.Model):
+    """
+    Finished execution logs moved out of WorkflowExecutionLog by the
+    archive_execution_logs command, so the hot table only holds recent history.
+
+    Rows keep their original id and are stored compactly: no foreign key (the
+    rule may be deleted later), the rule name copied in, and no updated_at
+    since archived rows never change. On MSSQL the table is page-compressed.
+    """
+    id = models.BigIntegerField(primary_key=True)  # WorkflowExecutionLog id
+    rule_id = models.BigIntegerField()
+    rule_name = models.CharField(max_length=255)
+    status = models.CharField(max_length=30, choices=WorkflowExecutionLog.STATUS_CHOICES)
+    trigger_name_snapshot = models.CharField(max_length=100)
+    action_name_snapshot = models.CharField(max_length=100)
+    logged_at = models.DateTimeField()
+    scheduled_execution_time = models.DateTimeField(null=True, blank=True)
+    actual_execution_time = models.DateTimeField(null=True, blank=True)
+    details = models.TextField(blank=True, null=True)
+    archived_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Archived log for '{self.rule_name}': {self.status} at {self.logged_at.strftime('%Y-%m-%d %H:%M:%S')}"
+
+    class Meta:
+        ordering = ['-logged_at']
+        indexes = [
+            # Keyset pagination of the archive endpoint
+            models.Index(fields=['logged_at', 'id'], name='archlog_logged_at_idx'),
+            models.Index(fields=['rule_id', 'logged_at'], name='archlog_rule_idx'),
+        ]
+
+class ExecutionDailyStat(models.Model):
+    """
+    Incremental rollup of execution log events per day, status, trigger and action.
+
+    Each row counts how many logs reached `status` on `day`. It is kept up to date
+    by simulate_trigger and the scheduler (see workflow.stats), so the dashboard
+    reads a handful of small aggregates instead of scanning WorkflowExecutionLog.
+    """
+    day = models.DateField()
+    status = models.CharField(max_length=30, choices=WorkflowExecutionLog.STATUS_CHOICES)
+    trigger_name = models.CharField(max_length=100)
+    action_name = models.CharField(max_length=100)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.day} {self.status} {self.trigger_name} -> {self.action_name}: {self.count}"
+
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['day', 'status', 'trigger_name', 'action_name'],
+                name='uniq_execution_daily_stat',
+            ),
+        ]
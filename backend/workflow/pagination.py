@@ -0,0 +1,112 @@
+import base64
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_position(timestamp, pk):
+    """Encodes a (timestamp, id) keyset position as an opaque URL-safe token."""
+    raw = f"{timestamp.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode('ascii')).decode('ascii')
+
+
+def decode_position(token):
+    """Inverse of encode_position(); returns None for a malformed token."""
+    try:
+        raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('ascii')
+        timestamp_raw, pk_raw = raw.rsplit('|', 1)
+        timestamp = parse_datetime(timestamp_raw)
+        pk = int(pk_raw)
+    except (TypeError, ValueError, UnicodeError):
+        return None
+    if timestamp is None:
+        return None
+    return timestamp, pk
+
+
+class LogKeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination over (logged_at, id), newest first.
+
+    Unlike offset pagination, each page is a range seek on the logged_at index
+    (`logged_at < X OR (logged_at = X AND id < Y)`), so fetching a page costs the
+    same whether the table holds a thousand rows or millions. The cursor is an
+    opaque token encoding the (logged_at, id) of the last row on the page.
+    """
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+    invalid_cursor_message = 'Invalid cursor'
+
+    def __init__(self):
+        self.page_size = getattr(settings, 'WORKFLOW_LOG_PAGE_SIZE', 50)
+        self.next_position = None
+        self.request = None
+
+    def get_page_size(self, request):
+        raw = request.query_params.get(self.page_size_query_param)
+        if raw is None:
+            return self.page_size
+        try:
+            value = int(raw)
+        except (TypeError, ValueError):
+            return self.page_size
+        if value <= 0:
+            return self.page_size
+        return min(value, self.max_page_size)
+
+    def decode_cursor(self, encoded):
+        position = decode_position(encoded)
+        if position is None:
+            raise ValidationError({self.cursor_query_param: self.invalid_cursor_message})
+        return position
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+
+        queryset = queryset.order_by('-logged_at', '-id')
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded:
+            logged_at, pk = self.decode_cursor(encoded)
+            queryset = queryset.filter(
+                Q(logged_at__lt=logged_at) | Q(logged_at=logged_at, id__lt=pk)
+            )
+
+        # Fetch one extra row to know whether there is a next page without a COUNT.
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_position = (last.logged_at, last.id)
+        else:
+            self.next_position = None
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, encode_position(*self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -0,0 +1,65 @@
+"""
+Monthly partitioning of WorkflowExecutionLog on MSSQL.
+
+Migration 0012 puts the table's clustered index, (logged_at, id), on the
+partition scheme below, with one partition per calendar month. The primary key
+on id stays as a non-partitioned unique index, because ScheduledJob and
+OutboxMessage reference it. Month partitions keep the range scans on logged_at
+(the log list, retention) inside the months they ask for.
+
+RANGE RIGHT boundaries must exist before data arrives, or every new row lands
+in the last partition. extend_monthly_partitions() adds any missing boundary
+up to a few months ahead; archive_execution_logs calls it on every run.
+Splitting an empty partition is a metadata-only operation.
+Other database vendors are not partitioned, and these helpers do nothing there.
+"""
+from datetime import date
+
+from django.db import connection
+
+PARTITION_FUNCTION = 'wflog_month_pf'
+PARTITION_SCHEME = 'wflog_month_ps'
+DEFAULT_MONTHS_AHEAD = 3
+
+
+def add_months(day, months):
+    month_index = day.month - 1 + months
+    return date(day.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def month_starts(first, last):
+    """The first day of every month from `first`'s month through `last`'s month."""
+    current = date(first.year, first.month, 1)
+    while current <= last:
+        yield current
+        current = add_months(current, 1)
+
+
+def is_partitioned(using_connection=None):
+    using_connection = using_connection or connection
+    if using_connection.vendor != 'microsoft':
+        return False
+    with using_connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sys.partition_functions WHERE name = %s", [PARTITION_FUNCTION])
+        return cursor.fetchone() is not None
+
+
+def extend_monthly_partitions(months_ahead=DEFAULT_MONTHS_AHEAD, today=None):
+    """Adds the missing month boundaries up to `months_ahead` months from now; returns the ones added."""
+    if not is_partitioned():
+        return []
+    today = today or date.today()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT MAX(CAST(v.value AS date)) FROM sys.partition_range_values v "
+            "JOIN sys.partition_functions f ON f.function_id = v.function_id WHERE f.name = %s",
+            [PARTITION_FUNCTION],
+        )
+        last_boundary = cursor.fetchone()[0]
+        start = add_months(last_boundary, 1) if last_boundary else date(today.year, today.month, 1)
+        added = []
+        for boundary in month_starts(start, add_months(today, months_ahead)):
+            cursor.execute(f"ALTER PARTITION SCHEME {PARTITION_SCHEME} NEXT USED [PRIMARY]")
+            cursor.execute(f"ALTER PARTITION FUNCTION {PARTITION_FUNCTION}() SPLIT RANGE ('{boundary.isoformat()}')")
+            added.append(boundary)
+    return added
@@ -0,0 +1,105 @@
+"""
+In-process routing table: trigger id -> the active rules it fires.
+
+Rules change rarely compared with how often events arrive, so instead of a
+Trigger lookup plus a rule query per event, every process keeps a compact
+map of plain tuples and rebuilds it (two queries) only when it goes stale.
+It goes stale when:
+  - a Trigger, Action or WorkflowRule is saved or deleted in this process
+    (post_save/post_delete signals, see workflow.signals),
+  - the shared table version counters move (writes in other processes, when
+    a shared cache backend is configured), or
+  - it is older than ROUTING_TABLE_MAX_AGE seconds, which bounds staleness
+    when the cache is process-local.
+The counters are read at most once every ROUTING_VERSION_CHECK_INTERVAL
+seconds (one get_many), not on every lookup, so routing an event batch costs
+no cache round-trips after the first; writes in this process invalidate the
+table directly and are seen at once.
+A stale table can still route a rule that was just deactivated or deleted;
+fanout.create_execution_logs re-checks the rules when it inserts the logs.
+"""
+import threading
+import time
+from collections import namedtuple
+
+from django.conf import settings
+
+from .models import Action, Trigger, WorkflowRule, delay_timedelta
+from .versioning import get_table_versions
+
+RoutedTrigger = namedtuple('RoutedTrigger', ['id', 'name'])
+# `delay` is the precomputed timedelta for scheduled rules (None if unusable)
+RoutedRule = namedtuple('RoutedRule', ['id', 'name', 'action_name', 'rule_type', 'delay'])
+
+ROUTING_MODELS = (Trigger, Action, WorkflowRule)
+
+
+class RoutingTable:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._built_at = 0.0
+        self._checked_at = 0.0
+        self._triggers = {}
+        self._triggers_by_name = {}
+        self._routes = {}
+
+    def invalidate(self):
+        self._version = None
+
+    def _current_version(self):
+        return get_table_versions(ROUTING_MODELS)
+
+    def _ensure_fresh(self):
+        max_age = getattr(settings, 'ROUTING_TABLE_MAX_AGE', 30)
+        check_interval = getattr(settings, 'ROUTING_VERSION_CHECK_INTERVAL', 0.5)
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < check_interval and now - self._built_at < max_age:
+            return
+        version = self._current_version()
+        self._checked_at = now
+        if version == self._version and time.monotonic() - self._built_at < max_age:
+            return
+        with self._lock:
+            # Re-check: another thread may have rebuilt while we waited.
+            if version == self._version and time.monotonic() - self._built_at < max_age:
+                return
+            self._rebuild(version)
+
+    def _rebuild(self, version):
+        triggers = {
+            trigger_id: RoutedTrigger(trigger_id, name)
+            for trigger_id, name in Trigger.objects.values_list('id', 'name')
+        }
+        routes = {}
+        active_rules = WorkflowRule.objects.filter(is_active=True).values_list(
+            'id', 'name', 'trigger_id', 'action__name', 'rule_type', 'delay_time', 'delay_unit'
+        ).order_by('-created_at')
+        for rule_id, name, trigger_id, action_name, rule_type, delay_time, delay_unit in active_rules:
+            routes.setdefault(trigger_id, []).append(RoutedRule(
+                rule_id, name, action_name, rule_type, delay_timedelta(delay_time, delay_unit)
+            ))
+        # Swap in complete structures so readers never see a half-built table.
+        self._triggers = triggers
+        self._triggers_by_name = {trigger.name.lower(): trigger for trigger in triggers.values()}
+        self._routes = {trigger_id: tuple(rules) for trigger_id, rules in routes.items()}
+        self._built_at = time.monotonic()
+        self._version = version
+
+    def get_trigger(self, trigger_id):
+        """The RoutedTrigger with this id, or None."""
+        self._ensure_fresh()
+        return self._triggers.get(trigger_id)
+
+    def get_trigger_by_name(self, name):
+        """Case-insensitive lookup of a RoutedTrigger by name, or None."""
+        self._ensure_fresh()
+        return self._triggers_by_name.get(name.strip().lower())
+
+    def routes_for(self, trigger_id):
+        """The active rules of a trigger as a tuple of RoutedRule."""
+        self._ensure_fresh()
+        return self._routes.get(trigger_id, ())
+
+
+routing_table = RoutingTable()
@@ -1,6 +1,6 @@
 from rest_framework import serializers
-from django.db.models import Q
-from .models import Trigger, Action, WorkflowRule, WorkflowExecutionLog
+from .models import Trigger, Action, WorkflowRule, WorkflowExecutionLog, ArchivedExecutionLog
+from .catalog import CATALOG_CACHES
 
 class TriggerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -12,13 +12,30 @@ class ActionSerializer(serializers.ModelSerializer):
         model = Action
         fields = '__all__'
 
+class CatalogPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField validated against the workflow.catalog cache of its
+    queryset's model instead of a query.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = int(data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        instance = CATALOG_CACHES[self.queryset.model].get(pk)
+        if instance is None:
+            self.fail('does_not_exist', pk_value=data)
+        return instance
+
 class WorkflowRuleSerializer(serializers.ModelSerializer):
     trigger = TriggerSerializer(read_only=True) 
     action = ActionSerializer(read_only=True)  
-    trigger_id = serializers.PrimaryKeyRelatedField(
+    trigger_id = CatalogPrimaryKeyRelatedField(
         queryset=Trigger.objects.all(), source='trigger', write_only=True
     )
-    action_id = serializers.PrimaryKeyRelatedField(
+    action_id = CatalogPrimaryKeyRelatedField(
         queryset=Action.objects.all(), source='action', write_only=True
     )
     execution_count = serializers.SerializerMethodField()
@@ -37,10 +54,16 @@ class WorkflowRuleSerializer(serializers.ModelSerializer):
 
     def get_execution_count(self, obj):
         # obj is the WorkflowRule instance
-        # Count both actual scheduled executions and simulated immediate ones
+        # WorkflowRuleViewSet annotates the count in its queryset; instances that did not
+        # come from there (e.g. freshly created ones) fall back to a COUNT query.
+        annotated = getattr(obj, 'execution_count', None)
+        if annotated is not None:
+            return annotated
+        # Count both actual scheduled executions and simulated immediate ones,
+        # including those whose logs have been archived.
         return obj.execution_logs.filter(
-            Q(status='EXECUTED') | Q(status='SIMULATED_IMMEDIATE')
-        ).count()
+            status__in=WorkflowExecutionLog.EXECUTED_STATUSES
+        ).count() + obj.archived_execution_count
 
     def validate(self, data):
         rule_type = data.get('rule_type')
@@ -66,7 +89,19 @@ class WorkflowRuleNameSerializer(serializers.ModelSerializer):
         model = WorkflowRule
         fields = ['id', 'name']
 
-class WorkflowExecutionLogSerializer(serializers.ModelSerializer):
+class DynamicFieldsMixin:
+    """
+    Lets callers restrict the serialized fields, e.g. `fields=['id', 'status']`.
+    Unknown names are ignored; `None` keeps every field.
+    """
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
+class WorkflowExecutionLogSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     workflow_rule = WorkflowRuleNameSerializer(read_only=True) # Use the lighter serializer
     workflow_rule_id = serializers.PrimaryKeyRelatedField(
         queryset=WorkflowRule.objects.all(), source='workflow_rule', write_only=True
@@ -78,8 +113,20 @@ class WorkflowExecutionLogSerializer(serializers.ModelSerializer):
             'id', 'workflow_rule', 'workflow_rule_id',
             'status', 
             'trigger_name_snapshot', 'action_name_snapshot',
-            'logged_at', 'scheduled_execution_time', 'actual_execution_time', 'details'
+            'logged_at', 'scheduled_execution_time', 'actual_execution_time', 'details',
+            'updated_at'
         ]
-        read_only_fields = ['id', 'logged_at', 'workflow_rule'] 
+        read_only_fields = ['id', 'logged_at', 'workflow_rule', 'updated_at'] 
         # workflow_rule is read_only because it's populated by workflow_rule_id on write,
-        # and workflow_rule_id itself is write_only=True in its declaration. 
\ No newline at end of file
+        # and workflow_rule_id itself is write_only=True in its declaration. 
+
+class ArchivedExecutionLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ArchivedExecutionLog
+        fields = [
+            'id', 'rule_id', 'rule_name', 'status',
+            'trigger_name_snapshot', 'action_name_snapshot',
+            'logged_at', 'scheduled_execution_time', 'actual_execution_time', 'details',
+            'archived_at',
+        ]
+        read_only_fields = fields
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_delete, post_save
+
+from .catalog import CATALOG_CACHES
+from .catalog_match import CATALOG_MATCHERS
+from .models import Action, Trigger, WorkflowExecutionLog, WorkflowRule
+from .routing import ROUTING_MODELS, routing_table
+from .versioning import bump_table_version
+
+VERSIONED_MODELS = (Trigger, Action, WorkflowRule, WorkflowExecutionLog)
+
+
+def bump_version_on_change(sender, **kwargs):
+    """Invalidates version-keyed caches whenever a tracked model is written or deleted."""
+    bump_table_version(sender)
+    if sender in ROUTING_MODELS:
+        routing_table.invalidate()
+    if sender in CATALOG_MATCHERS:
+        CATALOG_MATCHERS[sender].invalidate()
+    if sender in CATALOG_CACHES:
+        CATALOG_CACHES[sender].invalidate()
+
+
+for _model in VERSIONED_MODELS:
+    post_save.connect(bump_version_on_change, sender=_model, dispatch_uid=f"version-save-{_model._meta.label_lower}")
+    post_delete.connect(bump_version_on_change, sender=_model, dispatch_uid=f"version-delete-{_model._meta.label_lower}")
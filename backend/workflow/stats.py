@@ -0,0 +1,36 @@
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import ExecutionDailyStat
+
+
+def stat_key(log, status=None, at=None):
+    """The rollup bucket a log lands in when it reaches `status` (default: its current status) at `at`."""
+    at = at or log.logged_at or timezone.now()
+    return (timezone.localdate(at), status or log.status, log.trigger_name_snapshot, log.action_name_snapshot)
+
+
+def record_execution_events(keys):
+    """
+    Adds one to the rollup bucket of every (day, status, trigger_name, action_name)
+    key. Keys are grouped first, so a batch costs one UPDATE per distinct bucket
+    (typically a handful) rather than one per log.
+    """
+    for (day, status, trigger_name, action_name), amount in Counter(keys).items():
+        bucket = ExecutionDailyStat.objects.filter(
+            day=day, status=status, trigger_name=trigger_name, action_name=action_name
+        )
+        if bucket.update(count=F('count') + amount):
+            continue
+        try:
+            with transaction.atomic():
+                ExecutionDailyStat.objects.create(
+                    day=day, status=status, trigger_name=trigger_name,
+                    action_name=action_name, count=amount,
+                )
+        except IntegrityError:
+            # Another writer created the bucket between our UPDATE and INSERT.
+            bucket.update(count=F('count') + amount)
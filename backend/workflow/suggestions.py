@@ -0,0 +1,169 @@
+"""
+Turns a raw AI response (the JSON produced by workflow.gemini) into the
+preview payload returned by the generate-from-ai endpoints: every suggested
+workflow is mapped onto real Trigger/Action ids and validated scheduling
+fields, with notes for anything the user still has to fix.
+"""
+import json
+
+from rest_framework import status
+
+from .catalog_match import action_matcher, trigger_matcher
+from .models import WorkflowRule
+
+
+def resolve_catalog_names(raw_suggestions):
+    """
+    Resolves the trigger and action names of all `raw_suggestions` in one
+    in-memory pass; returns (trigger_matches, action_matches) keyed by name.
+    """
+    trigger_names = [raw.get('trigger_name') for raw in raw_suggestions if isinstance(raw, dict)]
+    action_names = [raw.get('action_name') for raw in raw_suggestions if isinstance(raw, dict)]
+    return trigger_matcher.match_many(trigger_names), action_matcher.match_many(action_names)
+
+
+def map_ai_suggestions(raw_suggestions):
+    """Maps a list of `suggested_workflows` items, resolving all their names in one pass."""
+    trigger_matches, action_matches = resolve_catalog_names(raw_suggestions)
+    return [
+        map_ai_suggestion(raw_suggestion, trigger_matches, action_matches) for raw_suggestion in raw_suggestions
+    ]
+
+
+def map_ai_suggestion(raw_suggestion, trigger_matches, action_matches):
+    """
+    Maps one item of `suggested_workflows` to {original_ai_suggestion, mapped_suggestion, mapping_notes}.
+
+    `trigger_matches`/`action_matches` are the {name: CatalogMatch} dicts from
+    resolve_catalog_names().
+    """
+    mapped_suggestion_data = {
+        'workflow_name': raw_suggestion.get('workflow_name', 'AI Suggested Workflow'),
+        'workflow_description': raw_suggestion.get('workflow_description', ''),
+        'rule_type': raw_suggestion.get('rule_type'),
+        'delay_time': None,
+        'delay_unit': None,
+        'trigger_id': None,
+        'trigger_name': None, # Will be populated if found
+        'trigger_match_score': None,
+        'action_id': None,
+        'action_name': None,  # Will be populated if found
+        'action_match_score': None,
+        'is_active': True # Default to true, user can change on frontend
+    }
+    mapping_notes = []
+
+    # Map Trigger
+    ai_trigger_name = raw_suggestion.get('trigger_name')
+    if ai_trigger_name:
+        trigger_match = trigger_matches.get(ai_trigger_name)
+        if trigger_match:
+            mapped_suggestion_data['trigger_id'] = trigger_match.id
+            mapped_suggestion_data['trigger_name'] = trigger_match.name # Use actual DB name
+            mapped_suggestion_data['trigger_match_score'] = trigger_match.score
+            if trigger_match.score < 1.0:
+                mapping_notes.append(f"AI suggested trigger '{ai_trigger_name}', matched to '{trigger_match.name}'. Please confirm.")
+        else:
+            mapping_notes.append(f"AI suggested trigger '{ai_trigger_name}' which was not found. Please select a trigger.")
+    else:
+        mapping_notes.append("AI did not suggest a trigger. Please select one.")
+
+    # Map Action
+    ai_action_name = raw_suggestion.get('action_name')
+    if ai_action_name:
+        action_match = action_matches.get(ai_action_name)
+        if action_match:
+            mapped_suggestion_data['action_id'] = action_match.id
+            mapped_suggestion_data['action_name'] = action_match.name # Use actual DB name
+            mapped_suggestion_data['action_match_score'] = action_match.score
+            if action_match.score < 1.0:
+                mapping_notes.append(f"AI suggested action '{ai_action_name}', matched to '{action_match.name}'. Please confirm.")
+        else:
+            mapping_notes.append(f"AI suggested action '{ai_action_name}' which was not found. Please select an action.")
+    else:
+        mapping_notes.append("AI did not suggest an action. Please select one.")
+
+    # Process delay if rule_type is 'scheduled'
+    if mapped_suggestion_data['rule_type'] == 'scheduled':
+        delay_time_raw = raw_suggestion.get('delay_time')
+        delay_unit_raw = raw_suggestion.get('delay_unit')
+
+        if delay_time_raw is not None:
+            try:
+                parsed_delay_time = int(float(delay_time_raw)) # AI might send float
+                if parsed_delay_time > 0:
+                    mapped_suggestion_data['delay_time'] = parsed_delay_time
+                else:
+                    mapping_notes.append(f"AI suggested non-positive delay_time '{delay_time_raw}'. Please enter a positive number.")
+            except (ValueError, TypeError):
+                mapping_notes.append(f"AI suggested invalid delay_time format '{delay_time_raw}'. Please enter a number.")
+        else:
+            mapping_notes.append("Scheduled rule type chosen by AI, but no delay_time provided. Please specify.")
+
+        if delay_unit_raw and delay_unit_raw in [choice[0] for choice in WorkflowRule.DELAY_UNIT_CHOICES]:
+            mapped_suggestion_data['delay_unit'] = delay_unit_raw
+        elif delay_unit_raw: # It was provided but invalid
+            mapping_notes.append(f"AI suggested invalid delay_unit '{delay_unit_raw}'. Please select a valid unit.")
+        else: # Not provided for scheduled
+             mapping_notes.append("Scheduled rule type chosen by AI, but no delay_unit provided. Please specify.")
+    elif mapped_suggestion_data['rule_type'] == 'immediate':
+        mapped_suggestion_data['delay_time'] = None
+        mapped_suggestion_data['delay_unit'] = None
+    else: # Invalid rule_type
+        mapping_notes.append(f"AI suggested an invalid rule_type: '{mapped_suggestion_data['rule_type']}'. Please select 'immediate' or 'scheduled'.")
+        mapped_suggestion_data['rule_type'] = None # Nullify if invalid
+
+    return {
+        "original_ai_suggestion": raw_suggestion,
+        "mapped_suggestion": mapped_suggestion_data,
+        "mapping_notes": mapping_notes
+    }
+
+
+def build_suggestions_payload(ai_response_json_str):
+    """
+    Returns (payload, http_status) for a raw AI response string, exactly as
+    generate-from-ai responds: a preview payload on success, or an `error`
+    payload when the AI call failed or returned something that is not JSON.
+    """
+    if ai_response_json_str is None:
+        return ({"error": "AI service failed to generate suggestions. Check server logs."},
+                status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    try:
+        ai_data = json.loads(ai_response_json_str)
+        if not isinstance(ai_data, dict):
+            raise json.JSONDecodeError("Expected a JSON object", ai_response_json_str, 0)
+    except json.JSONDecodeError as je:
+        print(f"Error: AI response was not valid JSON: {je}")
+        print(f"AI Response String: {ai_response_json_str}")
+        return ({"error": "AI response was not in the expected JSON format."},
+                status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    raw_ai_suggestions = ai_data.get("suggested_workflows", [])
+    ai_global_errors = ai_data.get("errors", []) # Capture global errors if AI returns them
+
+    if not raw_ai_suggestions and not ai_global_errors:
+        return ({
+            "preview_workflows": [],
+            "ai_reported_errors": [],
+            "message": suggestions_message(0, 0)
+        }, status.HTTP_200_OK)
+
+    preview_suggestions_for_frontend = map_ai_suggestions(raw_ai_suggestions)
+
+    return ({
+        "preview_workflows": preview_suggestions_for_frontend,
+        "ai_reported_errors": ai_global_errors,
+        "message": suggestions_message(len(raw_ai_suggestions), len(ai_global_errors))
+    }, status.HTTP_200_OK)
+
+
+def suggestions_message(suggestion_count, error_count):
+    """The human-readable summary returned alongside the previews."""
+    if not suggestion_count and not error_count:
+        return "AI could not suggest any workflows or the prompt was too vague."
+    final_response_message = f"AI returned {suggestion_count} suggestion(s)."
+    if error_count:
+        final_response_message += f" AI also reported {error_count} global issue(s)."
+    return final_response_message
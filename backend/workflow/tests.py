@@ -0,0 +1,1359 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import ai_batch, executors, gemini, routing, suggestions, views, workers
+from .ai_cache import FilePromptCacheBackend, LocMemPromptCacheBackend, PromptCache, normalize_prompt
+from .ai_stream import SuggestedWorkflowsStreamParser
+from .catalog_match import DEFAULT_MIN_SCORE, action_matcher, trigger_matcher
+from .etags import accepts_encoding
+from .jobs import JobOutcome, claim_jobs, claimable_q, retry_delay, run_jobs, write_outcomes
+from .local_suggest import confident_local_suggestion, suggest_locally
+from .management.commands.run_scheduler import Command as RunSchedulerCommand
+from .models import Action, ExecutionDailyStat, OutboxMessage, ScheduledJob, Trigger, WorkflowExecutionLog, WorkflowRule
+from .routing import routing_table
+from .throttle import TokenBucket
+from .versioning import bump_table_version
+from .views import WorkflowRuleViewSet
+from .workers import ActionWorkerPool, percentile
+
+
+def create_rule(name='Rule', rule_type='immediate', **fields):
+    return WorkflowRule.objects.create(
+        name=name, trigger=Trigger.objects.first(), action=Action.objects.first(), rule_type=rule_type, **fields
+    )
+
+
+def create_log(rule, status='EXECUTED', logged_at=None, **fields):
+    log = WorkflowExecutionLog.objects.create(
+        workflow_rule=rule, status=status,
+        trigger_name_snapshot=rule.trigger.name, action_name_snapshot=rule.action.name, **fields
+    )
+    if logged_at is not None:
+        # logged_at is auto_now_add, so it can only be backdated with update().
+        WorkflowExecutionLog.objects.filter(id=log.id).update(logged_at=logged_at)
+        log.logged_at = logged_at
+    return log
+
+
+def create_job(rule, due_at=None, queue_model=ScheduledJob):
+    """A due job of `queue_model` with its log, as fanout would have queued it."""
+    due_at = due_at or timezone.now()
+    if queue_model is ScheduledJob:
+        log = create_log(rule, status='SIMULATED_SCHEDULED', scheduled_execution_time=due_at)
+    else:
+        log = create_log(rule, status='SIMULATED_IMMEDIATE', actual_execution_time=due_at)
+    return queue_model.objects.create(execution_log=log, due_at=due_at)
+
+
+@skipUnless(connection.features.supports_explaining_query_execution, 'EXPLAIN is not supported by this database.')
+class QueryPlanTests(TestCase):
+    """The hot queries keep using the indexes added for them (migration 0005)."""
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan, f"Expected {index_name} in the query plan:\n{plan}")
+
+    def test_scheduler_due_query(self):
+        due_logs = WorkflowExecutionLog.objects.filter(
+            status='SIMULATED_SCHEDULED', scheduled_execution_time__lte=timezone.now()
+        ).order_by('scheduled_execution_time')
+        self.assertUsesIndex(due_logs, 'wflog_status_sched_idx')
+
+    def test_scheduled_job_claim_query(self):
+        claimable = ScheduledJob.objects.filter(claimable_q(timezone.now())).order_by('-priority', 'due_at', 'id')
+        self.assertUsesIndex(claimable, 'job_due_idx')
+
+    def test_rule_execution_count(self):
+        self.assertUsesIndex(
+            WorkflowExecutionLog.objects.filter(workflow_rule_id=1, status__in=WorkflowExecutionLog.EXECUTED_STATUSES),
+            'wflog_rule_status_idx',
+        )
+        # The annotated count of the rule list joins through the same index.
+        self.assertUsesIndex(WorkflowRuleViewSet().get_queryset(), 'wflog_rule_status_idx')
+
+    def test_log_list_ordering(self):
+        self.assertUsesIndex(WorkflowExecutionLog.objects.order_by('-logged_at', '-id')[:50], 'wflog_logged_at_idx')
+
+
+class RuleListQueryCountTests(TestCase):
+    """GET /api/rules/ costs the same number of queries however many rules there are."""
+
+    # ETag components (rule count/max updated_at, latest log) and the annotated rule list.
+    EXPECTED_QUERIES = 3
+
+    def setUp(self):
+        cache.clear()
+        self.trigger = Trigger.objects.first()
+        self.action = Action.objects.first()
+
+    def add_rules(self, count):
+        for _ in range(count):
+            rule = WorkflowRule.objects.create(
+                name=f"Rule {WorkflowRule.objects.count() + 1}", trigger=self.trigger, action=self.action
+            )
+            WorkflowExecutionLog.objects.bulk_create([
+                WorkflowExecutionLog(
+                    workflow_rule=rule, status=status,
+                    trigger_name_snapshot=self.trigger.name, action_name_snapshot=self.action.name,
+                )
+                for status in ('SIMULATED_IMMEDIATE', 'EXECUTED', 'EXECUTION_ERROR')
+            ])
+
+    def assertRuleListQueries(self, rule_count):
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            response = self.client.get('/api/rules/')
+        self.assertEqual(response.status_code, 200)
+        rules = response.json()
+        self.assertEqual(len(rules), rule_count)
+        self.assertTrue(all(rule['execution_count'] == 2 for rule in rules))
+
+    def test_query_count_does_not_grow_with_rules(self):
+        self.add_rules(5)
+        self.assertRuleListQueries(5)
+        self.add_rules(15)
+        self.assertRuleListQueries(20)
+
+
+class StaleRoutingTests(TestCase):
+    """
+    Rules changed by another process (simulated with update()/_raw_delete, which
+    send no signals) are skipped when the stale routing table still routes them.
+    """
+
+    def setUp(self):
+        cache.clear()
+        routing_table.invalidate()
+        self.trigger = Trigger.objects.first()
+        action = Action.objects.first()
+        self.live, self.deactivated, self.deleted = [
+            WorkflowRule.objects.create(name=name, trigger=self.trigger, action=action)
+            for name in ('Live', 'Deactivated', 'Deleted')
+        ]
+        # Build the routing table while all three rules are active.
+        self.assertEqual(len(routing_table.routes_for(self.trigger.id)), 3)
+        WorkflowRule.objects.filter(id=self.deactivated.id).update(is_active=False)
+        WorkflowRule.objects.filter(id=self.deleted.id)._raw_delete(WorkflowRule.objects.db)
+
+    def stale_rule_ids(self, errors):
+        return sorted(error['workflow_rule_id'] for error in errors)
+
+    def test_simulate_trigger_saves_only_live_rules(self):
+        response = self.client.post('/api/rules/simulate-trigger/', {'trigger_id': self.trigger.id}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual([log['workflow_rule']['id'] for log in data['simulated_logs_created']], [self.live.id])
+        self.assertEqual(self.stale_rule_ids(data['simulation_errors']), [self.deactivated.id, self.deleted.id])
+        self.assertEqual(WorkflowExecutionLog.objects.count(), 1)
+
+    def test_event_batch_saves_only_live_rules(self):
+        response = self.client.post(
+            '/api/events/', {'events': [{'trigger_id': self.trigger.id}] * 2}, content_type='application/json'
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['accepted'], 2)
+        self.assertEqual(data['logs_created'], 2)
+        for result in data['results']:
+            self.assertEqual(self.stale_rule_ids(result['simulation_errors']), [self.deactivated.id, self.deleted.id])
+        self.assertEqual(WorkflowExecutionLog.objects.filter(workflow_rule=self.live).count(), 2)
+
+
+class EventIngestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        routing_table.invalidate()
+        self.trigger = Trigger.objects.first()
+        WorkflowRule.objects.create(name='Rule', trigger=self.trigger, action=Action.objects.first())
+
+    def test_impossible_occurred_at_rejects_only_that_event(self):
+        events = [
+            {'event_id': 'bad', 'trigger_id': self.trigger.id, 'occurred_at': '2024-02-30T10:00:00'},
+            {'event_id': 'good', 'trigger_id': self.trigger.id, 'occurred_at': '2024-02-28T10:00:00'},
+        ]
+        response = self.client.post('/api/events/', {'events': events}, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        bad, good = response.json()['results']
+        self.assertEqual(bad['status'], 'rejected')
+        self.assertIn('occurred_at', bad['error'])
+        self.assertEqual(good['status'], 'accepted')
+        self.assertEqual(good['logs_created'], 1)
+
+
+class SyncGeminiDeadlineTests(SimpleTestCase):
+    """The sync Gemini call gives up after GEMINI_TIMEOUT_SECONDS instead of holding its thread."""
+
+    def slow_stream(self, **kwargs):
+        self.http_timeout = kwargs['config'].http_options.timeout
+        for _ in range(10):
+            time.sleep(0.1)
+            yield SimpleNamespace(text='{')
+
+    def test_slow_stream_times_out(self):
+        client = SimpleNamespace(models=SimpleNamespace(generate_content_stream=self.slow_stream))
+        with mock.patch.object(gemini, 'GEMINI_TIMEOUT_SECONDS', 0.25), \
+                mock.patch.object(gemini, 'get_client', return_value=client):
+            started = time.monotonic()
+            with self.assertRaises(gemini.AIUpstreamTimeout):
+                gemini.get_ai_suggestions_for_prompt('Email the guest when they check in')
+        self.assertLess(time.monotonic() - started, 0.6)
+        self.assertEqual(self.http_timeout, 250)
+
+
+@override_settings(AI_BATCH_TIMEOUT_SECONDS=0.3)
+class AIBatchDeadlineTests(TestCase):
+    """generate-from-ai-batch answers within AI_BATCH_TIMEOUT_SECONDS however slow Gemini is."""
+
+    async def fake_gemini(self, prompt_text):
+        if 'slow' in prompt_text:
+            await asyncio.sleep(5)
+        return '{"suggested_workflows": [], "errors": []}'
+
+    def test_slow_prompts_time_out_without_blocking_the_batch(self):
+        with mock.patch.object(ai_batch, 'get_ai_suggestions_for_prompt_async', self.fake_gemini), \
+                mock.patch.object(ai_batch, 'confident_local_suggestion', return_value=None), \
+                mock.patch.object(ai_batch, 'local_fallback', return_value=None):
+            started = time.monotonic()
+            response = self.client.post(
+                '/api/rules/generate-from-ai-batch/',
+                {'prompts': ['a fast prompt', 'a slow prompt']}, content_type='application/json',
+            )
+        self.assertLess(time.monotonic() - started, 2)
+        self.assertEqual(response.status_code, 200)
+        fast, slow = response.json()['results']
+        self.assertEqual(fast['status'], 200)
+        self.assertEqual(slow['status'], 504)
+
+
+class FlakySMTPConnection:
+    """Delivers `deliverable` messages, then fails."""
+
+    def __init__(self, deliverable):
+        self.deliverable = deliverable
+        self.delivered = []
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send_messages(self, messages):
+        if len(self.delivered) >= self.deliverable:
+            raise ConnectionResetError('SMTP connection dropped')
+        self.delivered.extend(messages)
+        return len(messages)
+
+
+class EmailPartialFailureTests(SimpleTestCase):
+    """A batch of emails that breaks part-way fails only the messages that were not delivered."""
+
+    def make_jobs(self, count):
+        return [
+            SimpleNamespace(execution_log=SimpleNamespace(
+                id=log_id, workflow_rule_id=log_id, workflow_rule=SimpleNamespace(name=f"Rule {log_id}"),
+                trigger_name_snapshot='Guest checks in', action_name_snapshot='Send Email',
+            ))
+            for log_id in range(1, count + 1)
+        ]
+
+    def test_only_undelivered_emails_fail(self):
+        connection = FlakySMTPConnection(deliverable=2)
+        executor = executors.EmailExecutor(
+            executors.SMTPTransport(), {'EMAIL_RECIPIENTS': ['ops@example.com']}
+        )
+        executor.max_batch_size = 5
+        with mock.patch.object(executors, 'get_connection', return_value=connection):
+            errors = executor.execute_batch(self.make_jobs(5))
+        self.assertEqual(len(connection.delivered), 2)
+        self.assertEqual(errors[:2], [None, None])
+        self.assertTrue(all(isinstance(error, ConnectionResetError) for error in errors[2:]))
+
+    def test_failure_before_any_delivery_fails_the_batch(self):
+        executor = executors.EmailExecutor(
+            executors.SMTPTransport(), {'EMAIL_RECIPIENTS': ['ops@example.com']}
+        )
+        with mock.patch.object(executors, 'get_connection', return_value=FlakySMTPConnection(deliverable=0)):
+            errors = executor.execute_batch(self.make_jobs(3))
+        self.assertTrue(all(isinstance(error, ConnectionResetError) for error in errors))
+
+
+class LogListTests(TestCase):
+    """Keyset pagination, filters and field projection of /api/workflow-logs/."""
+
+    def setUp(self):
+        self.rule = create_rule('Check-in email')
+        self.other_rule = create_rule('Checkout task')
+        self.moment = timezone.now() - timedelta(hours=1)
+
+    def get(self, params):
+        return self.client.get('/api/workflow-logs/', params)
+
+    def test_pages_across_equal_logged_at(self):
+        ids = sorted((create_log(self.rule, logged_at=self.moment).id for _ in range(5)), reverse=True)
+        seen = []
+        response = self.get({'page_size': 2})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            seen.extend(log['id'] for log in data['results'])
+            if not data['next']:
+                break
+            response = self.client.get(data['next'])
+        self.assertEqual(seen, ids)
+
+    def test_bad_cursor_is_rejected(self):
+        for cursor in ('not-a-cursor', 'MjAyNC0wMi0zMFQxMDowMDowMHwx'):  # the second encodes 2024-02-30
+            response = self.get({'cursor': cursor})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('cursor', response.json())
+
+    def test_filters(self):
+        old = create_log(self.rule, status='EXECUTED', logged_at=self.moment - timedelta(days=2))
+        failed = create_log(self.rule, status='EXECUTION_ERROR', logged_at=self.moment)
+        other = create_log(self.other_rule, status='EXECUTED', logged_at=self.moment)
+
+        def ids(params):
+            response = self.get(params)
+            self.assertEqual(response.status_code, 200)
+            return sorted(log['id'] for log in response.json()['results'])
+
+        self.assertEqual(ids({'rule': self.rule.id}), [old.id, failed.id])
+        self.assertEqual(ids({'status': 'EXECUTED,EXECUTION_ERROR', 'rule': self.rule.id}), [old.id, failed.id])
+        self.assertEqual(ids({'status': 'EXECUTED'}), [old.id, other.id])
+        self.assertEqual(ids({'logged_after': (self.moment - timedelta(days=1)).isoformat()}), [failed.id, other.id])
+        self.assertEqual(ids({'logged_before': (self.moment - timedelta(days=1)).isoformat()}), [old.id])
+
+    def test_invalid_filters_are_rejected(self):
+        for params, field in (
+            ({'rule': 'abc'}, 'rule'),
+            ({'status': 'EXECUTED,NOPE'}, 'status'),
+            ({'logged_after': 'yesterday'}, 'logged_after'),
+            ({'logged_after': '2024-02-30T10:00:00'}, 'logged_after'),
+            ({'logged_before': '2024-13-01T10:00:00'}, 'logged_before'),
+        ):
+            response = self.get(params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn(field, response.json())
+
+    def test_fields_projection(self):
+        create_log(self.rule, details='x' * 100)
+        log = self.get({'fields': 'id,status'}).json()['results'][0]
+        self.assertEqual(set(log), {'id', 'status'})
+        log = self.get({'fields': 'id,workflow_rule'}).json()['results'][0]
+        self.assertEqual(log['workflow_rule'], {'id': self.rule.id, 'name': self.rule.name})
+
+
+class LogDeltaTests(TestCase):
+    """`since` delta mode of /api/workflow-logs/."""
+
+    def setUp(self):
+        self.rule = create_rule()
+
+    def stamp(self, log, seconds_ago):
+        updated_at = timezone.now() - timedelta(seconds=seconds_ago)
+        WorkflowExecutionLog.objects.filter(id=log.id).update(updated_at=updated_at)
+
+    def poll(self, since, **params):
+        response = self.client.get('/api/workflow-logs/', {'since': since, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_returns_changes_in_order_and_pages(self):
+        first, second, third = (create_log(self.rule) for _ in range(3))
+        for log, seconds_ago in ((first, 60), (second, 50), (third, 40)):
+            self.stamp(log, seconds_ago)
+
+        data = self.poll('', page_size=2)
+        self.assertEqual([log['id'] for log in data['results']], [first.id, second.id])
+        self.assertTrue(data['has_more'])
+        data = self.poll(data['since'], page_size=2)
+        self.assertEqual([log['id'] for log in data['results']], [third.id])
+        self.assertFalse(data['has_more'])
+
+        # A later change to the first row brings it back.
+        self.stamp(first, 30)
+        data = self.poll(data['since'])
+        self.assertEqual([log['id'] for log in data['results']], [first.id])
+
+    @override_settings(WORKFLOW_LOG_SINCE_LAG_SECONDS=5)
+    def test_recent_rows_wait_for_the_lag(self):
+        settled = create_log(self.rule)
+        self.stamp(settled, 60)
+        since = self.client.get('/api/workflow-logs/').json()['since']
+        recent = create_log(self.rule)
+        # Stamped before the cursor's next position would be, but committed "late".
+        self.stamp(recent, 1)
+
+        data = self.poll(since)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['since'], since)
+        with override_settings(WORKFLOW_LOG_SINCE_LAG_SECONDS=0):
+            data = self.poll(since)
+        self.assertEqual([log['id'] for log in data['results']], [recent.id])
+
+    def test_invalid_since_is_rejected(self):
+        response = self.client.get('/api/workflow-logs/', {'since': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class RuleListETagTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.rule = create_rule()
+
+    def test_matching_if_none_match_gets_304_until_a_rule_changes(self):
+        response = self.client.get('/api/rules/')
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+
+        response = self.client.get('/api/rules/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get('/api/rules/', HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+
+        self.rule.name = 'Renamed'
+        self.rule.save()
+        response = self.client.get('/api/rules/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+class StatsRollupTests(TestCase):
+    """The ExecutionDailyStat rollup agrees with the log rows it summarizes."""
+
+    def setUp(self):
+        cache.clear()
+        routing_table.invalidate()
+        self.immediate = create_rule('Immediate')
+        self.scheduled = create_rule('Scheduled', rule_type='scheduled', delay_time=1, delay_unit='minutes')
+
+    def run_due_jobs(self, queue_model):
+        lease_token, jobs = claim_jobs(100, 60, queue_model=queue_model)
+        return write_outcomes(run_jobs([(job, lease_token) for job in jobs]), queue_model)
+
+    def test_rollup_matches_rows(self):
+        response = self.client.post(
+            '/api/rules/simulate-trigger/', {'trigger_id': self.immediate.trigger_id}, content_type='application/json'
+        )
+        self.assertEqual(len(response.json()['simulated_logs_created']), 2)
+        ScheduledJob.objects.update(due_at=timezone.now())
+        self.assertEqual(self.run_due_jobs(ScheduledJob), 1)
+        self.assertEqual(self.run_due_jobs(OutboxMessage), 1)
+
+        statuses = sorted(WorkflowExecutionLog.objects.values_list('status', flat=True))
+        self.assertEqual(statuses, ['EXECUTED', 'SIMULATED_IMMEDIATE'])
+        events = {row.status: row.count for row in ExecutionDailyStat.objects.all()}
+        # The scheduled log was counted when created and again when it ran; the
+        # outbox send did not change its log's status, so it adds no event.
+        self.assertEqual(events, {'SIMULATED_IMMEDIATE': 1, 'SIMULATED_SCHEDULED': 1, 'EXECUTED': 1})
+
+        stats = self.client.get('/api/stats/').json()
+        self.assertEqual(stats['status_events'], events)
+        self.assertEqual(
+            stats['executions_today'],
+            WorkflowExecutionLog.objects.filter(status__in=WorkflowExecutionLog.EXECUTED_STATUSES).count(),
+        )
+        self.assertEqual(stats['pending_scheduled'], 0)
+        self.assertEqual(sum(day['count'] for day in stats['daily_executions']), 2)
+
+
+class RoutingVersionCheckTests(TestCase):
+    """The routing table reads the version counters at most once per check interval."""
+
+    def setUp(self):
+        cache.clear()
+        self.rule = create_rule()
+        routing_table.invalidate()
+
+    def lookups(self, count):
+        with mock.patch('workflow.routing.get_table_versions', wraps=routing.get_table_versions) as versions:
+            for _ in range(count):
+                routing_table.routes_for(self.rule.trigger_id)
+        return versions.call_count
+
+    @override_settings(ROUTING_VERSION_CHECK_INTERVAL=60)
+    def test_batch_of_lookups_reads_versions_once(self):
+        self.assertEqual(self.lookups(100), 1)
+
+    @override_settings(ROUTING_VERSION_CHECK_INTERVAL=60)
+    def test_local_write_is_seen_within_interval(self):
+        self.assertEqual(len(routing_table.routes_for(self.rule.trigger_id)), 1)
+        create_rule('Second')
+        self.assertEqual(len(routing_table.routes_for(self.rule.trigger_id)), 2)
+
+    @override_settings(ROUTING_VERSION_CHECK_INTERVAL=0)
+    def test_remote_write_is_seen_after_interval(self):
+        self.assertEqual(len(routing_table.routes_for(self.rule.trigger_id)), 1)
+        # Another process deactivates the rule: no signal here, only its version bump.
+        WorkflowRule.objects.filter(id=self.rule.id).update(is_active=False)
+        bump_table_version(WorkflowRule)
+        self.assertEqual(routing_table.routes_for(self.rule.trigger_id), ())
+
+
+VALID_AI_RESPONSE = '{"suggested_workflows": [], "errors": []}'
+
+
+class PromptCacheTests(SimpleTestCase):
+    """Prompt normalization, what gets cached, and the locmem/file backends."""
+
+    def make_cache(self, backend=None):
+        return PromptCache(backend or LocMemPromptCacheBackend(ttl=60, max_entries=10), namespace='test')
+
+    def test_trivially_different_prompts_share_a_key(self):
+        self.assertEqual(normalize_prompt('  When guest checks in, SEND email. '), 'when guest checks in send email')
+        prompt_cache = self.make_cache()
+        self.assertEqual(
+            prompt_cache.make_key('When guest checks in, send email.'),
+            prompt_cache.make_key('when guest checks in send email'),
+        )
+        self.assertNotEqual(
+            prompt_cache.make_key('when guest checks in send email'),
+            prompt_cache.make_key('when guest checks out send email'),
+        )
+
+    def test_only_json_objects_are_cached(self):
+        prompt_cache = self.make_cache()
+        for failure in (None, 'Sorry, I cannot help with that.', '["not", "an", "object"]', '{"truncated": '):
+            value, hit = prompt_cache.get_or_generate('a prompt', lambda prompt_text: failure)
+            self.assertEqual((value, hit), (failure, False))
+            self.assertIsNone(prompt_cache.get('a prompt'))
+        prompt_cache.get_or_generate('a prompt', lambda prompt_text: VALID_AI_RESPONSE)
+        self.assertEqual(prompt_cache.get_or_generate('A prompt!', None), (VALID_AI_RESPONSE, True))
+
+    def test_locmem_entries_expire_and_are_evicted_least_recently_used_first(self):
+        backend = LocMemPromptCacheBackend(ttl=60, max_entries=2)
+        backend.set('a', 1)
+        backend.set('b', 2)
+        backend.get('a')
+        backend.set('c', 3)
+        self.assertEqual((backend.get('a'), backend.get('b'), backend.get('c')), (1, None, 3))
+        with mock.patch('workflow.ai_cache.time.time', return_value=time.time() + 61):
+            self.assertIsNone(backend.get('a'))
+
+    def test_file_entries_are_shared_expire_and_are_pruned(self):
+        with tempfile.TemporaryDirectory() as location:
+            writer = FilePromptCacheBackend(ttl=60, max_entries=2, location=location)
+            reader = FilePromptCacheBackend(ttl=60, max_entries=2, location=location)
+            writer.set('a', VALID_AI_RESPONSE)
+            self.assertEqual(reader.get('a'), VALID_AI_RESPONSE)
+            writer.set('b', VALID_AI_RESPONSE)
+            reader.get('a')
+            writer.set('c', VALID_AI_RESPONSE)
+            self.assertIsNone(reader.get('b'))
+            self.assertEqual(reader.get('c'), VALID_AI_RESPONSE)
+            with mock.patch('workflow.ai_cache.time.time', return_value=time.time() + 61):
+                self.assertIsNone(reader.get('a'))
+
+
+class AIResponseCachingTests(TestCase):
+    """The async and batch endpoints do not cache Gemini output that is not a JSON object."""
+
+    def setUp(self):
+        self.prompt_cache = PromptCache(LocMemPromptCacheBackend(ttl=60, max_entries=10), namespace='test')
+
+    def post(self, module, path, body, gemini_response):
+        async def fake_gemini(prompt_text):
+            return gemini_response
+
+        with mock.patch.object(module, 'get_prompt_cache', return_value=self.prompt_cache), \
+                mock.patch.object(module, 'get_ai_suggestions_for_prompt_async', fake_gemini), \
+                mock.patch.object(module, 'confident_local_suggestion', return_value=None), \
+                mock.patch.object(module, 'local_fallback', return_value=None):
+            return self.client.post(path, body, content_type='application/json')
+
+    def test_async_endpoint(self):
+        response = self.post(views, '/api/rules/generate-from-ai-async/', {'prompt': 'a prompt'}, 'not json')
+        self.assertEqual(response.status_code, 500)
+        self.assertIsNone(self.prompt_cache.get('a prompt'))
+        self.post(views, '/api/rules/generate-from-ai-async/', {'prompt': 'a prompt'}, VALID_AI_RESPONSE)
+        self.assertEqual(self.prompt_cache.get('a prompt'), VALID_AI_RESPONSE)
+
+    def test_batch_endpoint(self):
+        response = self.post(ai_batch, '/api/rules/generate-from-ai-batch/', {'prompts': ['a prompt']}, '[1, 2]')
+        self.assertEqual(response.json()['results'][0]['status'], 500)
+        self.assertIsNone(self.prompt_cache.get('a prompt'))
+
+
+class BenchmarkGeminiSetupTests(SimpleTestCase):
+    def test_placeholder_key_does_not_outlive_the_run(self):
+        with mock.patch.dict(os.environ, clear=True), mock.patch.object(gemini, '_client', None), \
+                mock.patch.object(gemini, '_client_api_key', None):
+            call_command('benchmark_gemini_setup', '--iterations', '1', stdout=io.StringIO())
+            self.assertNotIn('GEMINI_API_KEY', os.environ)
+            self.assertIsNone(gemini._client)
+            self.assertIsNone(gemini.get_client())
+
+
+class StreamParserTests(SimpleTestCase):
+    """SuggestedWorkflowsStreamParser yields each suggestion once its closing brace arrives."""
+
+    RESPONSE = json.dumps({
+        'suggested_workflows': [
+            {'name': 'Welcome', 'trigger_name': 'Guest Checked In', 'details': {'subject': 'Hi {guest}'}},
+            {'name': 'Tricky "quotes" } and { braces', 'message': 'a \\ backslash then "}"'},
+            {'name': 'Last', 'trigger_name': 'Guest Checked Out'},
+        ],
+        'errors': [],
+    })
+
+    def parse(self, text, chunk_size):
+        parser = SuggestedWorkflowsStreamParser()
+        items = []
+        for start in range(0, len(text), chunk_size):
+            items.extend(parser.feed(text[start:start + chunk_size]))
+        return parser, items
+
+    def test_items_split_across_chunks(self):
+        expected = json.loads(self.RESPONSE)['suggested_workflows']
+        for chunk_size in (1, 2, 7, 16, len(self.RESPONSE)):
+            with self.subTest(chunk_size=chunk_size):
+                parser, items = self.parse(self.RESPONSE, chunk_size)
+                self.assertEqual(items, expected)
+                self.assertEqual(json.loads(parser.full_text()), json.loads(self.RESPONSE))
+
+    def test_item_is_returned_by_the_chunk_that_closes_it(self):
+        parser = SuggestedWorkflowsStreamParser()
+        self.assertEqual(parser.feed('{"suggested_work'), [])
+        self.assertEqual(parser.feed('flows": [{"name": "A", "note": "{"'), [])
+        self.assertEqual(parser.feed('}, {"name"'), [{'name': 'A', 'note': '{'}])
+        self.assertEqual(parser.feed(': "B"}], "errors": [{"x": 1}]}'), [{'name': 'B'}])
+
+    def test_escaped_quotes_and_braces_inside_strings(self):
+        _, items = self.parse(self.RESPONSE, 3)
+        self.assertEqual(items[1], {'name': 'Tricky "quotes" } and { braces', 'message': 'a \\ backslash then "}"'})
+
+    def test_truncated_stream_returns_only_complete_items(self):
+        truncated = self.RESPONSE[:self.RESPONSE.index('"Last"')]
+        parser, items = self.parse(truncated, 5)
+        self.assertEqual([item['name'] for item in items], ['Welcome', 'Tricky "quotes" } and { braces'])
+        with self.assertRaises(json.JSONDecodeError):
+            json.loads(parser.full_text())
+
+
+class LocalSuggestionTests(TestCase):
+    """Confident prompts are answered locally; the rest fall through to Gemini."""
+
+    # prompt -> (trigger, action, rule_type, delay_time, delay_unit)
+    CONFIDENT = {
+        'When a guest checks in, send them a welcome email.': ('Guest checks in', 'Send Email', 'immediate', 0, 'minutes'),
+        'Send a Slack notification 2 hours after cleaning is completed':
+            ('Cleaning completed', 'Send Slack Notification', 'scheduled', 2, 'hours'),
+        'When a booking is cancelled, create a task for housekeeping': ('Booking canceled', 'Create Task', 'immediate', 0, 'minutes'),
+        'When guest chekcs out send an email the next day': ('Guest checks out', 'Send Email', 'scheduled', 1, 'days'),
+    }
+    # Ambiguous, unsupported or unrecognised prompts.
+    FALL_THROUGH = [
+        'Send an email 1 day before the guest checks in',
+        'When a guest checks in or a booking is confirmed, send an email',
+        'Send an email after 2 hours or 3 days when a guest checks out',
+        'When a guest checks in, send an email unless it is a weekend',
+        'Do something nice for our guests',
+        '',
+    ]
+
+    def test_confident_prompts_are_answered_locally(self):
+        for prompt_text, expected in self.CONFIDENT.items():
+            with self.subTest(prompt_text=prompt_text):
+                response_json = confident_local_suggestion(prompt_text)
+                self.assertIsNotNone(response_json)
+                suggestion, = json.loads(response_json)['suggested_workflows']
+                self.assertEqual(
+                    tuple(suggestion[field] for field in ('trigger_name', 'action_name', 'rule_type', 'delay_time', 'delay_unit')),
+                    expected,
+                )
+
+    def test_uncertain_prompts_fall_through(self):
+        for prompt_text in self.FALL_THROUGH:
+            with self.subTest(prompt_text=prompt_text):
+                self.assertIsNone(confident_local_suggestion(prompt_text))
+
+    def test_threshold_gates_the_local_answer(self):
+        prompt_text = 'Send an email 1 day before the guest checks in'
+        confidence = suggest_locally(prompt_text).confidence
+        with override_settings(AI_LOCAL_SUGGESTION_THRESHOLD=confidence):
+            self.assertIsNotNone(confident_local_suggestion(prompt_text))
+        with override_settings(AI_LOCAL_SUGGESTION_THRESHOLD=confidence + 0.01):
+            self.assertIsNone(confident_local_suggestion(prompt_text))
+
+    def test_generate_from_ai_only_asks_gemini_below_the_threshold(self):
+        with mock.patch.object(views, 'get_ai_suggestions_for_prompt', return_value=VALID_AI_RESPONSE) as ask_gemini, \
+                mock.patch.object(views, 'get_prompt_cache',
+                                  return_value=PromptCache(LocMemPromptCacheBackend(ttl=60, max_entries=10), namespace='test')):
+            for prompt_text, source in (
+                (next(iter(self.CONFIDENT)), 'local'),
+                ('Send an email 1 day before the guest checks in', 'gemini'),
+            ):
+                response = self.client.post('/api/rules/generate-from-ai/', {'prompt': prompt_text}, content_type='application/json')
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response['X-AI-Source'], source)
+        ask_gemini.assert_called_once_with('Send an email 1 day before the guest checks in')
+
+
+class CatalogMatchTests(TestCase):
+    """AI-suggested names resolve to the closest catalog entry, or to nothing."""
+
+    def setUp(self):
+        cache.clear()
+        trigger_matcher.invalidate()
+        action_matcher.invalidate()
+
+    def test_exact_name_scores_one(self):
+        match = trigger_matcher.match_many(['guest CHECKS in'])['guest CHECKS in']
+        self.assertEqual((match.name, match.score), ('Guest checks in', 1.0))
+
+    def test_near_misses_map_to_the_right_entry(self):
+        for name, expected in (
+            ('Guest chekcs in', 'Guest checks in'),
+            ('Guest check-in', 'Guest checks in'),
+            ('Booking cancelled', 'Booking canceled'),
+        ):
+            with self.subTest(name=name):
+                match = trigger_matcher.match_many([name])[name]
+                self.assertEqual(match.name, expected)
+                self.assertTrue(DEFAULT_MIN_SCORE <= match.score < 1.0)
+        self.assertEqual(action_matcher.match_many(['Send an e-mail'])['Send an e-mail'].name, 'Send Email')
+
+    def test_unrelated_names_stay_below_the_min_score(self):
+        matches = trigger_matcher.match_many(['Launch the rocket', 'Pay invoice'])
+        self.assertEqual(matches, {'Launch the rocket': None, 'Pay invoice': None})
+        with override_settings(AI_NAME_MATCH_MIN_SCORE=0):
+            # Something was closest, but it scored under the default cut-off.
+            self.assertLess(trigger_matcher.match_many(['Pay invoice'])['Pay invoice'].score, DEFAULT_MIN_SCORE)
+
+    def test_stream_resolves_each_chunk_of_suggestions_in_one_batch(self):
+        response = json.dumps({'suggested_workflows': [
+            {'trigger_name': 'Guest checks in', 'action_name': 'Send Email', 'rule_type': 'immediate'},
+            {'trigger_name': 'Guest chekcs out', 'action_name': 'Create Task', 'rule_type': 'immediate'},
+            {'trigger_name': 'Pay invoice', 'action_name': 'Send Email', 'rule_type': 'immediate'},
+        ]})
+        prompt_cache = PromptCache(LocMemPromptCacheBackend(ttl=60, max_entries=10), namespace='test')
+        prompt_cache.set('a prompt', response)
+
+        async def collect():
+            return [event async for event in views.stream_ai_suggestion_events('a prompt')]
+
+        with mock.patch.object(views, 'get_prompt_cache', return_value=prompt_cache), \
+                mock.patch.object(views, 'confident_local_suggestion', return_value=None), \
+                mock.patch.object(suggestions, 'resolve_catalog_names', wraps=suggestions.resolve_catalog_names) as resolve:
+            events = async_to_sync(collect)()
+        resolve.assert_called_once()
+        previews = [
+            json.loads(event.split('data: ', 1)[1]) for event in events if event.startswith('event: suggestion')
+        ]
+        self.assertEqual(
+            [preview['mapped_suggestion']['trigger_name'] for preview in previews],
+            ['Guest checks in', 'Guest checks out', None],
+        )
+
+
+class CatalogResponseTests(TestCase):
+    """/api/triggers/ and /api/actions/ revalidate by ETag and negotiate gzip by q-value."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_matching_if_none_match_gets_304(self):
+        response = self.client.get('/api/triggers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        not_modified = self.client.get('/api/triggers/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(not_modified.content, b'')
+
+        trigger = Trigger.objects.first()
+        trigger.description = 'Changed'
+        trigger.save()
+        changed = self.client.get('/api/triggers/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_gzip_is_negotiated_by_q_value(self):
+        plain = self.client.get('/api/actions/')
+        for accept_encoding, gzipped in (
+            ('gzip, deflate, br', True),
+            ('br;q=1.0, gzip;q=0.5', True),
+            ('br, *;q=0.1', True),
+            ('gzip;q=0', False),
+            ('gzip;q=0, *', False),
+            ('identity', False),
+            ('', False),
+        ):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self.client.get('/api/actions/', HTTP_ACCEPT_ENCODING=accept_encoding)
+                self.assertEqual(response.get('Content-Encoding') == 'gzip', gzipped)
+                body = gzip.decompress(response.content) if gzipped else response.content
+                self.assertEqual(json.loads(body), json.loads(plain.content))
+                self.assertEqual(response['ETag'] != plain['ETag'], gzipped)
+        self.assertFalse(accepts_encoding('gzip;q=abc', 'gzip'))
+
+    def test_rule_with_unknown_catalog_id_is_rejected(self):
+        response = self.client.post('/api/rules/', {
+            'name': 'Rule', 'trigger_id': 999999, 'action_id': Action.objects.first().id, 'rule_type': 'immediate',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('trigger_id', response.json())
+        self.assertFalse(WorkflowRule.objects.exists())
+
+
+class JobClaimTests(TestCase):
+    """Leased claims hand each job to one worker, and only the lease holder reports its outcome."""
+
+    def setUp(self):
+        executors.close_executors()
+        self.addCleanup(executors.close_executors)
+        self.rule = create_rule(rule_type='scheduled', delay_time=1, delay_unit='minutes')
+
+    def test_two_claims_never_return_the_same_job(self):
+        jobs = [create_job(self.rule) for _ in range(5)]
+        _, first = claim_jobs(3, 60)
+        _, second = claim_jobs(10, 60)
+        _, overlapping = claim_jobs(10, 60, ids=[job.id for job in jobs])
+        first_ids, second_ids = {job.id for job in first}, {job.id for job in second}
+        self.assertEqual((len(first_ids), len(second_ids)), (3, 2))
+        self.assertFalse(first_ids & second_ids)
+        self.assertEqual(first_ids | second_ids, {job.id for job in jobs})
+        self.assertEqual(overlapping, [])
+
+    def test_jobs_not_yet_due_are_not_claimed(self):
+        create_job(self.rule, due_at=timezone.now() + timedelta(minutes=5))
+        self.assertEqual(claim_jobs(10, 60)[1], [])
+
+    def test_outcome_of_a_reclaimed_lease_is_dropped(self):
+        job = create_job(self.rule)
+        stale_token, (stale_job,) = claim_jobs(1, 60)
+        # The first worker stalls past its lease and a second worker takes the job over.
+        ScheduledJob.objects.filter(id=job.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+        live_token, (live_job,) = claim_jobs(1, 60)
+        self.assertNotEqual(stale_token, live_token)
+        self.assertEqual(live_job.attempts, 2)
+
+        self.assertEqual(write_outcomes(run_jobs([(stale_job, stale_token)])), 0)
+        self.assertTrue(ScheduledJob.objects.filter(id=job.id).exists())
+        self.assertEqual(WorkflowExecutionLog.objects.get(id=job.execution_log_id).status, 'SIMULATED_SCHEDULED')
+        self.assertFalse(ExecutionDailyStat.objects.filter(status='EXECUTED').exists())
+
+        self.assertEqual(write_outcomes(run_jobs([(live_job, live_token)])), 1)
+        self.assertEqual(WorkflowExecutionLog.objects.get(id=job.execution_log_id).status, 'EXECUTED')
+
+    def test_finished_jobs_are_deleted_and_counted_once(self):
+        scheduled = create_job(self.rule)
+        lease_token, jobs = claim_jobs(10, 60)
+        outcomes = run_jobs([(job, lease_token) for job in jobs])
+        self.assertEqual(write_outcomes(outcomes), 1)
+        self.assertFalse(ScheduledJob.objects.exists())
+        log = WorkflowExecutionLog.objects.get(id=scheduled.execution_log_id)
+        self.assertEqual(log.status, 'EXECUTED')
+        self.assertIsNotNone(log.actual_execution_time)
+        self.assertEqual(ExecutionDailyStat.objects.get(status='EXECUTED').count, 1)
+        # Writing the same outcomes again finds no job holding their lease.
+        self.assertEqual(write_outcomes(outcomes), 0)
+        self.assertEqual(ExecutionDailyStat.objects.get(status='EXECUTED').count, 1)
+
+    def test_outcome_without_status_change_is_not_counted(self):
+        message = create_job(create_rule('Immediate'), queue_model=OutboxMessage)
+        lease_token, jobs = claim_jobs(10, 60, queue_model=OutboxMessage)
+        self.assertEqual(write_outcomes(run_jobs([(job, lease_token) for job in jobs]), OutboxMessage), 1)
+        self.assertFalse(OutboxMessage.objects.exists())
+        log = WorkflowExecutionLog.objects.get(id=message.execution_log_id)
+        self.assertEqual(log.status, 'SIMULATED_IMMEDIATE')
+        self.assertIn('outbox dispatcher', log.details)
+        self.assertFalse(ExecutionDailyStat.objects.exists())
+
+
+class SchedulerPrefetchTests(TestCase):
+    """After the first read, run_scheduler's prefetch only reads jobs that changed."""
+
+    def setUp(self):
+        self.rule = create_rule(rule_type='scheduled', delay_time=1, delay_unit='minutes')
+        self.scheduler = RunSchedulerCommand()
+        self.scheduler.window = 60
+        self.scheduler.max_prefetch = 100
+        self.scheduler.prefetch_overlap = 0
+        self.scheduler.reset_prefetch()
+
+    def in_seconds(self, seconds):
+        return timezone.now() + timedelta(seconds=seconds)
+
+    def test_incremental_reads(self):
+        soon = create_job(self.rule, due_at=self.in_seconds(10))
+        create_job(self.rule, due_at=self.in_seconds(20))
+        later = create_job(self.rule, due_at=self.in_seconds(120))
+        leased = create_job(self.rule, due_at=self.in_seconds(5))
+        ScheduledJob.objects.filter(id=leased.id).update(lease_token='other', lease_expires_at=self.in_seconds(300))
+
+        self.assertEqual(self.scheduler.prefetch(), 2)
+        self.assertEqual(self.scheduler.prefetch(), 0)
+
+        created = create_job(self.rule, due_at=self.in_seconds(5))
+        self.assertEqual(self.scheduler.prefetch(), 1)
+
+        # Rescheduled (a retry): the old heap entry is superseded.
+        ScheduledJob.objects.filter(id=soon.id).update(due_at=self.in_seconds(40), updated_at=timezone.now())
+        self.assertEqual(self.scheduler.prefetch(), 1)
+        self.assertEqual(self.scheduler.queued[soon.id], ScheduledJob.objects.get(id=soon.id).due_at.timestamp())
+
+        # The other worker's lease lapses.
+        ScheduledJob.objects.filter(id=leased.id).update(lease_expires_at=timezone.now())
+        self.assertEqual(self.scheduler.prefetch(), 1)
+
+        # The window moves forward over a job that was beyond it.
+        self.scheduler.window = 180
+        self.assertEqual(self.scheduler.prefetch(), 1)
+        self.assertEqual(set(self.scheduler.queued), {soon.id, soon.id + 1, later.id, leased.id, created.id})
+        self.assertEqual(len(self.scheduler.heap), 6)
+
+    def test_max_prefetch_defers_the_rest(self):
+        jobs = [create_job(self.rule, due_at=self.in_seconds(10 + index)) for index in range(3)]
+        self.scheduler.max_prefetch = 2
+        self.assertEqual(self.scheduler.prefetch(), 2)
+        self.assertEqual(self.scheduler.prefetch(), 0)
+        del self.scheduler.queued[jobs[0].id]
+        self.assertEqual(self.scheduler.prefetch(), 1)
+        self.assertIn(jobs[2].id, self.scheduler.queued)
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0})
+class SchedulerDaemonTests(TransactionTestCase):
+    """run_scheduler --run-for fires jobs at their due time and recovers a dead daemon's jobs."""
+    serialized_rollback = True
+
+    def setUp(self):
+        executors.close_executors()
+        self.addCleanup(executors.close_executors)
+        self.rule = create_rule(rule_type='scheduled', delay_time=1, delay_unit='minutes')
+
+    def test_fires_due_jobs_and_recovers_expired_leases(self):
+        now = timezone.now()
+        # Claimed by a daemon that died: its lease has expired.
+        orphaned = create_job(self.rule, due_at=now - timedelta(minutes=1))
+        ScheduledJob.objects.filter(id=orphaned.id).update(
+            lease_token='dead', lease_expires_at=now - timedelta(seconds=1), attempts=1
+        )
+        # Held by a live daemon.
+        held = create_job(self.rule, due_at=now - timedelta(minutes=1))
+        ScheduledJob.objects.filter(id=held.id).update(lease_token='live', lease_expires_at=now + timedelta(minutes=5))
+        due_soon = create_job(self.rule, due_at=now + timedelta(seconds=0.7))
+        not_yet = create_job(self.rule, due_at=now + timedelta(seconds=30))
+
+        with mock.patch('workflow.management.commands.run_scheduler.signal.signal'):
+            call_command('run_scheduler', '--run-for', '2', '--poll-interval', '0.2', stdout=io.StringIO())
+
+        self.assertEqual(set(ScheduledJob.objects.values_list('id', flat=True)), {held.id, not_yet.id})
+        for job in (orphaned, due_soon):
+            log = WorkflowExecutionLog.objects.get(id=job.execution_log_id)
+            self.assertEqual(log.status, 'EXECUTED')
+        log = WorkflowExecutionLog.objects.get(id=due_soon.execution_log_id)
+        self.assertGreaterEqual(log.actual_execution_time, due_soon.due_at)
+        self.assertLess(log.actual_execution_time, due_soon.due_at + timedelta(seconds=1))
+
+
+class OutcomeRecorder:
+    """Stands in for LogStatusWriter."""
+
+    def __init__(self):
+        self.outcomes = []
+        self._lock = threading.Lock()
+
+    def submit(self, outcome):
+        with self._lock:
+            self.outcomes.append(outcome)
+
+
+def pool_job(job_id, action_name='Send Email', rule_id=1, due_at=None):
+    log = SimpleNamespace(action_name_snapshot=action_name, workflow_rule_id=rule_id)
+    return SimpleNamespace(id=job_id, execution_log=log, due_at=due_at or timezone.now())
+
+
+class FakeActionRunner:
+    """
+    Replaces jobs.run_jobs in the worker pool: records how many sends of each
+    action type are in flight, and blocks each send until `gate` is set.
+    """
+
+    def __init__(self, duration=0.0, status='EXECUTED'):
+        self.duration = duration
+        self.status = status
+        self.gate = threading.Event()
+        self.gate.set()
+        self.in_flight = Counter()
+        self.max_in_flight = Counter()
+        self.finished_at = {}
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def __call__(self, items):
+        action_name = items[0][0].execution_log.action_name_snapshot
+        with self._lock:
+            self.batches.append([job.id for job, lease_token in items])
+            self.in_flight[action_name] += 1
+            self.max_in_flight[action_name] = max(self.max_in_flight[action_name], self.in_flight[action_name])
+        self.gate.wait()
+        time.sleep(self.duration)
+        with self._lock:
+            self.in_flight[action_name] -= 1
+            self.finished_at[action_name] = time.monotonic()
+        return [
+            JobOutcome(job.id, lease_token, job.execution_log, self.status, timezone.now(), '')
+            for job, lease_token in items
+        ]
+
+
+class WorkerPoolTestCase(SimpleTestCase):
+    duration = 0.0
+
+    def setUp(self):
+        self.runner = FakeActionRunner(duration=self.duration)
+        self.writer = OutcomeRecorder()
+        for name, value in (('run_jobs', self.runner), ('batch_size_for', lambda action_name: 1)):
+            patcher = mock.patch.object(workers, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_pool(self, **kwargs):
+        pool = ActionWorkerPool(self.writer, **kwargs)
+        self.addCleanup(pool.shutdown)
+        return pool
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0})
+class WorkerPoolConcurrencyTests(WorkerPoolTestCase):
+    """ActionWorkerPool caps sends per action type without holding up other types."""
+    duration = 0.05
+
+    def test_limited_type_never_runs_twice_while_others_proceed(self):
+        pool = self.make_pool(max_workers=8, action_limits={'default': 4, 'Send Slack Notification': 1})
+        for job_id in range(4):
+            pool.submit(pool_job(job_id, 'Send Slack Notification'), 'lease')
+        for job_id in range(4, 12):
+            pool.submit(pool_job(job_id, 'Send Email'), 'lease')
+        self.assertTrue(pool.wait_idle(timeout=5))
+        self.assertEqual(self.runner.max_in_flight['Send Slack Notification'], 1)
+        self.assertEqual(self.runner.max_in_flight['Send Email'], 4)
+        # Eight emails at four at a time finish before four serialized Slack sends.
+        self.assertLess(self.runner.finished_at['Send Email'], self.runner.finished_at['Send Slack Notification'])
+        self.assertEqual(len(self.writer.outcomes), 12)
+
+    def test_shutdown_drains_every_job(self):
+        pool = self.make_pool(max_workers=2)
+        for job_id in range(10):
+            pool.submit(pool_job(job_id, 'Create Task'), 'lease')
+        pool.shutdown()
+        self.assertEqual(pool.outstanding, 0)
+        self.assertEqual(sorted(outcome.job_id for outcome in self.writer.outcomes), list(range(10)))
+        with self.assertRaises(RuntimeError):
+            pool.submit(pool_job(10), 'lease')
+
+    def test_wait_until_below_and_wait_idle(self):
+        self.runner.gate.clear()
+        pool = self.make_pool(max_workers=4)
+        for job_id in range(3):
+            pool.submit(pool_job(job_id, 'Create Task'), 'lease')
+        self.assertFalse(pool.wait_until_below(3, timeout=0.05))
+        self.assertTrue(pool.wait_until_below(4, timeout=0))
+        self.assertFalse(pool.wait_idle(timeout=0.05))
+        self.runner.gate.set()
+        self.assertTrue(pool.wait_idle(timeout=5))
+        self.assertTrue(pool.wait_until_below(1, timeout=0))
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0})
+class WorkerPoolStatsTests(WorkerPoolTestCase):
+    duration = 0.02
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual([percentile(values, q) for q in (0, 0.5, 0.95, 0.99, 1)], [1, 51, 96, 100, 100])
+        self.assertEqual(percentile([7], 0.99), 7)
+        self.assertIsNone(percentile([], 0.5))
+
+    def test_stats_report_latency_throughput_and_errors(self):
+        pool = self.make_pool(max_workers=4)
+        pool.started_at -= 2
+        self.runner.status = 'EXECUTION_ERROR'
+        pool.submit(pool_job(0, due_at=timezone.now() - timedelta(seconds=3)), 'lease')
+        self.assertTrue(pool.wait_idle(timeout=5))
+        self.runner.status = 'EXECUTED'
+        for job_id in range(1, 4):
+            pool.submit(pool_job(job_id, due_at=timezone.now() - timedelta(seconds=3)), 'lease')
+        self.assertTrue(pool.wait_idle(timeout=5))
+
+        stats = pool.stats(reset=True)
+        self.assertEqual((stats['completed'], stats['errors'], stats['coalesced']), (4, 1, 0))
+        self.assertTrue(1.5 < 4 / stats['jobs_per_second'] < 2.5)
+        self.assertGreaterEqual(stats['execution_ms']['p50'], 20)
+        self.assertLess(stats['execution_ms']['p99'], 1000)
+        self.assertTrue(3000 <= stats['latency_ms']['p50'] <= stats['latency_ms']['p99'] < 4000)
+
+        after_reset = pool.stats()
+        self.assertEqual(after_reset['completed'], 0)
+        self.assertIsNone(after_reset['latency_ms']['p50'])
+
+
+class RetryDelayTests(SimpleTestCase):
+    POLICY = {'MAX_ATTEMPTS': 5, 'BASE_DELAY_SECONDS': 30, 'MAX_DELAY_SECONDS': 600}
+
+    def delays(self, attempts, pick):
+        with mock.patch('workflow.jobs.random.uniform', side_effect=pick):
+            return [retry_delay(attempt, self.POLICY) for attempt in attempts]
+
+    def test_backoff_doubles_up_to_the_cap_with_equal_jitter(self):
+        attempts = [1, 2, 3, 4, 5, 6, 10]
+        # The ceiling doubles per attempt until MAX_DELAY_SECONDS; the jitter spans its upper half.
+        self.assertEqual(self.delays(attempts, lambda low, high: high), [30, 60, 120, 240, 480, 600, 600])
+        self.assertEqual(self.delays(attempts, lambda low, high: low), [15, 30, 60, 120, 240, 300, 300])
+
+
+@override_settings(SCHEDULER_RETRY={'MAX_ATTEMPTS': 3, 'BASE_DELAY_SECONDS': 30, 'MAX_DELAY_SECONDS': 3600})
+class RetryTests(TestCase):
+    """Failed jobs back off and retry, are dead-lettered after MAX_ATTEMPTS, and can be requeued or purged."""
+
+    def setUp(self):
+        executors.close_executors()
+        self.addCleanup(executors.close_executors)
+        self.registry = executors.get_registry()
+        self.rule = create_rule(rule_type='scheduled', delay_time=1, delay_unit='minutes')
+
+    def fail_sends(self, error):
+        self.registry.http.error = self.registry.email.error = error
+
+    def run_once(self, job):
+        # Time passes until the job is due again.
+        ScheduledJob.objects.filter(id=job.id).update(due_at=timezone.now())
+        lease_token, claimed = claim_jobs(10, 60)
+        self.assertEqual([claimed_job.id for claimed_job in claimed], [job.id])
+        return write_outcomes(run_jobs([(claimed_job, lease_token) for claimed_job in claimed]))
+
+    def test_failing_job_retries_then_dead_letters_then_requeues(self):
+        self.fail_sends(ConnectionError('provider down'))
+        job = create_job(self.rule)
+        for attempt in (1, 2):
+            before = timezone.now()
+            self.run_once(job)
+            job.refresh_from_db()
+            self.assertEqual(job.attempts, attempt)
+            self.assertIsNone(job.lease_token)
+            self.assertIsNone(job.lease_expires_at)
+            ceiling = 30 * 2 ** (attempt - 1)
+            self.assertTrue(
+                before + timedelta(seconds=ceiling / 2) <= job.due_at <= timezone.now() + timedelta(seconds=ceiling)
+            )
+            log = WorkflowExecutionLog.objects.get(id=job.execution_log_id)
+            self.assertEqual(log.status, 'SIMULATED_SCHEDULED')
+            self.assertEqual(log.scheduled_execution_time, job.due_at)
+            self.assertIn(f'Attempt {attempt} failed', log.details)
+        self.assertFalse(ExecutionDailyStat.objects.exists())
+
+        with self.assertLogs('workflow.jobs', 'ERROR'):
+            self.run_once(job)
+        self.assertFalse(ScheduledJob.objects.exists())
+        log = WorkflowExecutionLog.objects.get(id=job.execution_log_id)
+        self.assertEqual(log.status, 'DEAD_LETTERED')
+        self.assertIn('Failed after 3 attempt(s)', log.details)
+        self.assertEqual(ExecutionDailyStat.objects.get(status='DEAD_LETTERED').count, 1)
+
+        call_command('requeue_dead_letters', '--spread-seconds', '0', stdout=io.StringIO())
+        requeued = ScheduledJob.objects.get(execution_log_id=log.id)
+        self.assertEqual(requeued.attempts, 0)
+        log.refresh_from_db()
+        self.assertEqual(log.status, 'SIMULATED_SCHEDULED')
+        self.assertEqual(log.scheduled_execution_time, requeued.due_at)
+
+        self.fail_sends(None)
+        self.run_once(requeued)
+        log.refresh_from_db()
+        self.assertEqual(log.status, 'EXECUTED')
+        self.assertFalse(ScheduledJob.objects.exists())
+
+    def test_permanent_error_fails_at_once(self):
+        self.fail_sends(executors.PermanentActionError('address rejected'))
+        job = create_job(self.rule)
+        with self.assertLogs('workflow.jobs', 'ERROR'):
+            self.run_once(job)
+        self.assertFalse(ScheduledJob.objects.exists())
+        log = WorkflowExecutionLog.objects.get(id=job.execution_log_id)
+        self.assertEqual(log.status, 'EXECUTION_ERROR')
+        self.assertIn('address rejected', log.details)
+        self.assertEqual(ExecutionDailyStat.objects.get(status='EXECUTION_ERROR').count, 1)
+
+    def test_purged_dead_letters_are_not_requeued(self):
+        purged = create_log(self.rule, status='DEAD_LETTERED', details='Failed after 3 attempt(s)')
+        other_rule = create_rule('Other', rule_type='scheduled', delay_time=1, delay_unit='minutes')
+        kept = create_log(other_rule, status='DEAD_LETTERED', scheduled_execution_time=timezone.now())
+
+        call_command('purge_dead_letters', '--rule', str(self.rule.id), stdout=io.StringIO())
+        purged.refresh_from_db()
+        self.assertEqual(purged.status, 'EXECUTION_ERROR')
+        self.assertTrue(purged.details.startswith('Dead letter purged'))
+        self.assertEqual(ExecutionDailyStat.objects.get(status='EXECUTION_ERROR').count, 1)
+
+        call_command('requeue_dead_letters', stdout=io.StringIO())
+        self.assertEqual(list(ScheduledJob.objects.values_list('execution_log_id', flat=True)), [kept.id])
+        self.assertFalse(OutboxMessage.objects.exists())
+
+
+class OutboxTransactionTests(TestCase):
+    """simulate-trigger writes each immediate log and its OutboxMessage in one transaction."""
+
+    def setUp(self):
+        cache.clear()
+        routing_table.invalidate()
+        self.rule = create_rule('Immediate')
+
+    def simulate(self):
+        return self.client.post(
+            '/api/rules/simulate-trigger/', {'trigger_id': self.rule.trigger_id}, content_type='application/json'
+        )
+
+    def test_log_and_message_are_written_together(self):
+        self.assertEqual(self.simulate().status_code, 200)
+        log = WorkflowExecutionLog.objects.get()
+        self.assertEqual(log.status, 'SIMULATED_IMMEDIATE')
+        self.assertEqual(OutboxMessage.objects.get().execution_log_id, log.id)
+
+    def test_failed_enqueue_rolls_back_the_log(self):
+        with mock.patch('workflow.fanout.enqueue_immediate_logs', side_effect=DatabaseError('outbox unavailable')):
+            data = self.simulate().json()
+        self.assertEqual(data['simulated_logs_created'], [])
+        self.assertEqual([error['status'] for error in data['simulation_errors']], ['SIMULATION_ERROR'])
+        self.assertFalse(WorkflowExecutionLog.objects.exists())
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertFalse(ExecutionDailyStat.objects.exists())
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0})
+class DispatchOutboxTests(TransactionTestCase):
+    serialized_rollback = True
+
+    def setUp(self):
+        cache.clear()
+        routing_table.invalidate()
+        executors.close_executors()
+        self.addCleanup(executors.close_executors)
+        self.rule = create_rule('Immediate')
+
+    def test_drain_sends_and_deletes_messages(self):
+        for _ in range(3):
+            self.client.post(
+                '/api/rules/simulate-trigger/', {'trigger_id': self.rule.trigger_id}, content_type='application/json'
+            )
+        self.assertEqual(OutboxMessage.objects.count(), 3)
+        # The command closes the registry when it exits; keep hold of its fake transports.
+        registry = executors.get_registry()
+
+        with mock.patch('workflow.management.commands.dispatch_outbox.signal.signal'):
+            call_command('dispatch_outbox', '--drain', '--poll-interval', '0.05', stdout=io.StringIO())
+
+        self.assertFalse(OutboxMessage.objects.exists())
+        self.assertEqual(registry.http.send_count + registry.email.send_count, 3)
+        for log in WorkflowExecutionLog.objects.all():
+            self.assertEqual(log.status, 'SIMULATED_IMMEDIATE')
+            self.assertIsNotNone(log.actual_execution_time)
+            self.assertIn('outbox dispatcher', log.details)
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0, 'Send Slack Notification': 0.2, 'Send Email': 60})
+class CoalescingWindowTests(WorkerPoolTestCase):
+    """Repeated executions of a rule: the first goes out at once, duplicates are held and sent together."""
+
+    def test_duplicates_are_held_then_sent_as_one_unit(self):
+        pool = self.make_pool(max_workers=4)
+        for job_id in range(4):
+            pool.submit(pool_job(job_id, 'Send Slack Notification', rule_id=1), 'lease')
+        pool.submit(pool_job(4, 'Send Slack Notification', rule_id=2), 'lease')
+        # Held jobs do not count as queued work.
+        self.assertTrue(pool.wait_until_below(1, timeout=0.15))
+        self.assertEqual(sorted(self.runner.batches), [[0], [4]])
+        self.assertEqual(pool.outstanding, 3)
+
+        self.assertTrue(pool.wait_idle(timeout=5))
+        self.assertEqual(sorted(self.runner.batches), [[0], [1, 2, 3], [4]])
+        self.assertEqual(pool.coalesced, 3)
+        self.assertEqual(len(self.writer.outcomes), 5)
+
+    def test_shutdown_flushes_open_windows(self):
+        pool = self.make_pool(max_workers=4)
+        for job_id in range(3):
+            pool.submit(pool_job(job_id, 'Send Email', rule_id=1), 'lease')
+        started = time.monotonic()
+        pool.shutdown()
+        self.assertLess(time.monotonic() - started, 5)
+        self.assertEqual(self.runner.batches, [[0], [1, 2]])
+        self.assertEqual(sorted(outcome.job_id for outcome in self.writer.outcomes), [0, 1, 2])
+
+
+@override_settings(ACTION_COALESCE_WINDOWS={'default': 0, 'Send Slack Notification': 0.2})
+class CoalescedSendTests(TestCase):
+    """Coalesced executions reach the provider as one message carrying the count."""
+    executions = 4
+
+    def setUp(self):
+        executors.close_executors()
+        self.addCleanup(executors.close_executors)
+        self.registry = executors.get_registry()
+        rule = WorkflowRule.objects.create(
+            name='Noisy', trigger=Trigger.objects.first(), action=Action.objects.get(name='Send Slack Notification'),
+        )
+        for _ in range(self.executions):
+            create_job(rule, queue_model=OutboxMessage)
+        self.lease_token, self.jobs = claim_jobs(self.executions, 60, queue_model=OutboxMessage)
+        self.text = f"workflow rule 'Noisy' ran 'Send Slack Notification'."
+
+    def sent_texts(self):
+        return [payload['text'] for destination, payload in self.registry.http.sent]
+
+    def test_one_batch_of_a_rule_is_one_send(self):
+        outcomes = run_jobs([(job, self.lease_token) for job in self.jobs])
+        self.assertEqual(len(outcomes), self.executions)
+        self.assertEqual(len(self.sent_texts()), 1)
+        self.assertTrue(self.sent_texts()[0].endswith(f"{self.text} (x{self.executions})"))
+        for outcome in outcomes:
+            self.assertIn(f"Sent as one message for {self.executions} executions", outcome.details)
+
+    def test_pool_window_sends_the_first_then_the_rest_together(self):
+        writer = OutcomeRecorder()
+        pool = ActionWorkerPool(writer, max_workers=4)
+        for job in self.jobs:
+            pool.submit(job, self.lease_token)
+        pool.shutdown()
+        self.assertEqual(len(writer.outcomes), self.executions)
+        self.assertEqual(pool.coalesced, self.executions - 1)
+        first, rest = self.sent_texts()
+        self.assertTrue(first.endswith(self.text))
+        self.assertTrue(rest.endswith(f"{self.text} (x{self.executions - 1})"))
+
+
+class TokenBucketTests(SimpleTestCase):
+    def test_burst_then_rate(self):
+        clock = [100.0]
+        with mock.patch('workflow.throttle.time.monotonic', lambda: clock[0]), \
+                mock.patch('workflow.throttle.time.sleep') as sleep:
+            bucket = TokenBucket(rate=2, burst=3)
+            # A full bucket allows a burst of three sends without waiting.
+            self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+            # Then callers queue behind each other at two tokens a second.
+            self.assertEqual([bucket.acquire() for _ in range(2)], [0.5, 1.0])
+            self.assertEqual([call.args[0] for call in sleep.call_args_list], [0.5, 1.0])
+            self.assertEqual(bucket.waited, 1.5)
+            # Idle time refills the bucket, but never beyond the burst size.
+            clock[0] += 10
+            self.assertEqual([bucket.acquire() for _ in range(3)], [0.0, 0.0, 0.0])
+            self.assertEqual(bucket.acquire(), 0.5)
+        self.assertEqual(TokenBucket(rate=1, burst=0).capacity, 1.0)
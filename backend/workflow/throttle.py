@@ -0,0 +1,91 @@
+"""
+Rate limits and coalescing windows for action executors.
+
+Rate limits are token buckets, one per action type and destination (a Slack
+webhook, the push API, the SMTP recipients...). Every send takes one token.
+A send that finds the bucket empty waits for the next token, so a burst is
+smoothed to the provider's rate instead of being rejected by it. The
+buckets are process-local: with several scheduler processes, each gets the
+full rate.
+
+Coalescing windows (used by workflow.workers) merge repeated executions of
+the same rule. The first execution goes out at once and opens a window;
+duplicates that arrive while it is open are held and then sent once, with a
+count, when it closes.
+
+Configured by these settings:
+    ACTION_RATE_LIMITS       {"default" or action name: {"RATE": tokens/second, "BURST": bucket size}}
+    ACTION_COALESCE_WINDOWS  {"default" or action name: seconds}; 0 turns coalescing off
+"""
+import threading
+import time
+
+from django.conf import settings
+
+DEFAULT_RATE_LIMIT = {'RATE': 20.0, 'BURST': 40}
+DEFAULT_COALESCE_WINDOW = 0
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.waited = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available. Returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            # Reserving the token before sleeping queues concurrent callers fairly.
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+            self.waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+def _per_action(setting_name, action_name, default):
+    config = getattr(settings, setting_name, {})
+    return config.get(action_name, config.get('default', default))
+
+
+class RateLimiter:
+    """The process-wide token buckets, created on first use per (action, destination)."""
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, action_name, destination):
+        key = (action_name, destination)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            with self._lock:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    limit = {**DEFAULT_RATE_LIMIT, **_per_action('ACTION_RATE_LIMITS', action_name, {})}
+                    bucket = TokenBucket(limit['RATE'], limit['BURST'])
+                    self._buckets[key] = bucket
+        return bucket
+
+    def acquire(self, action_name, destination):
+        return self.bucket(action_name, destination).acquire()
+
+    def stats(self):
+        """Seconds spent waiting for tokens, per action and destination."""
+        with self._lock:
+            return {f"{action} -> {destination}": round(bucket.waited, 3) for (action, destination), bucket in self._buckets.items()}
+
+
+rate_limiter = RateLimiter()
+
+
+def coalesce_window_for(action_name):
+    """Seconds during which repeated executions of one rule are merged; 0 turns merging off."""
+    return float(_per_action('ACTION_COALESCE_WINDOWS', action_name, DEFAULT_COALESCE_WINDOW) or 0)
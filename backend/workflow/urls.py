@@ -5,7 +5,12 @@ from .views import (
     ActionViewSet, 
     WorkflowRuleViewSet, 
     WorkflowExecutionLogViewSet,
-    run_scheduled_tasks_view
+    ArchivedExecutionLogViewSet,
+    StatsViewSet,
+    EventIngestViewSet,
+    run_scheduled_tasks_view,
+    generate_from_ai_async,
+    generate_from_ai_batch,
 )
 
 # Create a router and register our viewsets with it.
@@ -14,9 +19,15 @@ router.register(r'triggers', TriggerViewSet, basename='trigger')
 router.register(r'actions', ActionViewSet, basename='action')
 router.register(r'rules', WorkflowRuleViewSet, basename='workflowrule')
 router.register(r'workflow-logs', WorkflowExecutionLogViewSet, basename='workflowexecutionlog')
+router.register(r'workflow-logs-archive', ArchivedExecutionLogViewSet, basename='archivedexecutionlog')
+router.register(r'stats', StatsViewSet, basename='stats')
+router.register(r'events', EventIngestViewSet, basename='event')
 
 # The API URLs are now determined automatically by the router.
 urlpatterns = [
+    # Listed before the router so they are not taken for a rule detail URL (rules/<pk>/).
+    path('rules/generate-from-ai-async/', generate_from_ai_async, name='generate-from-ai-async'),
+    path('rules/generate-from-ai-batch/', generate_from_ai_batch, name='generate-from-ai-batch'),
     path('', include(router.urls)),
     # URL for Cloud Scheduler to call
     path('tasks/process-scheduled/', run_scheduled_tasks_view, name='process-scheduled-tasks'),
@@ -0,0 +1,49 @@
+"""
+Per-table version counters kept in the Django cache backend.
+
+Every write to a tracked model bumps its counter (via the signal receivers in
+`workflow.signals`, or explicitly after bulk operations that bypass signals).
+Readers compare versions to decide whether derived data -- ETags, in-process
+caches -- is still current without touching the database. With the default
+local-memory cache the counters are per process; configure a shared cache
+(e.g. Redis or the database cache) to share them across workers.
+"""
+from django.core.cache import cache
+
+VERSION_KEY_PREFIX = 'workflow:table-version:'
+
+
+def _version_key(model):
+    return f"{VERSION_KEY_PREFIX}{model._meta.label_lower}"
+
+
+def get_table_version(model):
+    key = _version_key(model)
+    version = cache.get(key)
+    if version is None:
+        # add() is a no-op if another worker initialised the counter first.
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def get_table_versions(models):
+    """The versions of several models, in order, in one cache round-trip when all are set."""
+    keys = [_version_key(model) for model in models]
+    found = cache.get_many(keys)
+    return tuple(
+        found[key] if key in found else get_table_version(model)
+        for key, model in zip(keys, models)
+    )
+
+
+def bump_table_version(model):
+    key = _version_key(model)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # Counter missing (first write, or evicted): start past the default of 1
+        # so readers that cached version 1 see a change.
+        if cache.add(key, 2, timeout=None):
+            return 2
+        return cache.incr(key)
@@ -1,164 +1,133 @@
 from django.shortcuts import render
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
-from .models import Trigger, Action, WorkflowRule, WorkflowExecutionLog
-from .serializers import TriggerSerializer, ActionSerializer, WorkflowRuleSerializer, WorkflowExecutionLogSerializer
+from .models import Trigger, Action, WorkflowRule, WorkflowExecutionLog, ExecutionDailyStat, ArchivedExecutionLog
+from .serializers import (
+    TriggerSerializer, ActionSerializer, WorkflowRuleSerializer, WorkflowExecutionLogSerializer,
+    ArchivedExecutionLogSerializer,
+)
+from .parsers import NDJSONParser
+from .pagination import LogKeysetPagination, decode_position, encode_position
+from .etags import CatalogResponseMixin, ConditionalETagMixin
+from .catalog import action_catalog, trigger_catalog
+from .versioning import get_table_version
+from .fanout import build_execution_logs, create_execution_logs, stale_rule_error
+from .routing import routing_table
 import json
+import time
 from django.conf import settings # To access settings like API keys, if needed here
 from .gemini import get_ai_suggestions_for_prompt # Import the new function
+from .gemini import AIServiceUnavailable, AIUpstreamTimeout, aiter_ai_response_chunks, get_ai_suggestions_for_prompt_async
+from .ai_stream import SuggestedWorkflowsStreamParser
+from .ai_cache import get_prompt_cache
+from .ai_batch import generate_suggestions_batch
+from .local_suggest import confident_local_suggestion, local_fallback
+from .suggestions import build_suggestions_payload, map_ai_suggestions, suggestions_message
 # import google.generativeai as genai # Import your Gemini SDK
 # from django.conf import settings # To access settings like API keys
 # We will need OpenAI or Gemini client later
 # import openai 
+from django.db.models import Count, ExpressionWrapper, F, IntegerField, Max, Q, Sum
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import timedelta
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
 from django.core.management import call_command
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
-class TriggerViewSet(viewsets.ReadOnlyModelViewSet):
+class TriggerViewSet(CatalogResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows triggers to be viewed.
     """
     queryset = Trigger.objects.all().order_by('name')
     serializer_class = TriggerSerializer
+    catalog = trigger_catalog
 
-class ActionViewSet(viewsets.ReadOnlyModelViewSet):
+class ActionViewSet(CatalogResponseMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows actions to be viewed.
     """
     queryset = Action.objects.all().order_by('name')
     serializer_class = ActionSerializer
+    catalog = action_catalog
 
-class WorkflowRuleViewSet(viewsets.ModelViewSet):
+class WorkflowRuleViewSet(ConditionalETagMixin, viewsets.ModelViewSet):
     """
     API endpoint that allows workflow rules to be viewed or edited.
     """
     queryset = WorkflowRule.objects.all()
     serializer_class = WorkflowRuleSerializer
 
+    def get_etag_components(self):
+        # Rules embed their trigger/action and an execution_count, so the tag also
+        # depends on those tables; the newest log updated_at is an index seek.
+        rule_state = WorkflowRule.objects.aggregate(
+            count=Count('id'), last_updated=Max('updated_at')
+        )
+        last_log_update = (
+            WorkflowExecutionLog.objects.order_by('-updated_at')
+            .values_list('updated_at', flat=True).first()
+        )
+        return (
+            get_table_version(WorkflowRule),
+            get_table_version(Trigger),
+            get_table_version(Action),
+            get_table_version(WorkflowExecutionLog),
+            rule_state['count'],
+            rule_state['last_updated'],
+            last_log_update,
+        )
+
+    def get_queryset(self):
+        # One query for the whole list: trigger/action are joined in and the
+        # execution count is aggregated instead of counted per rule.
+        return WorkflowRule.objects.select_related('trigger', 'action').annotate(
+            execution_count=ExpressionWrapper(
+                Count(
+                    'execution_logs',
+                    filter=Q(execution_logs__status__in=WorkflowExecutionLog.EXECUTED_STATUSES),
+                ) + F('archived_execution_count'),
+                output_field=IntegerField(),
+            )
+        )
+
     @action(detail=False, methods=['post'], url_path='generate-from-ai')
     def generate_from_ai(self, request):
         prompt_text = request.data.get('prompt')
         if not prompt_text:
             return Response({"error": "No prompt provided"}, status=status.HTTP_400_BAD_REQUEST)
 
-        preview_suggestions_for_frontend = []
-        # ai_suggestions_list = [] # This will be populated from the AI call
-        ai_global_errors = [] # To store errors reported by AI for the whole prompt
-
         try:
-            ai_response_json_str = get_ai_suggestions_for_prompt(prompt_text)
+            # Simple prompts are answered offline; Gemini is only asked when the
+            # local engine is not confident enough.
+            ai_response_json_str = confident_local_suggestion(prompt_text)
+            if ai_response_json_str is not None:
+                headers = {"X-AI-Source": "local"}
+            else:
+                # Repeat (or trivially different) prompts are answered from the cache.
+                ai_response_json_str, cache_hit = get_prompt_cache().get_or_generate(
+                    prompt_text, get_ai_suggestions_for_prompt
+                )
+                headers = {"X-AI-Source": "gemini", "X-AI-Cache": "HIT" if cache_hit else "MISS"}
+                if ai_response_json_str is None:
+                    # Gemini unavailable: a low-confidence local suggestion beats an error.
+                    ai_response_json_str = local_fallback(prompt_text)
+                    if ai_response_json_str is not None:
+                        headers["X-AI-Source"] = "local-fallback"
+            payload, http_status = build_suggestions_payload(ai_response_json_str)
+            return Response(payload, status=http_status, headers=headers)
 
+        except AIUpstreamTimeout as e:
+            ai_response_json_str = local_fallback(prompt_text)
             if ai_response_json_str is None:
-                return Response({"error": "AI service failed to generate suggestions. Check server logs."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            try:
-                ai_data = json.loads(ai_response_json_str)
-            except json.JSONDecodeError as je:
-                print(f"Error: AI response was not valid JSON: {je}")
-                print(f"AI Response String: {ai_response_json_str}")
-                return Response({"error": "AI response was not in the expected JSON format."},
-                                status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            raw_ai_suggestions = ai_data.get("suggested_workflows", [])
-            ai_global_errors = ai_data.get("errors", []) # Capture global errors if AI returns them
-
-            if not raw_ai_suggestions and not ai_global_errors:
-                return Response({
-                    "preview_workflows": [],
-                    "ai_reported_errors": [],
-                    "message": "AI could not suggest any workflows or the prompt was too vague."
-                }, status=status.HTTP_200_OK)
-
-            for raw_suggestion in raw_ai_suggestions:
-                mapped_suggestion_data = {
-                    'workflow_name': raw_suggestion.get('workflow_name', 'AI Suggested Workflow'),
-                    'workflow_description': raw_suggestion.get('workflow_description', ''),
-                    'rule_type': raw_suggestion.get('rule_type'),
-                    'delay_time': None,
-                    'delay_unit': None,
-                    'trigger_id': None,
-                    'trigger_name': None, # Will be populated if found
-                    'action_id': None,
-                    'action_name': None,  # Will be populated if found
-                    'is_active': True # Default to true, user can change on frontend
-                }
-                mapping_notes = []
-
-                # Map Trigger
-                ai_trigger_name = raw_suggestion.get('trigger_name')
-                if ai_trigger_name:
-                    trigger_instance = Trigger.objects.filter(name__iexact=ai_trigger_name).first()
-                    if trigger_instance:
-                        mapped_suggestion_data['trigger_id'] = trigger_instance.id
-                        mapped_suggestion_data['trigger_name'] = trigger_instance.name # Use actual DB name
-                    else:
-                        mapping_notes.append(f"AI suggested trigger '{ai_trigger_name}' which was not found. Please select a trigger.")
-                else:
-                    mapping_notes.append("AI did not suggest a trigger. Please select one.")
-
-                # Map Action
-                ai_action_name = raw_suggestion.get('action_name')
-                if ai_action_name:
-                    action_instance = Action.objects.filter(name__iexact=ai_action_name).first()
-                    if action_instance:
-                        mapped_suggestion_data['action_id'] = action_instance.id
-                        mapped_suggestion_data['action_name'] = action_instance.name # Use actual DB name
-                    else:
-                        mapping_notes.append(f"AI suggested action '{ai_action_name}' which was not found. Please select an action.")
-                else:
-                    mapping_notes.append("AI did not suggest an action. Please select one.")
-
-                # Process delay if rule_type is 'scheduled'
-                if mapped_suggestion_data['rule_type'] == 'scheduled':
-                    delay_time_raw = raw_suggestion.get('delay_time')
-                    delay_unit_raw = raw_suggestion.get('delay_unit')
-
-                    if delay_time_raw is not None:
-                        try:
-                            parsed_delay_time = int(float(delay_time_raw)) # AI might send float
-                            if parsed_delay_time > 0:
-                                mapped_suggestion_data['delay_time'] = parsed_delay_time
-                            else:
-                                mapping_notes.append(f"AI suggested non-positive delay_time '{delay_time_raw}'. Please enter a positive number.")
-                        except (ValueError, TypeError):
-                            mapping_notes.append(f"AI suggested invalid delay_time format '{delay_time_raw}'. Please enter a number.")
-                    else:
-                        mapping_notes.append("Scheduled rule type chosen by AI, but no delay_time provided. Please specify.")
-                    
-                    if delay_unit_raw and delay_unit_raw in [choice[0] for choice in WorkflowRule.DELAY_UNIT_CHOICES]:
-                        mapped_suggestion_data['delay_unit'] = delay_unit_raw
-                    elif delay_unit_raw: # It was provided but invalid
-                        mapping_notes.append(f"AI suggested invalid delay_unit '{delay_unit_raw}'. Please select a valid unit.")
-                    else: # Not provided for scheduled
-                         mapping_notes.append("Scheduled rule type chosen by AI, but no delay_unit provided. Please specify.")
-                elif mapped_suggestion_data['rule_type'] == 'immediate':
-                    mapped_suggestion_data['delay_time'] = None
-                    mapped_suggestion_data['delay_unit'] = None
-                else: # Invalid rule_type
-                    mapping_notes.append(f"AI suggested an invalid rule_type: '{mapped_suggestion_data['rule_type']}'. Please select 'immediate' or 'scheduled'.")
-                    mapped_suggestion_data['rule_type'] = None # Nullify if invalid
-
-                preview_suggestions_for_frontend.append({
-                    "original_ai_suggestion": raw_suggestion,
-                    "mapped_suggestion": mapped_suggestion_data,
-                    "mapping_notes": mapping_notes
-                })
-            
-            final_response_message = f"AI returned {len(raw_ai_suggestions)} suggestion(s)."
-            if ai_global_errors:
-                final_response_message += f" AI also reported {len(ai_global_errors)} global issue(s)."
-            
-            return Response({
-                "preview_workflows": preview_suggestions_for_frontend,
-                "ai_reported_errors": ai_global_errors,
-                "message": final_response_message
-            }, status=status.HTTP_200_OK)
-
+                return Response({"error": str(e)}, status=status.HTTP_504_GATEWAY_TIMEOUT)
+            payload, http_status = build_suggestions_payload(ai_response_json_str)
+            return Response(payload, status=http_status, headers={"X-AI-Source": "local-fallback"})
         except Exception as e:
             import traceback
             print(f"General error in AI workflow generation process: {str(e)}")
@@ -166,6 +135,31 @@ class WorkflowRuleViewSet(viewsets.ModelViewSet):
             return Response({"error": f"An unexpected error occurred on the server while processing AI suggestions: {str(e)}"},
                             status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'], url_path='generate-from-ai-stream')
+    def generate_from_ai_stream(self, request):
+        """
+        Streams AI suggestions as Server-Sent Events while Gemini is still
+        generating. Each `suggestion` event carries one mapped preview (the same
+        shape as an item of generate-from-ai's preview_workflows, plus `index`)
+        as soon as the model has finished writing it; a final `done` event
+        carries ai_reported_errors and the summary message, and an `error`
+        event reports a failure. Requires the ASGI deployment (core/asgi.py)
+        for the events to be flushed incrementally.
+        """
+        prompt_text = request.data.get('prompt')
+        if not prompt_text:
+            return Response({"error": "No prompt provided"}, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(stream_ai_suggestion_events(prompt_text), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no' # don't let proxies buffer the stream
+        return response
+
+    @action(detail=False, methods=['get'], url_path='ai-cache-stats')
+    def ai_cache_stats(self, request):
+        """Hit/miss counters of this process's generate-from-ai prompt cache."""
+        return Response(get_prompt_cache().stats(), status=status.HTTP_200_OK)
+
     # New action for simulating triggers
     @action(detail=False, methods=['post'], url_path='simulate-trigger')
     def simulate_trigger(self, request):
@@ -175,62 +169,36 @@ class WorkflowRuleViewSet(viewsets.ModelViewSet):
 
         try:
             trigger_id = int(trigger_id)
-            trigger_instance = Trigger.objects.get(id=trigger_id)
         except (ValueError, TypeError):
             return Response({"error": "Invalid trigger_id format"}, status=status.HTTP_400_BAD_REQUEST)
-        except Trigger.DoesNotExist:
+        # Trigger and rules come from the in-process routing table: no queries
+        # until the single bulk INSERT of the logs.
+        trigger_instance = routing_table.get_trigger(trigger_id)
+        if trigger_instance is None:
             return Response({"error": f"Trigger with id {trigger_id} not found"}, status=status.HTTP_404_NOT_FOUND)
 
-        active_rules = WorkflowRule.objects.filter(trigger=trigger_instance, is_active=True)
-        
-        simulated_logs_created = []
-        simulation_errors = []
-
-        for rule in active_rules:
-            log_data = {
-                'workflow_rule_id': rule.id,
-                'trigger_name_snapshot': trigger_instance.name,
-                'action_name_snapshot': rule.action.name, # Assumes action is always present on a rule
-            }
-            current_time = timezone.now() # Requires: from django.utils import timezone
-
-            if rule.rule_type == 'immediate':
-                log_data['status'] = 'SIMULATED_IMMEDIATE'
-                log_data['actual_execution_time'] = current_time
-            elif rule.rule_type == 'scheduled':
-                log_data['status'] = 'SIMULATED_SCHEDULED'
-                if rule.delay_time and rule.delay_unit:
-                    delta = timedelta()
-                    if rule.delay_unit == 'minutes':
-                        delta = timedelta(minutes=rule.delay_time)
-                    elif rule.delay_unit == 'hours':
-                        delta = timedelta(hours=rule.delay_time)
-                    elif rule.delay_unit == 'days':
-                        delta = timedelta(days=rule.delay_time)
-                    log_data['scheduled_execution_time'] = current_time + delta
-                else:
-                    log_data['status'] = 'SIMULATION_ERROR'
-                    log_data['details'] = f"Rule '{rule.name}' is scheduled but has invalid delay parameters."
-                    simulation_errors.append(log_data)
-                    continue # Skip creating this log as a success
-            else:
-                log_data['status'] = 'SIMULATION_ERROR'
-                log_data['details'] = f"Rule '{rule.name}' has an unknown rule_type: {rule.rule_type}."
-                simulation_errors.append(log_data)
-                continue
-            
-            log_serializer = WorkflowExecutionLogSerializer(data=log_data) # Ensure this serializer is in scope
-            if log_serializer.is_valid():
-                log_instance = log_serializer.save()
-                simulated_logs_created.append(WorkflowExecutionLogSerializer(log_instance).data)
-            else:
-                log_data['status'] = 'SIMULATION_ERROR' # Override status
-                log_data['details'] = f"Error saving log for rule '{rule.name}': {json.dumps(log_serializer.errors)}"
-                simulation_errors.append(log_data)
+        active_rules = routing_table.routes_for(trigger_id)
+        logs, simulation_errors = build_execution_logs(trigger_instance.name, active_rules)
+
+        try:
+            created_logs, skipped_logs = create_execution_logs(logs)
+            simulation_errors.extend(stale_rule_error(log) for log in skipped_logs)
+        except Exception as e:
+            print(f"Error saving simulated logs for trigger '{trigger_instance.name}': {str(e)}")
+            created_logs = []
+            for log in logs:
+                simulation_errors.append({
+                    'workflow_rule_id': log.workflow_rule_id,
+                    'trigger_name_snapshot': log.trigger_name_snapshot,
+                    'action_name_snapshot': log.action_name_snapshot,
+                    'status': 'SIMULATION_ERROR', # Override status
+                    'details': f"Error saving log for rule '{log.workflow_rule.name}': {str(e)}",
+                })
+        simulated_logs_created = WorkflowExecutionLogSerializer(created_logs, many=True).data
 
         response_data = {
             "trigger_simulated": trigger_instance.name,
-            "rules_processed_count": active_rules.count(),
+            "rules_processed_count": len(active_rules),
             "simulated_logs_created": simulated_logs_created,
             "simulation_errors": simulation_errors
         }
@@ -261,6 +229,282 @@ class WorkflowRuleViewSet(viewsets.ModelViewSet):
     #     # or even a serialized (but not saved) WorkflowRule instance.
     #     return Response(suggested_rule, status=status.HTTP_200_OK)
 
+class EventIngestViewSet(viewsets.ViewSet):
+    """
+    API endpoint for ingesting batches of real trigger events.
+
+    POST /api/events/ accepts a JSON list of events, {"events": [...]}, or an
+    NDJSON stream (Content-Type: application/x-ndjson). Each event names its
+    trigger with `trigger_id` or `trigger_name`, and may carry an `event_id`
+    (echoed back) and an ISO-8601 `occurred_at` that scheduled delays are
+    measured from (default: now).
+
+    Triggers and rules are resolved from the in-process routing table, and all
+    resulting execution logs are written with one bulk insert.
+    """
+    parser_classes = [JSONParser, NDJSONParser]
+
+    def create(self, request):
+        started = time.perf_counter()
+        events = request.data
+        if isinstance(events, dict):
+            events = events.get('events')
+        if not isinstance(events, list):
+            return Response({"error": "Expected a list of events, an object with an 'events' list, or NDJSON."},
+                            status=status.HTTP_400_BAD_REQUEST)
+        max_batch = getattr(settings, 'EVENT_INGEST_MAX_BATCH', 5000)
+        if len(events) > max_batch:
+            return Response({"error": f"Batch too large: {len(events)} events (max {max_batch})."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        logs = []
+        log_owner = [] # index into results for each entry of logs
+        for index, event in enumerate(events):
+            result = {"index": index}
+            if isinstance(event, dict) and event.get('event_id') is not None:
+                result["event_id"] = event.get('event_id')
+            results.append(result)
+
+            trigger, base_time, error = self.resolve_event(event)
+            if error:
+                result.update({"status": "rejected", "error": error})
+                continue
+
+            event_logs, simulation_errors = build_execution_logs(
+                trigger.name, routing_table.routes_for(trigger.id), base_time
+            )
+            result.update({
+                "status": "accepted",
+                "trigger_id": trigger.id,
+                "logs_created": len(event_logs),
+                "simulation_errors": simulation_errors,
+            })
+            logs.extend(event_logs)
+            log_owner.extend([index] * len(event_logs))
+
+        try:
+            _, skipped_logs = create_execution_logs(logs, batch_size=1000)
+            owner_of = {id(log): index for log, index in zip(logs, log_owner)}
+            for log in skipped_logs:
+                result = results[owner_of[id(log)]]
+                result["logs_created"] -= 1
+                result["simulation_errors"].append(stale_rule_error(log))
+        except Exception as e:
+            print(f"Error writing execution logs for event batch: {str(e)}")
+            for index in set(log_owner):
+                results[index].update({"status": "rejected", "logs_created": 0,
+                                       "error": f"Failed to store execution logs: {str(e)}"})
+
+        elapsed = time.perf_counter() - started
+        accepted = sum(1 for result in results if result["status"] == "accepted")
+        return Response({
+            "accepted": accepted,
+            "rejected": len(results) - accepted,
+            "logs_created": sum(result.get("logs_created", 0) for result in results),
+            "elapsed_ms": round(elapsed * 1000, 2),
+            "events_per_second": round(len(results) / elapsed, 1) if elapsed > 0 else None,
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def resolve_event(event):
+        """Returns (trigger, base_time, error) for one event."""
+        if not isinstance(event, dict):
+            return None, None, "Event must be a JSON object."
+
+        if event.get('trigger_id') is not None:
+            try:
+                trigger_id = int(event['trigger_id'])
+            except (TypeError, ValueError):
+                return None, None, "Invalid trigger_id format"
+            trigger = routing_table.get_trigger(trigger_id)
+            if trigger is None:
+                return None, None, f"Trigger with id {trigger_id} not found"
+        elif isinstance(event.get('trigger_name'), str):
+            trigger = routing_table.get_trigger_by_name(event['trigger_name'])
+            if trigger is None:
+                return None, None, f"Trigger named '{event['trigger_name']}' not found"
+        else:
+            return None, None, "trigger_id or trigger_name is required"
+
+        base_time = timezone.now()
+        if event.get('occurred_at'):
+            try:
+                parsed = parse_datetime(str(event['occurred_at']))
+            except ValueError:
+                # Well-formed but impossible, e.g. 2024-02-30.
+                parsed = None
+            if parsed is None:
+                return None, None, "occurred_at must be an ISO-8601 datetime."
+            base_time = timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+        return trigger, base_time, None
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _replay(text):
+    yield text
+
+
+async def stream_ai_suggestion_events(prompt_text):
+    """
+    Async generator of the SSE events for generate-from-ai-stream. Suggestions are
+    cut out of the streamed JSON by SuggestedWorkflowsStreamParser; the ones
+    completed by each chunk are mapped together, so their catalog names are
+    resolved in one batch. Cached and local responses arrive as a single chunk.
+    """
+    prompt_cache = get_prompt_cache()
+    local = confident_local_suggestion(prompt_text)
+    if local is not None:
+        source, cached = 'local', None
+        chunks = _replay(local)
+    else:
+        source = 'gemini'
+        cached = await sync_to_async(prompt_cache.get)(prompt_text)
+        chunks = _replay(cached) if cached is not None else aiter_ai_response_chunks(prompt_text)
+    parser = SuggestedWorkflowsStreamParser()
+    emitted = 0
+
+    try:
+        async for chunk in chunks:
+            raw_suggestions = parser.feed(chunk)
+            if not raw_suggestions:
+                continue
+            for preview in await sync_to_async(map_ai_suggestions)(raw_suggestions):
+                yield sse_event('suggestion', {"index": emitted, **preview})
+                emitted += 1
+    except (AIUpstreamTimeout, AIServiceUnavailable) as e:
+        print(f"Error: {e}")
+        fallback = local_fallback(prompt_text) if not emitted else None
+        if fallback is None:
+            yield sse_event('error', {"error": str(e)})
+            return
+        source = 'local-fallback'
+        parser = SuggestedWorkflowsStreamParser()
+        for preview in await sync_to_async(map_ai_suggestions)(parser.feed(fallback)):
+            yield sse_event('suggestion', {"index": emitted, **preview})
+            emitted += 1
+    except Exception as e:
+        import traceback
+        print(f"Error during streamed AI generation: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        yield sse_event('error', {"error": "AI service failed to generate suggestions. Check server logs."})
+        return
+
+    full_response_text = parser.full_text()
+    try:
+        ai_data = json.loads(full_response_text)
+        if not isinstance(ai_data, dict):
+            raise json.JSONDecodeError("Expected a JSON object", full_response_text, 0)
+    except json.JSONDecodeError as je:
+        print(f"Error: AI response was not valid JSON: {je}")
+        print(f"AI Response String: {full_response_text}")
+        yield sse_event('error', {"error": "AI response was not in the expected JSON format."})
+        return
+
+    if source == 'gemini' and cached is None:
+        await sync_to_async(prompt_cache.set)(prompt_text, full_response_text)
+    ai_global_errors = ai_data.get("errors", [])
+    done = {
+        "ai_reported_errors": ai_global_errors,
+        "message": suggestions_message(emitted, len(ai_global_errors)),
+        "source": source,
+    }
+    if source == 'gemini':
+        done["cache"] = "HIT" if cached is not None else "MISS"
+    yield sse_event('done', done)
+
+async def generate_from_ai_async(request):
+    """
+    Async variant of WorkflowRuleViewSet.generate_from_ai, for deployments served
+    through core/asgi.py. The Gemini call is awaited on the event loop instead of
+    blocking a worker for the whole stream, so slow AI calls no longer starve the
+    CRUD endpoints. Request and response bodies match the sync endpoint; an
+    upstream timeout is reported as 504.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    try:
+        body = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Request body must be JSON."}, status=400)
+    prompt_text = body.get('prompt') if isinstance(body, dict) else None
+    if not prompt_text:
+        return JsonResponse({"error": "No prompt provided"}, status=400)
+
+    headers = {"X-AI-Source": "local"}
+    try:
+        ai_response_json_str = confident_local_suggestion(prompt_text)
+        if ai_response_json_str is None:
+            prompt_cache = get_prompt_cache()
+            ai_response_json_str = await sync_to_async(prompt_cache.get)(prompt_text)
+            cache_hit = ai_response_json_str is not None
+            if not cache_hit:
+                ai_response_json_str = await get_ai_suggestions_for_prompt_async(prompt_text)
+                await sync_to_async(prompt_cache.set)(prompt_text, ai_response_json_str)
+            headers = {"X-AI-Source": "gemini", "X-AI-Cache": "HIT" if cache_hit else "MISS"}
+            if ai_response_json_str is None:
+                ai_response_json_str = local_fallback(prompt_text)
+                if ai_response_json_str is not None:
+                    headers["X-AI-Source"] = "local-fallback"
+        payload, http_status = await sync_to_async(build_suggestions_payload)(ai_response_json_str)
+    except AIUpstreamTimeout as e:
+        ai_response_json_str = local_fallback(prompt_text)
+        if ai_response_json_str is None:
+            return JsonResponse({"error": str(e)}, status=504)
+        headers = {"X-AI-Source": "local-fallback"}
+        payload, http_status = await sync_to_async(build_suggestions_payload)(ai_response_json_str)
+    except Exception as e:
+        import traceback
+        print(f"General error in async AI workflow generation process: {str(e)}")
+        print(f"Traceback: {traceback.format_exc()}")
+        return JsonResponse({"error": f"An unexpected error occurred on the server while processing AI suggestions: {str(e)}"},
+                            status=500)
+
+    response = JsonResponse(payload, status=http_status)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+# Set directly: the csrf_exempt decorator is not async-aware before Django 5.0.
+generate_from_ai_async.csrf_exempt = True
+
+async def generate_from_ai_batch(request):
+    """
+    Generates suggestions for many prompts at once, e.g. when onboarding a
+    property manager: {"prompts": ["...", ...]}. Each entry of `results` has
+    the same preview_workflows / ai_reported_errors / message as
+    generate-from-ai, plus its own status, cache outcome and timings.
+
+    Async like generate_from_ai_async: the Gemini calls are awaited on the event
+    loop, and the whole batch finishes within AI_BATCH_TIMEOUT_SECONDS.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"detail": f'Method "{request.method}" not allowed.'}, status=405)
+    try:
+        body = json.loads(request.body or b'{}')
+    except (json.JSONDecodeError, UnicodeDecodeError):
+        return JsonResponse({"error": "Request body must be JSON."}, status=400)
+    prompts = body.get('prompts') if isinstance(body, dict) else None
+    if not isinstance(prompts, list) or not prompts:
+        return JsonResponse({"error": "Expected a non-empty 'prompts' list."}, status=400)
+    if not all(isinstance(prompt_text, str) and prompt_text.strip() for prompt_text in prompts):
+        return JsonResponse({"error": "Every prompt must be a non-empty string."}, status=400)
+    max_prompts = getattr(settings, 'AI_BATCH_MAX_PROMPTS', 200)
+    if len(prompts) > max_prompts:
+        return JsonResponse({"error": f"A batch may contain at most {max_prompts} prompts."}, status=400)
+
+    results, summary = await generate_suggestions_batch(
+        prompts,
+        getattr(settings, 'AI_BATCH_MAX_CONCURRENCY', 8),
+        getattr(settings, 'AI_BATCH_TIMEOUT_SECONDS', 60),
+    )
+    return JsonResponse({**summary, "results": results})
+
+generate_from_ai_batch.csrf_exempt = True
+
 @csrf_exempt # For simplicity; production should use proper auth
 @require_POST # Ensure this endpoint is called via POST by Cloud Scheduler
 def run_scheduled_tasks_view(request):
@@ -282,12 +526,223 @@ def run_scheduled_tasks_view(request):
         # Log the exception e
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
 
+def filter_logs(queryset, params, rule_field):
+    """Applies the rule/status/logged_after/logged_before query parameters shared by the log endpoints."""
+    rule_id = params.get('rule')
+    if rule_id:
+        try:
+            queryset = queryset.filter(**{rule_field: int(rule_id)})
+        except (TypeError, ValueError):
+            raise ValidationError({'rule': 'Must be an integer rule id.'})
+
+    statuses = [value.strip() for value in params.get('status', '').split(',') if value.strip()]
+    if statuses:
+        valid_statuses = {choice[0] for choice in WorkflowExecutionLog.STATUS_CHOICES}
+        unknown = [value for value in statuses if value not in valid_statuses]
+        if unknown:
+            raise ValidationError({'status': f"Unknown status value(s): {', '.join(unknown)}."})
+        queryset = queryset.filter(status__in=statuses)
+
+    for param, lookup in (('logged_after', 'logged_at__gte'), ('logged_before', 'logged_at__lt')):
+        raw = params.get(param)
+        if raw:
+            try:
+                # ValueError: well-formed but impossible, e.g. 2024-02-30.
+                parsed = parse_datetime(raw)
+            except ValueError:
+                parsed = None
+            if parsed is None:
+                raise ValidationError({param: 'Must be an ISO-8601 datetime.'})
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed)
+            queryset = queryset.filter(**{lookup: parsed})
+
+    return queryset
+
 class WorkflowExecutionLogViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for viewing workflow execution logs.
     Allows only GET requests to list logs.
+
+    The list is keyset-paginated newest first (see LogKeysetPagination) and
+    accepts these query parameters:
+      - rule: only logs of this workflow rule id
+      - status: one status or a comma-separated list of statuses
+      - logged_after / logged_before: ISO-8601 bounds on logged_at
+      - fields: comma-separated subset of fields to return (e.g. to skip `details`)
+      - since: delta mode; a token from a previous response's `since` value.
+        Returns only rows created or changed after it, oldest change first.
+        Rows appear once they are WORKFLOW_LOG_SINCE_LAG_SECONDS old, and a row
+        may be returned again, so clients merge results by id.
     """
     queryset = WorkflowExecutionLog.objects.all().order_by('-logged_at') # Default ordering
     serializer_class = WorkflowExecutionLogSerializer
-    # http_method_names can be removed to default to read-only if ModelViewSet is changed to ReadOnlyModelViewSet
-    # http_method_names = ['get', 'head', 'options'] # Explicitly make it read-only for listing
+    pagination_class = LogKeysetPagination
+
+    def get_requested_fields(self):
+        raw = self.request.query_params.get('fields')
+        if not raw:
+            return None
+        return [name.strip() for name in raw.split(',') if name.strip()]
+
+    def get_serializer(self, *args, **kwargs):
+        if self.request is not None and 'fields' not in kwargs:
+            kwargs['fields'] = self.get_requested_fields()
+        return super().get_serializer(*args, **kwargs)
+
+    def get_queryset(self):
+        queryset = WorkflowExecutionLog.objects.all()
+        params = self.request.query_params
+        requested_fields = self.get_requested_fields()
+
+        if requested_fields is None or 'workflow_rule' in requested_fields:
+            queryset = queryset.select_related('workflow_rule')
+        if requested_fields is not None and 'details' not in requested_fields:
+            queryset = queryset.defer('details')
+
+        return filter_logs(queryset, params, rule_field='workflow_rule_id').order_by('-logged_at', '-id')
+
+    def list(self, request, *args, **kwargs):
+        if 'since' in request.query_params:
+            return self.list_changes_since(request)
+        response = super().list(request, *args, **kwargs)
+        # Hand out the starting point for subsequent `since` polls.
+        response.data['since'] = self.get_latest_position()
+        return response
+
+    def get_change_horizon(self):
+        """
+        Delta mode only returns rows stamped before this. updated_at comes from
+        the app clock when the row is written, not when its transaction commits,
+        so a row stamped just now may still become visible after a later-stamped
+        one; the lag gives such transactions (and clock skew between servers)
+        time to land before the cursor moves past their stamp.
+        """
+        return timezone.now() - timedelta(seconds=getattr(settings, 'WORKFLOW_LOG_SINCE_LAG_SECONDS', 5))
+
+    def get_latest_position(self):
+        latest = (
+            WorkflowExecutionLog.objects.filter(updated_at__lt=self.get_change_horizon())
+            .order_by('-updated_at', '-id')
+            .values_list('updated_at', 'id').first()
+        )
+        return encode_position(*latest) if latest else None
+
+    def list_changes_since(self, request):
+        """
+        Delta mode: rows whose (updated_at, id) is past the `since` token, in
+        change order, so a poller only downloads what is new or changed. When
+        `has_more` is true the client should poll again straight away with the
+        returned `since`.
+        """
+        token = request.query_params.get('since')
+        queryset = self.get_queryset().filter(updated_at__lt=self.get_change_horizon())
+        if token:
+            position = decode_position(token)
+            if position is None:
+                raise ValidationError({'since': 'Invalid since token.'})
+            updated_at, pk = position
+            queryset = queryset.filter(Q(updated_at__gt=updated_at) | Q(updated_at=updated_at, id__gt=pk))
+
+        page_size = self.paginator.get_page_size(request)
+        rows = list(queryset.order_by('updated_at', 'id')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        if rows:
+            next_since = encode_position(rows[-1].updated_at, rows[-1].id)
+        else:
+            next_since = token or self.get_latest_position()
+        return Response({
+            'since': next_since,
+            'has_more': has_more,
+            'results': self.get_serializer(rows, many=True).data,
+        })
+
+
+class ArchivedExecutionLogViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    API endpoint for execution logs moved out of the hot table by the
+    archive_execution_logs command. Keyset-paginated newest first, with the
+    same rule/status/logged_after/logged_before filters as the log list.
+    """
+    queryset = ArchivedExecutionLog.objects.all()
+    serializer_class = ArchivedExecutionLogSerializer
+    pagination_class = LogKeysetPagination
+
+    def get_queryset(self):
+        queryset = ArchivedExecutionLog.objects.all()
+        return filter_logs(queryset, self.request.query_params, rule_field='rule_id').order_by('-logged_at', '-id')
+
+
+class StatsViewSet(viewsets.ViewSet):
+    """
+    API endpoint with the dashboard counters, computed with a fixed number of
+    aggregate queries. Execution counts come from the ExecutionDailyStat rollup,
+    so the cost does not grow with the size of the log table.
+
+    The rollup counts status *events*, not current statuses: a scheduled log is
+    counted under SIMULATED_SCHEDULED when it is created and again under
+    EXECUTED (or EXECUTION_ERROR/DEAD_LETTERED) when its job finishes. So
+    `status_events` says how often each status was reached, and its values do
+    not add up to the number of logs. Current backlog sizes are
+    `pending_scheduled` and `dead_lettered`, counted from the log table.
+
+    Query parameters:
+      - days: length of the daily histogram and breakdown window (default 14, max 366)
+    """
+
+    def list(self, request):
+        try:
+            days = int(request.query_params.get('days', 14))
+        except (TypeError, ValueError):
+            raise ValidationError({'days': 'Must be an integer.'})
+        if not 1 <= days <= 366:
+            raise ValidationError({'days': 'Must be between 1 and 366.'})
+
+        today = timezone.localdate()
+        window_start = today - timedelta(days=days - 1)
+        executed_statuses = WorkflowExecutionLog.EXECUTED_STATUSES
+
+        rule_counts = WorkflowRule.objects.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True)),
+            active_immediate=Count('id', filter=Q(is_active=True, rule_type='immediate')),
+            active_scheduled=Count('id', filter=Q(is_active=True, rule_type='scheduled')),
+        )
+        # Served by the (status, scheduled_execution_time) index.
+        pending_scheduled = WorkflowExecutionLog.objects.filter(status='SIMULATED_SCHEDULED').count()
+        dead_lettered = WorkflowExecutionLog.objects.filter(status='DEAD_LETTERED').count()
+
+        rollup = ExecutionDailyStat.objects.order_by()
+        status_events = {
+            row['status']: row['count']
+            for row in rollup.values('status').annotate(count=Sum('count'))
+        }
+
+        window = rollup.filter(day__gte=window_start, day__lte=today, status__in=executed_statuses)
+        per_day = {
+            row['day']: row['count']
+            for row in window.values('day').annotate(count=Sum('count'))
+        }
+        daily_executions = [
+            {'day': day.isoformat(), 'count': per_day.get(day, 0)}
+            for day in (window_start + timedelta(days=offset) for offset in range(days))
+        ]
+        by_trigger = list(
+            window.values('trigger_name').annotate(count=Sum('count')).order_by('-count', 'trigger_name')
+        )
+        by_action = list(
+            window.values('action_name').annotate(count=Sum('count')).order_by('-count', 'action_name')
+        )
+
+        return Response({
+            'rules': rule_counts,
+            'executions_today': per_day.get(today, 0),
+            'pending_scheduled': pending_scheduled,
+            'dead_lettered': dead_lettered,
+            'status_events': status_events,
+            'daily_executions': daily_executions,
+            'by_trigger': by_trigger,
+            'by_action': by_action,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,233 @@
+"""
+Thread pool that runs claimed scheduler jobs and outbox messages in parallel.
+
+Real actions (email, Slack, push, device toggles) spend nearly all their time
+waiting on I/O, so jobs run on a pool of SCHEDULER_MAX_WORKERS threads. The
+number of sends in flight is also capped per action type, through
+SCHEDULER_ACTION_CONCURRENCY. This keeps one slow or rate-limited provider
+from taking every worker. Jobs of a type that is at its limit wait in that
+type's own queue, so they never block jobs of other types.
+
+When several jobs of one type are waiting, a worker takes up to the
+executor's batch size of them at once (see workflow.executors), so channels
+that accept batches get fewer, larger requests without any added wait.
+
+Repeated executions of one rule are coalesced for actions with a window in
+ACTION_COALESCE_WINDOWS (see workflow.throttle). The first one is queued at
+once and opens the window; duplicates that arrive while it is open are held,
+then queued together and sent as one message when it closes. Held jobs keep
+their leases, so windows must stay well below the lease time.
+
+Outcomes go to the shared LogStatusWriter, so every database write is made
+by that one batching thread and none by the workers.
+"""
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .executors import batch_size_for
+from .jobs import is_failure, run_jobs
+from .throttle import coalesce_window_for
+
+DEFAULT_MAX_WORKERS = 16
+DEFAULT_ACTION_CONCURRENCY = 8
+
+
+class CoalesceWindow:
+    __slots__ = ('closes_at', 'items')
+
+    def __init__(self, closes_at):
+        self.closes_at = closes_at
+        # (job, lease_token) pairs held until the window closes
+        self.items = []
+
+
+def percentile(sorted_values, fraction):
+    """The value at `fraction` (0-1) of an already sorted list; None if it is empty."""
+    if not sorted_values:
+        return None
+    return sorted_values[min(int(len(sorted_values) * fraction), len(sorted_values) - 1)]
+
+
+class ActionWorkerPool:
+    def __init__(self, writer, max_workers=None, action_limits=None):
+        self.writer = writer
+        self.max_workers = max_workers or getattr(settings, 'SCHEDULER_MAX_WORKERS', DEFAULT_MAX_WORKERS)
+        limits = dict(getattr(settings, 'SCHEDULER_ACTION_CONCURRENCY', {}))
+        limits.update(action_limits or {})
+        self.default_limit = limits.pop('default', DEFAULT_ACTION_CONCURRENCY)
+        self.action_limits = limits
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='action-worker')
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        # Per action type: units waiting for a worker. A unit is a list of
+        # (job, lease_token) pairs that are sent as one message.
+        self._pending = defaultdict(deque)
+        self._running = Counter()
+        self._outstanding = 0
+        self._closed = False
+        # (action_name, rule id) -> open CoalesceWindow
+        self._windows = {}
+        self._held = 0
+        self._windows_changed = threading.Condition(self._lock)
+        self._window_thread = threading.Thread(target=self._run_windows, name='coalesce-windows', daemon=True)
+        self._window_thread.start()
+
+        self.completed = 0
+        self.errors = 0
+        self.coalesced = 0
+        # Seconds each job spent executing, and from its due time to completion.
+        self.execution_times = []
+        self.latencies = []
+        self.started_at = time.monotonic()
+
+    def limit_for(self, action_name):
+        return self.action_limits.get(action_name, self.default_limit)
+
+    @property
+    def outstanding(self):
+        """Jobs submitted but not finished (queued, held in a window or running)."""
+        with self._lock:
+            return self._outstanding
+
+    def submit(self, job, lease_token):
+        action_name = job.execution_log.action_name_snapshot
+        window = coalesce_window_for(action_name)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError('ActionWorkerPool is shut down.')
+            self._outstanding += 1
+            if window > 0:
+                key = (action_name, job.execution_log.workflow_rule_id)
+                open_window = self._windows.get(key)
+                if open_window is not None:
+                    # A duplicate: held and sent with the others when the window closes.
+                    open_window.items.append((job, lease_token))
+                    self._held += 1
+                    return
+                self._windows[key] = CoalesceWindow(time.monotonic() + window)
+                self._windows_changed.notify_all()
+            self._pending[action_name].append([(job, lease_token)])
+            self._dispatch(action_name)
+
+    def _dispatch(self, action_name):
+        # Caller holds self._lock.
+        pending = self._pending[action_name]
+        batch_size = None
+        while pending and self._running[action_name] < self.limit_for(action_name):
+            if batch_size is None:
+                batch_size = batch_size_for(action_name)
+            items = []
+            for _ in range(min(batch_size, len(pending))):
+                items.extend(pending.popleft())
+            self._running[action_name] += 1
+            self._executor.submit(self._run, action_name, items)
+
+    def _run_windows(self):
+        """Queues the jobs held by each window when it closes; on shutdown, closes every window."""
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                for key, open_window in list(self._windows.items()):
+                    if open_window.closes_at > now and not self._closed:
+                        continue
+                    del self._windows[key]
+                    if not open_window.items:
+                        continue
+                    action_name = key[0]
+                    self._held -= len(open_window.items)
+                    self.coalesced += len(open_window.items)
+                    self._pending[action_name].append(open_window.items)
+                    if not self._closed:
+                        # Keep throttling the rule while duplicates keep coming.
+                        self._windows[key] = CoalesceWindow(now + coalesce_window_for(action_name))
+                    self._dispatch(action_name)
+                if self._closed and not self._windows:
+                    return
+                next_close = min((open_window.closes_at for open_window in self._windows.values()), default=None)
+                self._windows_changed.wait(None if next_close is None else max(next_close - now, 0))
+
+    def _run(self, action_name, items):
+        try:
+            close_old_connections()
+            started = time.monotonic()
+            outcomes = run_jobs(items)
+            elapsed = time.monotonic() - started
+            for outcome in outcomes:
+                self.writer.submit(outcome)
+            with self._lock:
+                for (job, lease_token), outcome in zip(items, outcomes):
+                    self.completed += 1
+                    if is_failure(outcome):
+                        self.errors += 1
+                    self.execution_times.append(elapsed)
+                    self.latencies.append(max((outcome.finished_at - job.due_at).total_seconds(), 0.0))
+        finally:
+            with self._lock:
+                self._running[action_name] -= 1
+                self._outstanding -= len(items)
+                self._dispatch(action_name)
+                self._idle.notify_all()
+
+    def wait_until_below(self, threshold, timeout=None):
+        """
+        Blocks until fewer than `threshold` jobs are queued or running; False on
+        timeout. Jobs held in a coalescing window do not count.
+        """
+        with self._lock:
+            return self._idle.wait_for(lambda: self._outstanding - self._held < threshold, timeout=timeout)
+
+    def wait_idle(self, timeout=None):
+        with self._lock:
+            return self._idle.wait_for(lambda: self._outstanding == 0, timeout=timeout)
+
+    def shutdown(self):
+        """Stops accepting jobs, sends what the windows hold, lets every job finish, then stops the threads."""
+        with self._lock:
+            self._closed = True
+            self._windows_changed.notify_all()
+        self._window_thread.join()
+        self.wait_idle()
+        self._executor.shutdown(wait=True)
+
+    def stats(self, reset=False):
+        """Throughput and latency percentiles (milliseconds) since start or the last reset."""
+        with self._lock:
+            execution_times = sorted(self.execution_times)
+            latencies = sorted(self.latencies)
+            completed, errors, coalesced = self.completed, self.errors, self.coalesced
+            elapsed = time.monotonic() - self.started_at
+            if reset:
+                self.execution_times, self.latencies = [], []
+                self.completed = self.errors = self.coalesced = 0
+                self.started_at = time.monotonic()
+
+        def ms(value):
+            return None if value is None else round(value * 1000, 1)
+
+        return {
+            'completed': completed,
+            'errors': errors,
+            'coalesced': coalesced,
+            'elapsed_s': round(elapsed, 3),
+            'jobs_per_second': round(completed / elapsed, 1) if elapsed > 0 else None,
+            'execution_ms': {f'p{int(q * 100)}': ms(percentile(execution_times, q)) for q in (0.5, 0.95, 0.99)},
+            'latency_ms': {f'p{int(q * 100)}': ms(percentile(latencies, q)) for q in (0.5, 0.95, 0.99)},
+        }
+
+
+def format_pool_stats(stats):
+    """One-line summary of ActionWorkerPool.stats() for command output."""
+    execution = stats['execution_ms']
+    latency = stats['latency_ms']
+    return (
+        f"completed {stats['completed']} (errors {stats['errors']}, coalesced {stats['coalesced']}) in {stats['elapsed_s']:.3f}s, "
+        f"{stats['jobs_per_second'] or 0:.1f} jobs/s; "
+        f"execution p50/p95/p99 {execution['p50']}/{execution['p95']}/{execution['p99']} ms; "
+        f"due-to-done latency p50/p95/p99 {latency['p50']}/{latency['p95']}/{latency['p99']} ms"
+    )
@@ -185,7 +185,7 @@ export default function CreateWorkflow() {
     setAiGlobalErrors([]); // Still clear global errors here
 
     try {
-      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/rules/generate-from-ai/`, {
+      const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/rules/generate-from-ai-async/`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -1,6 +1,6 @@
 "use client";
 
-import { useState, useEffect } from "react";
+import { useState, useEffect, useRef } from "react";
 import {
   Table,
   TableBody,
@@ -33,16 +33,37 @@ export default function WorkflowLogDisplay() {
   const [logs, setLogs] = useState<WorkflowExecutionLog[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  // Delta-polling token returned by the API; only rows changed after it are re-downloaded.
+  const sinceRef = useRef<string | null>(null);
 
   useEffect(() => {
     const fetchLogs = async () => {
       try {
-        const response = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/workflow-logs/`);
+        const since = sinceRef.current;
+        const url = since
+          ? `${process.env.NEXT_PUBLIC_API_URL}/api/workflow-logs/?since=${encodeURIComponent(since)}`
+          : `${process.env.NEXT_PUBLIC_API_URL}/api/workflow-logs/`;
+        const response = await fetch(url);
         if (!response.ok) {
           throw new Error(`Failed to fetch logs: ${response.status}`);
         }
         const data = await response.json();
-        setLogs(data);
+        // The logs endpoint is cursor-paginated: { next, results, since }
+        const fetched: WorkflowExecutionLog[] = data.results ?? data;
+        if (since) {
+          if (fetched.length > 0) {
+            setLogs(previous => {
+              const byId = new Map(previous.map(log => [log.id, log]));
+              fetched.forEach(log => byId.set(log.id, log));
+              return Array.from(byId.values())
+                .sort((a, b) => new Date(b.logged_at).getTime() - new Date(a.logged_at).getTime())
+                .slice(0, Math.max(previous.length, 50));
+            });
+          }
+        } else {
+          setLogs(fetched);
+        }
+        sinceRef.current = data.since ?? null;
         if (isLoading) setIsLoading(false);
         if (error) setError(null);
       } catch (err) {
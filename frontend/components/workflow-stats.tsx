@@ -3,19 +3,16 @@
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card"
 import { Workflow, Zap, Clock, CheckCircle2 } from "lucide-react"
 import { useState, useEffect } from "react"
-import { isToday, parseISO } from 'date-fns'; // Import for date comparison
 
-// Assuming WorkflowRuleFromAPI interface is defined elsewhere or we define a simpler one here
-interface WorkflowRuleBasic {
-  id: number | string;
-  rule_type: 'immediate' | 'scheduled';
-  is_active: boolean;
-}
-
-// Interface for individual execution logs (simplified for this component)
-interface WorkflowExecutionLogStats {
-  id: number | string;
-  actual_execution_time?: string | null;
+// Shape of the counters returned by /api/stats/ that this component uses
+interface DashboardStats {
+  rules: {
+    total: number;
+    active: number;
+    active_immediate: number;
+    active_scheduled: number;
+  };
+  executions_today: number;
 }
 
 export default function WorkflowStats() {
@@ -32,41 +29,18 @@ export default function WorkflowStats() {
       // setIsLoading(true); // Set loading true for the combined fetch operations
 
       try {
-        // Fetch workflow rules for general stats
-        const rulesResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/rules/`);
-        if (!rulesResponse.ok) {
-          throw new Error(`Failed to fetch workflow rules: ${rulesResponse.status}`);
+        // All counters are aggregated server-side in a fixed number of queries
+        const statsResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/stats/`);
+        if (!statsResponse.ok) {
+          throw new Error(`Failed to fetch workflow stats: ${statsResponse.status}`);
         }
-        const rulesData = await rulesResponse.json();
-        const rules: WorkflowRuleBasic[] = rulesData.results || rulesData;
+        const stats: DashboardStats = await statsResponse.json();
 
-        setTotalWorkflows(rules.length);
-        setImmediateActions(rules.filter(rule => rule.rule_type === 'immediate' && rule.is_active).length);
-        setScheduledActions(rules.filter(rule => rule.rule_type === 'scheduled' && rule.is_active).length);
-
-        // Fetch workflow execution logs for "Executions Today"
-        const logsResponse = await fetch(`${process.env.NEXT_PUBLIC_API_URL}/api/workflow-logs/`);
-        if (!logsResponse.ok) {
-          throw new Error(`Failed to fetch workflow logs: ${logsResponse.status}`);
-        }
-        const logsData = await logsResponse.json();
-        // Assuming logsData might be paginated like rulesData, or could be a direct array
-        const executionLogs: WorkflowExecutionLogStats[] = logsData.results || logsData; 
-        
-        const todayCount = executionLogs.filter(log => {
-          if (log.actual_execution_time) {
-            try {
-              const executionDate = parseISO(log.actual_execution_time);
-              return isToday(executionDate);
-            } catch (e) {
-              console.warn("Failed to parse execution date for log:", log.id, e);
-              return false;
-            }
-          }
-          return false;
-        }).length;
-        setExecutionsToday(todayCount);
-        setError(null); // Clear any previous errors if all fetches succeed
+        setTotalWorkflows(stats.rules.total);
+        setImmediateActions(stats.rules.active_immediate);
+        setScheduledActions(stats.rules.active_scheduled);
+        setExecutionsToday(stats.executions_today);
+        setError(null); // Clear any previous errors if the fetch succeeds
 
       } catch (err) {
         console.error("Error fetching workflow stats or logs:", err);